@@ -1,4 +1,8 @@
-from .core import process_mitoedit
-
 __version__ = "1.0.0"
-__all__ = ["process_mitoedit"]
\ No newline at end of file
+
+from .core import process_mitoedit, process_mitoedit_batch
+from .pipelines.context_index import ContextIndex
+from .atlas import Atlas, build_atlas
+from .seqops import EncodedSequence
+
+__all__ = ["process_mitoedit", "process_mitoedit_batch", "ContextIndex", "Atlas", "build_atlas", "EncodedSequence"]
\ No newline at end of file
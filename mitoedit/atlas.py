@@ -0,0 +1,306 @@
+"""
+Whole-mitogenome editability atlas.
+
+The atlas precomputes the pipeline windows for every editable position of a reference
+sequence (one valid ref→mut edit per position) and stores them as a directory of
+columnar, memory-mappable binary files:
+
+- ``meta.json``: format/code version, sequence hash and the column layout
+- ``<pipeline>.positions.int64``: row offsets, rows for position p are
+  ``offsets[p]:offsets[p + 1]``
+- one or more files per column (see _ColumnWriter for the encodings)
+
+Lookups return the same (all_windows, adjacent_bases) tuple as
+BasePipeline.process_mtDNA without running any pipeline code.
+"""
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+from . import __version__
+from .core import EDIT_PIPELINES
+from .pipelines.context_index import ContextIndex
+from .pipelines.window_markup import WindowMarkup, render_windows
+from .seqops import normalize_sequence
+
+logger = logging.getLogger(__name__)
+
+ATLAS_FORMAT_VERSION = 3
+
+# The single valid mutant base for every reference base
+MUTANT_BASES = {ref: mut for ref, mut in EDIT_PIPELINES}
+
+# Column kinds of the window tuples returned by each pipeline's process_mtDNA
+ROW_SCHEMAS = {
+    "Mok2020_Unified": ('cat', 'int', 'cat', 'cat', 'cat', 'str', 'cat', 'int', 'intlist', 'cat', 'cat'),
+    "Cho_sTALEDs": ('cat', 'cat', 'int', 'cat', 'cat', 'cat', 'markup', 'cat', 'int', 'intlist', 'cat', 'cat'),
+}
+
+
+def sequence_hash(nospace_mtDNA):
+    """SHA-256 of a normalized sequence, used to invalidate atlases built for other sequences."""
+    return hashlib.sha256(nospace_mtDNA.encode('utf-8')).hexdigest()
+
+
+class _ColumnWriter:
+    """
+    Streams one column to disk.
+
+    Encodings:
+    - 'int': int64 values (``<name>.int64``)
+    - 'cat': uint16 codes (``<name>.codes``) into a JSON category list kept in meta.json
+    - 'str': UTF-8 blob (``<name>.blob``) plus int64 offsets (``<name>.offsets``)
+    - 'intlist': flattened int64 values (``<name>.values``) plus int64 offsets (``<name>.offsets``)
+    - 'markup': WindowMarkup values stored unrendered, as the 'str' files of the plain window,
+      int64 target offsets (``<name>.target``) and the 'intlist' files of the bystander offsets
+      (``<name>.mark.values``, ``<name>.mark.offsets``); they are rendered when looked up
+    """
+
+    def __init__(self, directory, name, kind):
+        self.directory = directory
+        self.name = name
+        self.kind = kind
+        self.count = 0
+        self.categories = {}
+        self._offset = 0
+        if kind == 'int':
+            self._main = open(self._path('int64'), 'wb')
+        elif kind == 'cat':
+            self._main = open(self._path('codes'), 'wb')
+        elif kind in ('str', 'intlist'):
+            self._main = open(self._path('blob' if kind == 'str' else 'values'), 'wb')
+            self._offsets = open(self._path('offsets'), 'wb')
+            self._offsets.write(np.zeros(1, dtype=np.int64).tobytes())
+        elif kind == 'markup':
+            self._main = _ColumnWriter(directory, name, 'str')
+            self._targets = open(self._path('target'), 'wb')
+            self._marks = _ColumnWriter(directory, f"{name}.mark", 'intlist')
+        else:
+            raise ValueError(f"Unknown atlas column kind: {kind}")
+
+    def _path(self, suffix):
+        return os.path.join(self.directory, f"{self.name}.{suffix}")
+
+    def append(self, values):
+        """Append the values of a batch of rows."""
+        if not values:
+            return
+        self.count += len(values)
+        if self.kind == 'int':
+            self._main.write(np.asarray(values, dtype=np.int64).tobytes())
+        elif self.kind == 'markup':
+            self._main.append([value.window for value in values])
+            self._targets.write(np.asarray([value.target for value in values], dtype=np.int64).tobytes())
+            self._marks.append([value.marked() for value in values])
+        elif self.kind == 'cat':
+            codes = [self.categories.setdefault(value, len(self.categories)) for value in values]
+            if len(self.categories) > np.iinfo(np.uint16).max:
+                raise ValueError(f"Too many distinct values for categorical atlas column {self.name}")
+            self._main.write(np.asarray(codes, dtype=np.uint16).tobytes())
+        else:
+            if self.kind == 'str':
+                chunks = [value.encode('utf-8') for value in values]
+                lengths = [len(chunk) for chunk in chunks]
+                self._main.write(b''.join(chunks))
+            else:
+                lengths = [len(value) for value in values]
+                flat = [item for value in values for item in value]
+                self._main.write(np.asarray(flat, dtype=np.int64).tobytes())
+            ends = self._offset + np.cumsum(lengths, dtype=np.int64)
+            self._offset = int(ends[-1])
+            self._offsets.write(ends.tobytes())
+
+    def close(self):
+        """Close the files and return the column description for meta.json."""
+        self._main.close()
+        if self.kind in ('str', 'intlist'):
+            self._offsets.close()
+        elif self.kind == 'markup':
+            self._targets.close()
+            self._marks.close()
+        meta = {'name': self.name, 'kind': self.kind, 'count': self.count}
+        if self.kind == 'cat':
+            meta['categories'] = list(self.categories)
+        return meta
+
+
+def _memmap(path, dtype, count):
+    """Memory-map a raw binary column file (empty files cannot be mapped)."""
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+class _Column:
+    """Read-only, memory-mapped view of a column written by _ColumnWriter."""
+
+    def __init__(self, directory, meta):
+        self.kind = meta['kind']
+        count = meta['count']
+
+        def path(suffix):
+            return os.path.join(directory, f"{meta['name']}.{suffix}")
+
+        if self.kind == 'int':
+            self._values = _memmap(path('int64'), np.int64, count)
+        elif self.kind == 'cat':
+            self._codes = _memmap(path('codes'), np.uint16, count)
+            self._categories = meta['categories']
+        elif self.kind == 'markup':
+            self._windows = _Column(directory, dict(meta, kind='str'))
+            self._targets = _memmap(path('target'), np.int64, count)
+            self._marks = _Column(directory, dict(meta, name=f"{meta['name']}.mark", kind='intlist'))
+        else:
+            self._offsets = _memmap(path('offsets'), np.int64, count + 1)
+            total = int(self._offsets[-1])
+            if self.kind == 'str':
+                self._values = _memmap(path('blob'), np.uint8, total)
+            else:
+                self._values = _memmap(path('values'), np.int64, total)
+
+    def slice(self, start, stop):
+        """Decode rows [start, stop) into Python values."""
+        if self.kind == 'int':
+            return self._values[start:stop].tolist()
+        if self.kind == 'cat':
+            return [self._categories[code] for code in self._codes[start:stop].tolist()]
+        if self.kind == 'markup':
+            windows = self._windows.slice(start, stop)
+            markups = [WindowMarkup(window, 0, len(window), target, marks) for window, target, marks
+                       in zip(windows, self._targets[start:stop].tolist(), self._marks.slice(start, stop))]
+            return render_windows(markups)
+        offsets = self._offsets[start:stop + 1].tolist()
+        if self.kind == 'str':
+            blob = self._values[offsets[0]:offsets[-1]].tobytes()
+            base = offsets[0]
+            return [blob[a - base:b - base].decode('utf-8') for a, b in zip(offsets[:-1], offsets[1:])]
+        values = self._values[offsets[0]:offsets[-1]].tolist()
+        base = offsets[0]
+        return [values[a - base:b - base] for a, b in zip(offsets[:-1], offsets[1:])]
+
+
+def build_atlas(mtdna_seq, atlas_dir, context_index=None):
+    """
+    Run every pipeline for every editable position of a sequence and write the atlas.
+
+    Args:
+        mtdna_seq (str or EncodedSequence): mtDNA sequence
+        atlas_dir (str): Output directory (created if needed, existing atlas files are overwritten)
+        context_index (ContextIndex, optional): Prebuilt index for the sequence
+
+    Returns:
+        Atlas: The freshly written atlas
+    """
+    nospace_mtDNA = normalize_sequence(mtdna_seq)
+    if context_index is None:
+        context_index = ContextIndex(nospace_mtDNA)
+    os.makedirs(atlas_dir, exist_ok=True)
+
+    pipelines = {}
+    for pipeline_name, pipeline_class in EDIT_PIPELINES.values():
+        if pipeline_name in pipelines:
+            continue
+        pipelines[pipeline_name] = {
+            'instance': pipeline_class(lazy_markup=True),
+            'columns': [
+                _ColumnWriter(atlas_dir, f"{pipeline_name}.col{i}", kind)
+                for i, kind in enumerate(ROW_SCHEMAS[pipeline_name])
+            ],
+            'adjacent': _ColumnWriter(atlas_dir, f"{pipeline_name}.adjacent", 'str'),
+            'offsets': np.zeros(len(nospace_mtDNA) + 2, dtype=np.int64),
+            'rows': 0,
+        }
+
+    logger.info(f"Building editability atlas for a sequence of length {len(nospace_mtDNA)}.")
+    for pos in range(1, len(nospace_mtDNA) + 1):
+        reference_base = nospace_mtDNA[pos - 1]
+        pipeline_name, windows, adjacent_bases = None, [], ""
+        if reference_base in MUTANT_BASES:
+            pipeline_name = EDIT_PIPELINES[(reference_base, MUTANT_BASES[reference_base])][0]
+            try:
+                windows, adjacent_bases = pipelines[pipeline_name]['instance'].process_mtDNA(
+                    nospace_mtDNA, pos, context_index=context_index)
+            except ValueError:
+                # Not editable: lookups fall back to the pipeline, which raises the same error
+                windows, adjacent_bases = [], ""
+            if windows and adjacent_bases:
+                entry = pipelines[pipeline_name]
+                for writer, values in zip(entry['columns'], zip(*windows)):
+                    writer.append(list(values))
+                entry['rows'] += len(windows)
+            else:
+                pipeline_name = None
+        for name, entry in pipelines.items():
+            entry['offsets'][pos + 1] = entry['rows']
+            entry['adjacent'].append([adjacent_bases if name == pipeline_name else ""])
+
+    meta = {
+        'format_version': ATLAS_FORMAT_VERSION,
+        'code_version': __version__,
+        'sequence_sha256': sequence_hash(nospace_mtDNA),
+        'sequence_length': len(nospace_mtDNA),
+        'pipelines': {},
+    }
+    for name, entry in pipelines.items():
+        entry['offsets'].tofile(os.path.join(atlas_dir, f"{name}.positions.int64"))
+        meta['pipelines'][name] = {
+            'rows': entry['rows'],
+            'columns': [writer.close() for writer in entry['columns']],
+            'adjacent': entry['adjacent'].close(),
+        }
+        logger.info(f"Stored {entry['rows']} windows for pipeline {name}.")
+
+    with open(os.path.join(atlas_dir, 'meta.json'), 'w') as fh:
+        json.dump(meta, fh, indent=1)
+    logger.info(f"Atlas written to {atlas_dir}.")
+    return Atlas(atlas_dir)
+
+
+class Atlas:
+    """Read-only, memory-mapped editability atlas written by build_atlas."""
+
+    def __init__(self, atlas_dir):
+        self.atlas_dir = atlas_dir
+        with open(os.path.join(atlas_dir, 'meta.json')) as fh:
+            self.meta = json.load(fh)
+        self.sequence_length = self.meta['sequence_length']
+        self._pipelines = {}
+        for name, entry in self.meta['pipelines'].items():
+            self._pipelines[name] = {
+                'offsets': _memmap(os.path.join(atlas_dir, f"{name}.positions.int64"), np.int64,
+                                   self.sequence_length + 2),
+                'columns': [_Column(atlas_dir, column) for column in entry['columns']],
+                'adjacent': _Column(atlas_dir, entry['adjacent']),
+            }
+
+    def is_current(self):
+        """Whether the atlas was written by this code version."""
+        return (self.meta.get('format_version') == ATLAS_FORMAT_VERSION
+                and self.meta.get('code_version') == __version__)
+
+    def matches(self, mtdna_seq):
+        """Whether the atlas is current and was built for this sequence."""
+        nospace_mtDNA = normalize_sequence(mtdna_seq)
+        return (self.is_current()
+                and len(nospace_mtDNA) == self.sequence_length
+                and sequence_hash(nospace_mtDNA) == self.meta['sequence_sha256'])
+
+    def lookup(self, pipeline_name, position):
+        """
+        Return the stored (all_windows, adjacent_bases) for a position, or None when nothing is stored.
+
+        Positions without stored windows were not editable when the atlas was built; callers
+        should run the pipeline for them to get the corresponding error.
+        """
+        entry = self._pipelines.get(pipeline_name)
+        if entry is None or not 1 <= position <= self.sequence_length:
+            return None
+        start, stop = int(entry['offsets'][position]), int(entry['offsets'][position + 1])
+        if start == stop:
+            return None
+        columns = [column.slice(start, stop) for column in entry['columns']]
+        adjacent_bases = entry['adjacent'].slice(position - 1, position)[0]
+        return list(zip(*columns)), adjacent_bases
@@ -5,6 +5,7 @@ from importlib.resources import files
 import pandas as pd
 
 from . import process_mitoedit
+from .atlas import Atlas, build_atlas
 
 import logging
 import sys
@@ -17,10 +18,46 @@ FILTER = 1
 CUT_POS = 31
 
 
+def read_mtdna_seq(mtdna_seq_path, logger):
+    """Read the mtDNA sequence from a plain text file, or the bundled human mtDNA when no path is given."""
+    if mtdna_seq_path is None:
+        logger.info("Using default mtDNA sequence from resources/mito.txt")
+        try:
+            return files('mitoedit.resources').joinpath('mito.txt').read_text().replace("\n", "")
+        except FileNotFoundError:
+            logger.error("Default mtDNA sequence file not found in resources/mito.txt")
+            raise
+    logger.info(f"Reading mtDNA sequence from file: {mtdna_seq_path}")
+    with open(mtdna_seq_path, "r") as fh:
+        return fh.read().replace("\n", "")
+
+
+def atlas_main(argv):
+    """CLI entry point for `mitoedit atlas ...`."""
+    logger = logging.getLogger('mitoedit')
+
+    parser = argparse.ArgumentParser(prog='mitoedit atlas', description='Manage precomputed editability atlases.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='Precompute the windows of every editable position.')
+    # yapf: disable
+    build_parser.add_argument('--mtdna_seq_path', '-i', type=str, default=None,       help='File containing the mtDNA sequence as plain text.')
+    build_parser.add_argument('--output', '-o'        , type=str, default='atlas',    help='Directory to write the atlas to (default: atlas)')
+    # yapf: enable
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        mtdna_seq = read_mtdna_seq(args.mtdna_seq_path, logger)
+        build_atlas(mtdna_seq, args.output)
+
+
 def main():
     """CLI entry point for MitoEdit."""
     logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stdout)
     logger = logging.getLogger('mitoedit')
+
+    if sys.argv[1:2] == ['atlas']:
+        atlas_main(sys.argv[2:])
+        return
     
     parser = argparse.ArgumentParser(description='Process DNA sequence for base editing.')
     # yapf: disable
@@ -33,22 +70,21 @@ def main():
     parser.add_argument('--array_max'           , type=int, default=ARR_MAX,    help=f'Maximum array length for TALE-NT (default: {ARR_MAX})')
     parser.add_argument('--filter'              , type=int, default=FILTER,     help=f'TALE-NT filter setting (default: {FILTER})')
     parser.add_argument('--cut_pos'             , type=int, default=CUT_POS,    help=f'TALE-NT cut position (default: {CUT_POS})')
+    parser.add_argument('--processes'           , type=int, default=1,          help='Number of processes running the TALE-NT scan (default: 1)')
+    parser.add_argument('--max_mismatches'      , type=int, default=None,       help='Add the number of mtDNA sites each TALE binds with up to this many mismatches (optional)')
+    parser.add_argument('--atlas'               , type=str, default=None,       help='Atlas directory built with `mitoedit atlas build` (optional)')
+    parser.add_argument('--collapse_strategies' , action='store_true',          help='Report Mok2020 windows shared by several strategies once, with the strategy set')
     parser.add_argument('position'              , type=int,                     help='Position of the base to be changed')
     parser.add_argument('mutant_base'           , type=str,                     help='Mutant base to be changed into')
     # yapf: enable
     args = parser.parse_args()
 
-    if args.mtdna_seq_path is None:
-        logger.info("Using default mtDNA sequence from resources/mito.txt")
-        try:
-            mtdna_seq = files('mitoedit.resources').joinpath('mito.txt').read_text().replace("\n", "")
-        except FileNotFoundError:
-            logger.error("Default mtDNA sequence file not found in resources/mito.txt")
-            raise
-    else:
-        logger.info(f"Reading mtDNA sequence from file: {args.mtdna_seq_path}")
-        with open(args.mtdna_seq_path, "r") as fh:
-            mtdna_seq = fh.read().replace("\n", "")
+    mtdna_seq = read_mtdna_seq(args.mtdna_seq_path, logger)
+
+    atlas = None
+    if args.atlas:
+        logger.info(f"Loading atlas from {args.atlas}")
+        atlas = Atlas(args.atlas)
 
     bystander_df = None
     if args.bystander_file:
@@ -65,14 +101,18 @@ def main():
         'array_min': args.array_min,
         'array_max': args.array_max,
         'filter': args.filter,
-        'cut_pos': args.cut_pos
+        'cut_pos': args.cut_pos,
+        'processes': args.processes,
+        'max_mismatches': args.max_mismatches
     }
 
     results = process_mitoedit(mtdna_seq=mtdna_seq,
                                position=args.position,
                                mutant_base=args.mutant_base,
                                bystander_df=bystander_df,
-                               tale_nt_params=tale_nt_params)
+                               tale_nt_params=tale_nt_params,
+                               atlas=atlas,
+                               collapse_strategies=args.collapse_strategies)
 
     if results['windows_df'].empty:
         logger.warning("No results generated. Exiting.")
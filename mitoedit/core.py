@@ -1,13 +1,14 @@
-import os
 import re
-import tempfile
 from importlib.resources import files
 
 import pandas as pd
 
 from .pipelines.Cho_sTALEDs import ChosTALEDsPipeline
 from .pipelines.Mok2020_unified import Mok2020UnifiedPipeline
-from .talent_tools.findTAL import RunFindTALTask
+from .pipelines.context_index import ContextIndex
+from .seqops import normalize_sequence
+from .talent_tools.findTAL import MISMATCH_COLUMNS, OUTPUT_COLUMNS, find_tal_sites_in_records
+from .talent_tools.mismatch import sequenceReference
 from .talent_tools.talutil import OptionObject
 
 import logging
@@ -21,53 +22,218 @@ ARR_MAX = 18
 FILTER = 1
 CUT_POS = 31
 
+# Supported (reference base, mutant base) edits and the pipeline handling them
+EDIT_PIPELINES = {
+    ('C', 'T'): ("Mok2020_Unified", Mok2020UnifiedPipeline),
+    ('G', 'A'): ("Mok2020_Unified", Mok2020UnifiedPipeline),
+    ('A', 'G'): ("Cho_sTALEDs", ChosTALEDsPipeline),
+    ('T', 'C'): ("Cho_sTALEDs", ChosTALEDsPipeline),
+}
 
-def process_mitoedit(mtdna_seq, position, mutant_base, bystander_df=None, tale_nt_params=None):
+
+WINDOW_COLUMNS = [
+    'Pipeline', 'Position', 'Reference Base', 'Mutant Base', 'Window Size',
+    'Window Sequence', 'Target Location', 'Number of Bystanders',
+    'Position of Bystanders', 'Optimal Flanking TALEs', 'Flag (CheckBystanderEffect)'
+]
+
+
+def select_pipeline(reference_base, mutant_base):
+    """Return the (pipeline_name, pipeline_class) handling an edit, or raise ValueError if none does."""
+    if (reference_base, mutant_base) not in EDIT_PIPELINES:
+        raise ValueError(f"No pipeline found for reference base {reference_base} and the mutant base {mutant_base}")
+    return EDIT_PIPELINES[(reference_base, mutant_base)]
+
+
+def _make_pipeline(pipeline_class, collapse_strategies=False):
+    """Instantiate a pipeline; collapse_strategies only applies to the Mok2020 unified pipeline."""
+    if collapse_strategies and issubclass(pipeline_class, Mok2020UnifiedPipeline):
+        return pipeline_class(collapse_strategies=True)
+    return pipeline_class()
+
+
+def _default_tale_nt_params():
+    return {
+        'min_spacer': MIN_SPACER,
+        'max_spacer': MAX_SPACER,
+        'array_min': ARR_MIN,
+        'array_max': ARR_MAX,
+        'filter': FILTER,
+        'cut_pos': CUT_POS
+    }
+
+
+def _fasta_record(position, adjacent_bases):
+    return f">Adjacent_bases_position_{position}\n{adjacent_bases}\n"
+
+
+def _compute_windows(pipeline_name, pipeline_instance, mtdna_seq, position, context_index, atlas):
+    """
+    Return the (windows_df, adjacent_bases) of one target.
+
+    The atlas, if given, must already have been checked against mtdna_seq with Atlas.matches.
+    It stores one row per strategy, so it is not used for pipelines collapsing strategies.
+    """
+    stored = None
+    if atlas is not None and not getattr(pipeline_instance, 'collapse_strategies', False):
+        stored = atlas.lookup(pipeline_name, position)
+
+    if stored is not None:
+        logger.info(f"Loaded windows for position {position} from the atlas.")
+        all_windows, adjacent_bases = stored
+    else:
+        logger.info(f"Processing mtDNA sequence for position {position}.")
+        all_windows, adjacent_bases = pipeline_instance.process_mtDNA(mtdna_seq, position, context_index=context_index)
+
+    if not adjacent_bases:
+        raise ValueError(f"The base found at position {position} cannot be edited.")
+
+    return pd.DataFrame(all_windows, columns=WINDOW_COLUMNS), adjacent_bases
+
+
+def _run_tale_nt(records, tale_nt_params, mtdna_seq=None):
+    """
+    Run the TALE-NT findTAL scan in-process on (sequence name, sequence) records.
+
+    An optional 'processes' entry in tale_nt_params scans the records in that many processes.
+    An optional 'max_mismatches' entry searches mtdna_seq for both TALEs of every pair with up
+    to that many mismatches and adds their off-target profiles as MISMATCH_COLUMNS, each giving
+    the number of places found with 0, 1, ... mismatches.
+
+    Returns:
+        pd.DataFrame: The findTAL output table, with the same columns and dtypes as its TSV output
+    """
+    options = OptionObject(
+        min=tale_nt_params['min_spacer'],
+        max=tale_nt_params['max_spacer'],
+        arraymin=tale_nt_params['array_min'],
+        arraymax=tale_nt_params['array_max'],
+        filter=tale_nt_params['filter'],
+        filterbase=tale_nt_params['cut_pos'] if tale_nt_params['filter'] == 1 else -1,
+        cupstream=0,
+        gspec=False,
+        streubel=False,
+    )
+    logger.info("Running TALE-NT findTAL analysis")
+    binding_sites = find_tal_sites_in_records(records, options, processes=tale_nt_params.get('processes', 1))
+
+    max_mismatches = tale_nt_params.get('max_mismatches')
+    check_mismatches = max_mismatches is not None and mtdna_seq is not None
+    if check_mismatches:
+        logger.info(f"Searching the mtDNA for TALE sites with up to {max_mismatches} mismatches")
+        binding_sites.mismatch_profiles = binding_sites.mismatchProfiles(
+            sequenceReference([('mtDNA', mtdna_seq)]), max_mismatches)
+
+    columns = OUTPUT_COLUMNS + MISMATCH_COLUMNS if check_mismatches else OUTPUT_COLUMNS
+    rows = list(binding_sites.records(check_mismatches=check_mismatches))
+    logger.info("TALE-NT analysis completed successfully")
+
+    if not rows:
+        return pd.DataFrame({column: pd.Series(dtype=object) for column in columns})
+    return pd.DataFrame(rows, columns=columns)
+
+
+def _tale_pair_index(plus_strand_sequences):
+    """
+    Index TALE-NT plus-strand sequences ("T LEFT spacer RIGHT A") by spacer.
+
+    Returns:
+        tuple: (spacers, pairs) where spacers is the set of lowercase runs in the sequences and
+               pairs maps each spacer to its (left TALE, right TALE) list in output order
+    """
+    spacers = set()
+    pairs = {}
+    for sequence in plus_strand_sequences:
+        spacers.update(re.findall(r'[a-z]+', sequence))
+        lower_indices = [i for i, char in enumerate(sequence) if char.islower()]
+        if len(lower_indices) >= 2:
+            spacer_start = lower_indices[0]
+            spacer_end = lower_indices[-1]
+            left_tale = sequence[:spacer_start].upper()
+            right_tale = sequence[spacer_end + 1:].upper()
+            pairs.setdefault(''.join(sequence[i] for i in lower_indices), []).append((left_tale, right_tale))
+    return spacers, pairs
+
+
+def _annotate_matching_tales(windows_df, talen_output_df):
+    """
+    Add the 'Matching TALEs' and 'Left/Right TALE n' columns to windows_df in place.
+
+    A window matches when its unmarked sequence is a spacer of the TALE-NT output; its
+    Left/Right TALE n columns then list the TALE pairs flanking that spacer.
+
+    Returns:
+        pd.DataFrame: talen_output_df, or an empty DataFrame when it has no 'Plus strand sequence' column
+    """
+    if 'Plus strand sequence' not in talen_output_df.columns:
+        logger.warning("Column 'Plus strand sequence' not found in the TALEN file")
+        return pd.DataFrame()
+
+    if windows_df.empty:
+        return talen_output_df
+
+    spacers, pairs = _tale_pair_index(talen_output_df['Plus strand sequence'].tolist())
+
+    cleaned_sequences = windows_df['Window Sequence'].str.replace(r'[{}\[\]]', '', regex=True).str.lower()
+    matching = cleaned_sequences.isin(spacers)
+    windows_df['Matching TALEs'] = pd.Series(matching.tolist(), index=windows_df.index, dtype=object)
+
+    # One hash join per TALE column: spacer -> n-th (left, right) pair
+    matched_spacers = cleaned_sequences.where(matching)
+    pair_counts = {spacer: len(pairs.get(spacer, ())) for spacer in matched_spacers.dropna().unique()}
+    for n in range(1, max(pair_counts.values(), default=0) + 1):
+        nth_pairs = {spacer: pairs[spacer][n - 1] for spacer, count in pair_counts.items() if count >= n}
+        windows_df[f'Left TALE {n}'] = matched_spacers.map({spacer: left for spacer, (left, _) in nth_pairs.items()})
+        windows_df[f'Right TALE {n}'] = matched_spacers.map({spacer: right for spacer, (_, right) in nth_pairs.items()})
+
+    return talen_output_df
+
+
+def process_mitoedit(mtdna_seq, position, mutant_base, bystander_df=None, tale_nt_params=None, context_index=None,
+                     atlas=None, collapse_strategies=False):
     """
     Core MitoEdit processing function for programmatic use.
     
     Args:
-        mtdna_seq (str): mtDNA sequence string
+        mtdna_seq (str or EncodedSequence): mtDNA sequence
         position (int): Position of the base to be changed (1-based)
         mutant_base (str): Mutant base to be changed into
         bystander_df (pd.DataFrame, optional): DataFrame containing bystander effect annotations
-        tale_nt_params (dict, optional): TALE-NT parameters for findTAL analysis
+        tale_nt_params (dict, optional): TALE-NT parameters for findTAL analysis; an optional
+            'max_mismatches' entry adds the mismatch profiles of the TALEs in mtdna_seq
+        context_index (ContextIndex, optional): Index built with ContextIndex.from_sequence(mtdna_seq);
+            pass the same index to repeated calls against one sequence to avoid rebuilding it
+        atlas (Atlas, optional): Precomputed editability atlas; used when it was built for mtdna_seq
+            by the current code version, otherwise the pipeline is run as usual
+        collapse_strategies (bool, optional): Report Mok2020 windows shared by several strategies
+            once, with the strategy set, instead of once per strategy
         
     Returns:
         dict: Results containing windows_df, bystanders_df, adjacent_bases, fasta_content, and talen_output_df
     """
     mutant_base = mutant_base.upper()
+    nospace_mtDNA = normalize_sequence(mtdna_seq)
 
-    reference_base = mtdna_seq[position - 1].upper()
+    reference_base = nospace_mtDNA[position - 1]
     logger.info(f"Reference base at position {position} is {reference_base}")
 
-    if (reference_base, mutant_base) in [('C', 'T'), ('G', 'A')]:
-        pipeline_class = Mok2020UnifiedPipeline
-        pipeline_name = "Mok2020_Unified"
-    elif (reference_base, mutant_base) in [('A', 'G'), ('T', 'C')]:
-        pipeline_class = ChosTALEDsPipeline
-        pipeline_name = "Cho_sTALEDs"
-    else:
-        raise ValueError(f"No pipeline found for reference base {reference_base} and the mutant base {mutant_base}")
+    pipeline_name, pipeline_class = select_pipeline(reference_base, mutant_base)
 
     logger.info(f"Selected pipeline: {pipeline_name}")
 
-    pipeline_instance = pipeline_class()
+    pipeline_instance = _make_pipeline(pipeline_class, collapse_strategies)
 
-    logger.info(f"Processing mtDNA sequence for position {position}.")
-    all_windows, adjacent_bases = pipeline_instance.process_mtDNA(mtdna_seq, position)
+    if atlas is not None and not atlas.matches(mtdna_seq):
+        logger.warning("The supplied atlas does not match this sequence or code version; ignoring it.")
+        atlas = None
 
-    if not adjacent_bases:
-        raise ValueError(f"The base found at position {position} cannot be edited.")
+    if context_index is None and atlas is None:
+        context_index = ContextIndex.from_sequence(mtdna_seq)
 
-    windows_df = pd.DataFrame(all_windows,
-                              columns=[
-                                  'Pipeline', 'Position', 'Reference Base', 'Mutant Base', 'Window Size',
-                                  'Window Sequence', 'Target Location', 'Number of Bystanders',
-                                  'Position of Bystanders', 'Optimal Flanking TALEs', 'Flag (CheckBystanderEffect)'
-                              ])
+    windows_df, adjacent_bases = _compute_windows(pipeline_name, pipeline_instance, mtdna_seq, position,
+                                                  context_index, atlas)
 
-    fasta_content = f">Adjacent_bases_position_{position}\n{adjacent_bases}\n"
+    fasta_content = _fasta_record(position, adjacent_bases)
 
     logger.info("Processing pipeline data.")
     windows_df, bystanders_df = pipeline_instance.process_bystander_data(windows_df, bystander_df)
@@ -75,86 +241,11 @@ def process_mitoedit(mtdna_seq, position, mutant_base, bystander_df=None, tale_n
     logger.info("Pipeline processing completed successfully.")
 
     if tale_nt_params is None:
-        tale_nt_params = {
-            'min_spacer': MIN_SPACER,
-            'max_spacer': MAX_SPACER,
-            'array_min': ARR_MIN,
-            'array_max': ARR_MAX,
-            'filter': FILTER,
-            'cut_pos': CUT_POS
-        }
+        tale_nt_params = _default_tale_nt_params()
 
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.fasta', delete=False) as temp_fasta:
-        temp_fasta.write(fasta_content)
-        temp_fasta_path = temp_fasta.name
-
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as temp_output:
-        temp_output_path = temp_output.name
-
-    try:
-        logger.info("Running TALE-NT findTAL analysis")
-        RunFindTALTask(
-            OptionObject(
-                fasta=temp_fasta_path,
-                min=tale_nt_params['min_spacer'],
-                max=tale_nt_params['max_spacer'],
-                arraymin=tale_nt_params['array_min'],
-                arraymax=tale_nt_params['array_max'],
-                outpath=temp_output_path,
-                filter=tale_nt_params['filter'],
-                filterbase=tale_nt_params['cut_pos'] if tale_nt_params['filter'] == 1 else -1,
-                cupstream=0,
-                gspec=False,
-                streubel=False,
-                check_offtargets=False,
-                offtargets_fasta='NA',
-                offtargets_ncbi='NA',
-                genome=False,
-                promoterome=False,
-                organism='NA',
-                logFilepath='NA',
-                nodeID=-1,
-                ip_address='',
-            ))
-        logger.info("TALE-NT analysis completed successfully")
-
-        logger.info("Loading TALE-NT output")
-        talen_output_df = pd.read_csv(temp_output_path, delimiter='\t', skiprows=2)
-        logger.info("Successfully loaded TALE-NT output.")
-
-        if 'Plus strand sequence' not in talen_output_df.columns:
-            logger.warning("Column 'Plus strand sequence' not found in the TALEN file")
-            talen_output_df = pd.DataFrame()
-        else:
-            plus_strand_sequences = talen_output_df['Plus strand sequence'].tolist()
-            txt_bases = set(re.findall(r'[a-z]+', ' '.join(plus_strand_sequences)))
-
-            for index, row in windows_df.iterrows():
-                cleaned_sequence = re.sub(r'[{}\[\]]', '', row['Window Sequence']).lower()
-                windows_df.at[index, 'Matching TALEs'] = cleaned_sequence in txt_bases
-                for txt_base in txt_bases:
-                    if txt_base == cleaned_sequence:
-                        left_index = 1
-                        right_index = 1
-                        matching_sequences = [
-                            sequence for sequence in plus_strand_sequences
-                            if re.sub(r'[^a-z]', '', sequence) == txt_base
-                        ]
-                        for sequence in matching_sequences:
-                            lower_indices = [i for i, char in enumerate(sequence) if char.islower()]
-                            if len(lower_indices) >= 2:
-                                spacer_start = lower_indices[0]
-                                spacer_end = lower_indices[-1]
-                                left_tale = sequence[:spacer_start].upper()
-                                right_tale = sequence[spacer_end + 1:].upper()
-                                windows_df.at[index, f'Left TALE {left_index}'] = left_tale
-                                windows_df.at[index, f'Right TALE {right_index}'] = right_tale
-                                left_index += 1
-                                right_index += 1
-
-    finally:
-        os.unlink(temp_fasta_path)
-        os.unlink(temp_output_path)
+    talen_output_df = _annotate_matching_tales(
+        windows_df, _run_tale_nt([(f"Adjacent_bases_position_{position}", adjacent_bases)], tale_nt_params,
+                                 nospace_mtDNA))
 
     logger.info("All processing completed successfully.")
 
@@ -164,4 +255,131 @@ def process_mitoedit(mtdna_seq, position, mutant_base, bystander_df=None, tale_n
         'adjacent_bases': adjacent_bases,
         'fasta_content': fasta_content,
         'talen_output_df': talen_output_df
-    }
\ No newline at end of file
+    }
+
+
+def process_mitoedit_batch(mtdna_seq, targets, bystander_df=None, tale_nt_params=None, context_index=None,
+                           atlas=None, collapse_strategies=False):
+    """
+    Process many (position, mutant_base) targets against one sequence.
+
+    The sequence is normalized and indexed once, one pipeline instance is shared by all targets
+    of a pipeline and findTAL scans the adjacent bases of every target in a single pass. Each
+    target gets the same results process_mitoedit would return for it (the reference base is
+    read from the normalized sequence).
+
+    Args:
+        mtdna_seq (str or EncodedSequence): mtDNA sequence
+        targets (iterable): (position, mutant_base) pairs, positions 1-based; duplicates are processed once
+        bystander_df (pd.DataFrame, optional): DataFrame containing bystander effect annotations
+        tale_nt_params (dict, optional): TALE-NT parameters for findTAL analysis
+        context_index (ContextIndex, optional): Index built with ContextIndex.from_sequence(mtdna_seq)
+        atlas (Atlas, optional): Precomputed editability atlas, see process_mitoedit
+        collapse_strategies (bool, optional): See process_mitoedit
+
+    Returns:
+        dict: Results containing
+            - windows_df: windows of all targets, indexed by (Target Position, Target Mutant Base, window)
+            - bystanders_df: bystander annotations of all targets, indexed the same way
+            - results: {(position, mutant_base): process_mitoedit-style result dict} for successful targets
+            - errors: {(position, mutant_base): error message} for targets that could not be processed
+            - fasta_content: the adjacent bases of all targets as a multi-record FASTA
+            - talen_output_df: the complete findTAL output
+    """
+    nospace_mtDNA = normalize_sequence(mtdna_seq)
+    if context_index is None:
+        context_index = ContextIndex(nospace_mtDNA)
+    elif not context_index.matches(nospace_mtDNA):
+        raise ValueError("The supplied context index was built for a different sequence.")
+
+    if atlas is not None and not atlas.matches(nospace_mtDNA):
+        logger.warning("The supplied atlas does not match this sequence or code version; ignoring it.")
+        atlas = None
+
+    if tale_nt_params is None:
+        tale_nt_params = _default_tale_nt_params()
+
+    keys = list(dict.fromkeys((int(position), mutant_base.upper()) for position, mutant_base in targets))
+
+    # Group the targets by pipeline so every pipeline is instantiated once
+    groups = {}
+    errors = {}
+    for key in keys:
+        position, mutant_base = key
+        if not 1 <= position <= len(nospace_mtDNA):
+            errors[key] = f"Position {position} is outside the sequence of length {len(nospace_mtDNA)}"
+            continue
+        try:
+            groups.setdefault(select_pipeline(nospace_mtDNA[position - 1], mutant_base), []).append(key)
+        except ValueError as exc:
+            errors[key] = str(exc)
+
+    computed = {}
+    for (pipeline_name, pipeline_class), group_keys in groups.items():
+        logger.info(f"Processing {len(group_keys)} targets with pipeline {pipeline_name}")
+        pipeline_instance = _make_pipeline(pipeline_class, collapse_strategies)
+        for key in group_keys:
+            position = key[0]
+            try:
+                windows_df, adjacent_bases = _compute_windows(pipeline_name, pipeline_instance, nospace_mtDNA,
+                                                              position, context_index, atlas)
+                windows_df, bystanders_df = pipeline_instance.process_bystander_data(windows_df, bystander_df)
+            except ValueError as exc:
+                errors[key] = str(exc)
+                continue
+            computed[key] = (windows_df, bystanders_df, adjacent_bases)
+
+    for key, message in errors.items():
+        logger.warning(f"Skipping target {key[0]}{key[1]}: {message}")
+
+    adjacent_records = {key[0]: computed[key][2] for key in keys if key in computed}
+    fasta_records = {position: _fasta_record(position, bases) for position, bases in adjacent_records.items()}
+    fasta_content = ''.join(fasta_records.values())
+
+    if adjacent_records:
+        talen_output_df = _run_tale_nt(
+            [(f"Adjacent_bases_position_{position}", bases) for position, bases in adjacent_records.items()],
+            tale_nt_params, nospace_mtDNA)
+    else:
+        talen_output_df = pd.DataFrame()
+
+    results = {}
+    for key in keys:
+        if key not in computed:
+            continue
+        position = key[0]
+        windows_df, bystanders_df, adjacent_bases = computed[key]
+        if 'Sequence Name' in talen_output_df.columns:
+            target_talen_df = talen_output_df[
+                talen_output_df['Sequence Name'] == f"Adjacent_bases_position_{position}"
+            ].reset_index(drop=True)
+        else:
+            target_talen_df = talen_output_df
+        results[key] = {
+            'windows_df': windows_df,
+            'bystanders_df': bystanders_df,
+            'adjacent_bases': adjacent_bases,
+            'fasta_content': fasta_records[position],
+            'talen_output_df': _annotate_matching_tales(windows_df, target_talen_df)
+        }
+
+    logger.info(f"Processed {len(results)} of {len(keys)} targets.")
+
+    index_names = ['Target Position', 'Target Mutant Base', None]
+    if results:
+        all_windows_df = pd.concat([result['windows_df'] for result in results.values()],
+                                   keys=list(results), names=index_names)
+        all_bystanders_df = pd.concat([result['bystanders_df'] for result in results.values()],
+                                      keys=list(results), names=index_names)
+    else:
+        all_windows_df = pd.DataFrame(columns=WINDOW_COLUMNS)
+        all_bystanders_df = pd.DataFrame()
+
+    return {
+        'windows_df': all_windows_df,
+        'bystanders_df': all_bystanders_df,
+        'results': results,
+        'errors': errors,
+        'fasta_content': fasta_content,
+        'talen_output_df': talen_output_df
+    }
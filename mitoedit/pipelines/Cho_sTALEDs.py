@@ -1,6 +1,10 @@
 import logging
+from bisect import bisect_left
+import numpy as np
 logger = logging.getLogger(__name__)
 from .base_pipeline import BasePipeline
+from .circular_sequence import CircularSequence
+from .window_markup import WindowMarkup
 
 
 class ChosTALEDsPipeline(BasePipeline):
@@ -19,254 +23,137 @@ class ChosTALEDsPipeline(BasePipeline):
     - Optimized for mitochondrial DNA editing applications
     
     Unique Methods:
-    - _generate_windows_from_right_sTALED(): Generates editing windows from right sTALED
-    - _generate_windows_from_left_sTALED(): Generates editing windows from left sTALED
+    - _window_geometry(): Window placements from the left and right sTALED, shared by every target
+    - _process_editing_context(): Windows of one target, with bystanders read from the context index
     """
     
-    def __init__(self):
-        super().__init__()
-        self.pipeline_name = "Cho_G1397_sTALEDs"
+    # Contexts whose positions are editable for T→C and A→G edits respectively
+    T_CONTEXTS = ('CT', 'GT', 'TG', 'TC')
+    A_CONTEXTS = ('AC', 'AG', 'CA', 'GA')
 
-    def _generate_windows_from_right_sTALED(self, circular_seq, pos, window_size):
-        """Generate windows from right sTALED"""
-        logger.debug("Generating windows from right sTALED.")
-        windows = []
-        for i in range(5, window_size - 4):
-            start_index = pos - i
-            end_index = pos + (window_size - i)
-            window = circular_seq[start_index:end_index]
-            windows.append(window)
-        return windows
+    # Window sources in reporting order. With the AD on the right TALE the windows are placed by the
+    # left sTALED and numbered from the 3' end; with the AD on the left TALE they are placed by the
+    # right sTALED and numbered from the 5' end.
+    WINDOW_SOURCES = (
+        ("sTALED with AD on the right_TALE", "3'"),
+        ("sTALED with AD on the left_TALE", "5'"),
+    )
 
-    def _generate_windows_from_left_sTALED(self, circular_seq, pos, window_size):
-        """Generate windows from left sTALED"""
-        logger.debug("Generating windows from left sTALED.")
-        windows = []
-        for i in range(5, window_size - 4):
-            start_index = pos - (window_size - i)
-            end_index = pos + i
-            window = circular_seq[start_index:end_index]
-            windows.append(window)
-        return windows
+    # Bases reported by the first-base contexts (GA, CA, CT, GT) and by the second-base contexts
+    # (AC, AG, TG, TC) of either edit; they are marked as bystanders inside the windows
+    FIRST_BASE_CONTEXTS = ('GA', 'CA', 'CT', 'GT')
+    SECOND_BASE_CONTEXTS = ('AC', 'AG', 'TG', 'TC')
 
-    def process_mtDNA(self, mtDNA_seq, pos):
-        """Main function which processes the DNA"""
-        logger.info(f"Processing mtDNA sequence for position {pos}.")
+    # Windows of every size and target offset lie within this many bases of the target
+    WINDOW_REACH = 13
+
+    def __init__(self, lazy_markup=False):
+        super().__init__(lazy_markup)
+        self.pipeline_name = "Cho_G1397_sTALEDs"
+        self._geometry = None
+
+    def _window_geometry(self):
+        """
+        Return the windows generated around every target, in reporting order.
+
+        Each entry describes one window relative to the target position pos:
+        (window source, window size, description, window start - pos, target index,
+         first-base mark range, second-base mark range, first-base position shift, second-base position shift).
+        Window index k reads the circular sequence at 0-based pos + start + k. Bystanders are marked at the
+        indexes of the mark ranges holding a reported base, and reported at genome position
+        pos + start + 1 + k + shift (wrapped around the origin), the positions the window scans have always given.
+        The geometry does not depend on the sequence or position, so it is built once per instance.
+        """
+        if self._geometry is None:
+            geometry = []
+            for window_source, end in self.WINDOW_SOURCES:
+                for window_size in range(14, 19):  # for window sizes of 14-18bp long --> MAJOR ASSUMPTION!!
+                    for num in range(5, window_size - 4):
+                        if end == "5'":
+                            geometry.append((window_source, window_size, f"Position {num} from the 5' end",
+                                             -num, num - 1, (3, 11), (5, 13), 0, -2))
+                        else:
+                            geometry.append((window_source, window_size, f"Position {num} from the 3' end",
+                                             num - window_size, window_size - num,
+                                             (window_size - 13, window_size - 5), (window_size - 11, window_size - 3), -1, -3))
+            self._geometry = geometry
+        return self._geometry
 
-        nospace_mtDNA = self._capitalize(self._remove_whitespace(mtDNA_seq))
-        T_positions = []
-        A_positions = []
-        # list to store positions where 'T' is present in the mtDNA sequence
-        all_T_positions = self._find_consecutive_CT_sequences(nospace_mtDNA) + self._find_consecutive_GT_sequences(nospace_mtDNA) + self._find_consecutive_TG_sequences(nospace_mtDNA) + self._find_consecutive_TC_sequences(nospace_mtDNA)
-        [T_positions.append(x) for x in all_T_positions if x not in T_positions]
-        # list to store positions where 'A' is present in the mtDNA sequence
-        all_A_positions = self._find_consecutive_AC_sequences(nospace_mtDNA) + self._find_consecutive_AG_sequences(nospace_mtDNA) + self._find_consecutive_CA_sequences(nospace_mtDNA) + self._find_consecutive_GA_sequences(nospace_mtDNA)
-        [A_positions.append(x) for x in all_A_positions if x not in A_positions]
+    def _process_editing_context(self, nospace_mtDNA, pos, context_index, ref, mut):
+        """Generate the windows of an editable T (T→C) or A (A→G) target; ref is the base whose neighbours count as bystanders"""
+        all_windows = []
+        circular_seq = CircularSequence(nospace_mtDNA)
+        start_index = pos - (16 + 15)
+        end_index = pos + (15 + 15)
+        # Adjacent bases and windows wrap around the origin of the circular genome
+        adjacent_bases = circular_seq.wrap_slice(start_index, end_index)
+        left_adjacent_bases = adjacent_bases[:30] #(base 0 to 29)
+        right_adjacent_bases = adjacent_bases[31:] #(base 31 to 59)
+        logger.info(f"The left and right adjacent bases are: {left_adjacent_bases} and {right_adjacent_bases}")
+        other = 'A' if ref == 'T' else 'T'
+        FLAG = None
         dummy = 0
+        #checking the position of the adjacent base --> if the same base is present on either side --> then off-target
+        if right_adjacent_bases[0] == ref:
+            dummy += 1
+            FLAG = True
+        if left_adjacent_bases[-1] == ref:
+            dummy += 1
+            FLAG = True
+        if right_adjacent_bases[0] == other or left_adjacent_bases[-1] == other:
+            FLAG = True
 
-        if pos in T_positions:
-            ref, mut, all_windows,dum = 'T', 'C',[],[]
-            circular_seq = nospace_mtDNA + nospace_mtDNA
-            start_index = pos - (16 + 15)
-            end_index = pos + (15 + 15)
-            adjacent_bases = circular_seq[start_index:end_index]
-            marked_adjacent = self._mark_bases(adjacent_bases, 31, self._find_consecutive_GA_sequences(adjacent_bases) + self._find_consecutive_TC_sequences(adjacent_bases) + self._find_consecutive_AC_sequences(adjacent_bases) + self._find_consecutive_AG_sequences(adjacent_bases) + self._find_consecutive_CA_sequences(adjacent_bases) + self._find_consecutive_CT_sequences(adjacent_bases) + self._find_consecutive_GT_sequences(adjacent_bases) + self._find_consecutive_TG_sequences(adjacent_bases))
-            #logger.info("The 60 adjacent bases to my target base are:", marked_adjacent)
-            left_adjacent_bases = adjacent_bases[:30] #(base 0 to 29)
-            right_adjacent_bases = adjacent_bases[31:] #(base 31 to 59)
-            logger.info(f"The left and right adjacent bases are: {left_adjacent_bases} and {right_adjacent_bases}")
-            FLAG=None
-            #checking the position of the adjacent base --> if T present on either side --> then off-target
-            if right_adjacent_bases[0] == 'T':
-                dummy = 1
-                dum.append(pos+1)
-                FLAG=True
-            if left_adjacent_bases[-1] =='T':
-                dummy += 1
-                dum.append(pos-1)
-                FLAG=True
-            if right_adjacent_bases[0] == 'A':
-                FLAG=True
-            if left_adjacent_bases[-1] =='A':
-                FLAG=True
-            for window_source in ["sTALED with AD on the right_TALE", "sTALED with AD on the left_TALE"]:
-                for window_size in range(14, 19): #for window sizes of 14-18bp long --> MAJOR ASSUMPTION!!
-                    if window_source == "sTALED with AD on the left_TALE":
-                        sTALED_left_T_windows = self._generate_windows_from_right_sTALED(circular_seq, pos, window_size) #generating the TC windows(14bp-18bp)
-                        TALES=False
-                        for num, window in enumerate(sTALED_left_T_windows, start=5):
-                            window_desc = f"Position {num} from the 5' end"
-                            ws = f"{window_size}bp"
-                            #off_target_sites_set = count_TC_sequences(window[4:13]) | count_GA_sequences(window[3:12]) | count_AC_sequences(window[4:13]) | count_AG_sequences(window[4:13]) | count_CA_sequences(window[3:12]) | count_CT_sequences(window[3:12]) | count_GT_sequences(window[3:12]) | count_TG_sequences(window[4:13]) #finds the off-target sites in each window
-                            #if dummy:
-                            #    off_target_sites_set.add(dummy)
-                            marked_window = self._mark_bases(window, num, [(x + 3) for x in self._find_consecutive_GA_sequences(window[3:12])] + [(x + 4) for x in self._find_consecutive_AC_sequences(window[4:13])] + [(x + 4) for x in self._find_consecutive_AG_sequences(window[4:13])] + [(x + 3) for x in self._find_consecutive_CA_sequences(window[3:12])] + [(x + 3) for x in self._find_consecutive_CT_sequences(window[3:12])] + [(x + 3) for x in self._find_consecutive_GT_sequences(window[3:12])] + [(x + 4) for x in self._find_consecutive_TG_sequences(window[4:13])] + [(x + 4) for x in self._find_consecutive_TC_sequences(window[4:13])])
-                            off_target_sites = marked_window.count('{') + dummy #because the original counting method was including the duplicate values in case of multiple contextss --> so now im counting on basis of number of '{' after marking the windows
-                            int_pos_end = marked_window.find(']')
-                            int_pos_ini = marked_window.find('[')
-                            #to deal with T on either sides of the --> so it can be present in any context
-                            if marked_window[int_pos_end + 1] == 'T':
-                                final_window = self._mark_base_at_position(marked_window, int_pos_end + 1)
-                            elif marked_window[int_pos_ini - 1] == 'T':
-                                final_window = self._mark_base_at_position(marked_window, int_pos_ini - 1)
-                            else:
-                                final_window = marked_window
-                            start_position = pos -num + 1
-                            ac_positions = self._find_N_positions(window[4:13], start_position + 3 , 'AC')
-                            tc_positions = self._find_N_positions(window[4:13], start_position + 3 , 'TC')
-                            ag_positions = self._find_N_positions(window[4:13], start_position + 3 , 'AG')
-                            tg_positions = self._find_N_positions(window[4:13], start_position + 3 , 'TG')
-                            ca_positions = self._find_N_positions(window[3:12], start_position + 3, 'CA')
-                            ct_positions = self._find_N_positions(window[3:12], start_position + 3, 'CT')
-                            ga_positions = self._find_N_positions(window[3:12], start_position + 3, 'GA')
-                            gt_positions = self._find_N_positions(window[3:12], start_position + 3, 'GT')
-                            ftc = tc_positions + tg_positions + ct_positions + gt_positions
-                            ftg = ac_positions + ag_positions + ca_positions + ga_positions
-                            ftg = [x for x in ftg if x != pos]
-                            ftc = [x for x in ftc if x != pos]
-                            combined_set = set(ftc + ftg)
-                            combined_set = set(ftc + ftg)  # Combine into a set
-                            sorted_combined = sorted(combined_set) if combined_set else []  # Sort if not empty, else return [0]
-                            all_windows.append((self.pipeline_name, window_source, pos, ref, mut, ws, final_window, window_desc, off_target_sites, sorted_combined, TALES, FLAG))
-    
-                    elif window_source == "sTALED with AD on the right_TALE":
-                        sTALED_right_T_windows = self._generate_windows_from_left_sTALED(circular_seq, pos, window_size) #generating the TC windows(14bp-18bp)
-                        TALES=False
-                        for num, window in enumerate(sTALED_right_T_windows, start=5):
-                            window_desc = f"Position {num} from the 3' end"
-                            ws = f"{window_size}bp"
-                            #off_target_sites_set = count_TC_sequences(window[-13:-4]) | count_GA_sequences(window[-13:-4]) | count_AC_sequences(window[-13:-4]) | count_AG_sequences(window[-13:-4]) | count_CA_sequences(window[-13:-4]) | count_CT_sequences(window[-13:-4]) | count_GT_sequences(window[-13:-4]) | count_TG_sequences(window[-13:-4]) #finds the off-target sites in each window
-                            #if dummy:
-                            #    off_target_sites_set.add(dummy)
-                            #off_target_sites = len(off_target_sites_set)
-                            marked_window = self._mark_bases(window, window_size - num + 1, [(x + window_size - 12) for x in self._find_consecutive_AG_sequences(window[-12:-3])] + [(x + window_size - 12) for x in self._find_consecutive_AC_sequences(window[-12:-3])] + [(x + window_size - 13) for x in self._find_consecutive_GA_sequences(window[-13:-4])] + [(x + window_size - 13) for x in self._find_consecutive_CA_sequences(window[-13:-4])] + [(x + window_size - 12) for x in self._find_consecutive_TC_sequences(window[-12:-3])] + [(x + window_size - 12) for x in self._find_consecutive_TG_sequences(window[-12:-3])] + [(x + window_size - 13) for x in self._find_consecutive_GT_sequences(window[-13:-4])] + [(x + window_size - 13) for x in self._find_consecutive_CT_sequences(window[-13:-4])])
-                            off_target_sites = marked_window.count('{') + dummy
-                            int_pos_end = marked_window.find(']')
-                            int_pos_ini = marked_window.find('[')
-                            #to deal with T on either sides of the --> so it can be present in any context
-                            if marked_window[int_pos_end + 1] == 'T':
-                                final_window = self._mark_base_at_position(marked_window, int_pos_end + 1)
-                            elif marked_window[int_pos_ini - 1] == 'T':
-                                final_window = self._mark_base_at_position(marked_window, int_pos_ini - 1)
-                            else:
-                                final_window = marked_window
-                            start_position = pos - (window_size-num)
-                            ac_positions = self._find_N_positions(window[-12:-3], start_position +window_size- 12 - 1, 'AC')
-                            tc_positions = self._find_N_positions(window[-12:-3], start_position +window_size- 12 - 1, 'TC')
-                            ag_positions = self._find_N_positions(window[-12:-3], start_position +window_size -12 - 1, 'AG')
-                            tg_positions = self._find_N_positions(window[-12:-3], start_position +window_size -12 - 1, 'TG')
-                            ca_positions = self._find_N_positions(window[-13:-4], start_position +window_size- 13, 'CA')
-                            ct_positions = self._find_N_positions(window[-13:-4], start_position +window_size- 13, 'CT')
-                            ga_positions = self._find_N_positions(window[-13:-4], start_position +window_size- 13, 'GA')
-                            gt_positions = self._find_N_positions(window[-13:-4], start_position +window_size- 13, 'GT')
-                            ftc = tc_positions + tg_positions + ct_positions + gt_positions
-                            ftg = ac_positions + ag_positions + ca_positions + ga_positions
-                            ftg = [x for x in ftg if x != pos]
-                            ftc = [x for x in ftc if x != pos]
-                            combined_set = set(ftc + ftg)
-                            combined_set = set(ftc + ftg)  # Combine into a set
-                            sorted_combined = sorted(combined_set) if combined_set else []  # Sort if not empty, else return [0]
-                            all_windows.append((self.pipeline_name, window_source, pos, ref, mut, ws, final_window, window_desc, off_target_sites, sorted_combined, TALES, FLAG))
+        # Sorted region indexes of the reported bases of the circular sequence around the target,
+        # read from the genome-wide masks; each window takes a slice of them
+        sequence_length = len(nospace_mtDNA)
+        region_start = pos - self.WINDOW_REACH
+        region = circular_seq.wrap_slice(region_start, pos + self.WINDOW_REACH)
+        region_index = np.arange(region_start, region_start + len(region)) % sequence_length
+        first_marks = np.flatnonzero(context_index.circular_mask(self.FIRST_BASE_CONTEXTS)[region_index]).tolist()
+        second_marks = np.flatnonzero(context_index.circular_mask(self.SECOND_BASE_CONTEXTS)[region_index]).tolist()
 
-        elif pos in A_positions:
-            logger.info("Base at position %d is in a editable context.", pos)
-            ref, mut, all_windows, dum = 'A', 'G', [], []
-            circular_seq = nospace_mtDNA + nospace_mtDNA
-            start_index = pos - (16 + 15)
-            end_index = pos + (15 + 15)
-            adjacent_bases = circular_seq[start_index:end_index]
-            marked_adjacent = self._mark_bases(adjacent_bases, 31, self._find_consecutive_GA_sequences(adjacent_bases) + self._find_consecutive_TC_sequences(adjacent_bases) + self._find_consecutive_AC_sequences(adjacent_bases) + self._find_consecutive_AG_sequences(adjacent_bases) + self._find_consecutive_CA_sequences(adjacent_bases) + self._find_consecutive_CT_sequences(adjacent_bases) + self._find_consecutive_GT_sequences(adjacent_bases) + self._find_consecutive_TG_sequences(adjacent_bases))
-            left_adjacent_bases = adjacent_bases[:30] #(base 0 to 29)
-            right_adjacent_bases = adjacent_bases[31:] #(base 31 to 59)
-            logger.info(f"The left and right adjacent bases are: {left_adjacent_bases} and {right_adjacent_bases}")
-            FLAG=None
-            #checking the position of the adjacent base --> if T present on either side --> then off-target
-            if right_adjacent_bases[0] == 'A':
-                dummy = 1
-                dum.append(pos+1)
-                FLAG=True
-            if left_adjacent_bases[-1] =='A':
-                dummy += 1
-                dum.append(pos-1)
-                FLAG=True
-            if right_adjacent_bases[0] == 'T':
-                FLAG=True
-            if left_adjacent_bases[-1] =='T':
-                FLAG=True
-            for window_source in ["sTALED with AD on the right_TALE", "sTALED with AD on the left_TALE"]: 
-                for window_size in range(14, 19): #for window sizes of 14-18bp long
-                    if window_source == "sTALED with AD on the right_TALE":
-                        sTALED_left_A_windows = self._generate_windows_from_left_sTALED(circular_seq, pos, window_size) #generating the A windows(14bp-18bp)
-                        TALES=False
-                        for num, window in enumerate(sTALED_left_A_windows, start=5):
-                            window_desc = f"Position {num} from the 3' end"
-                            ws = f"{window_size}bp"
-                            #off_target_sites = count_T_sequences(window[-13:-4]) + count_A_sequences(window[-13:-4])  #+dummy #finds the off-target sites in each window
-                            marked_window = self._mark_bases(window, window_size - num + 1, [(x + window_size - 12) for x in self._find_consecutive_AG_sequences(window[-12:-3])] + [(x + window_size - 12) for x in self._find_consecutive_AC_sequences(window[-12:-3])] + [(x + window_size - 13) for x in self._find_consecutive_GA_sequences(window[-13:-4])] + [(x + window_size - 13) for x in self._find_consecutive_CA_sequences(window[-13:-4])] + [(x + window_size - 12) for x in self._find_consecutive_TC_sequences(window[-12:-3])] + [(x + window_size - 12) for x in self._find_consecutive_TG_sequences(window[-12:-3])] + [(x + window_size - 13) for x in self._find_consecutive_GT_sequences(window[-13:-4])] + [(x + window_size - 13) for x in self._find_consecutive_CT_sequences(window[-13:-4])])
-                            off_target_sites = marked_window.count('{') + dummy
-                            int_pos_end = marked_window.find(']')
-                            int_pos_ini = marked_window.find('[')
-                            #to deal with T on either sides of the --> so it can be present in any context
-                            if marked_window[int_pos_end + 1] == 'A':
-                                final_window = self._mark_base_at_position(marked_window, int_pos_end + 1)
-                            elif marked_window[int_pos_ini - 1] == 'A':
-                                final_window = self._mark_base_at_position(marked_window, int_pos_ini - 1)
-                            else:
-                                final_window = marked_window
-                            start_position = pos - (window_size-num)
-                            ac_positions = self._find_N_positions(window[-12:-3], start_position +window_size- 12 - 1, 'AC')
-                            tc_positions = self._find_N_positions(window[-12:-3], start_position +window_size- 12 - 1, 'TC')
-                            ag_positions = self._find_N_positions(window[-12:-3], start_position +window_size -12 - 1, 'AG')
-                            tg_positions = self._find_N_positions(window[-12:-3], start_position +window_size -12 - 1, 'TG')
-                            ca_positions = self._find_N_positions(window[-13:-4], start_position +window_size- 13, 'CA')
-                            ct_positions = self._find_N_positions(window[-13:-4], start_position +window_size- 13, 'CT')
-                            ga_positions = self._find_N_positions(window[-13:-4], start_position +window_size- 13, 'GA')
-                            gt_positions = self._find_N_positions(window[-13:-4], start_position +window_size- 13, 'GT')
-                            ftc = tc_positions + tg_positions + ct_positions + gt_positions
-                            ftg = ac_positions + ag_positions + ca_positions + ga_positions
-                            ftg = [x for x in ftg if x != pos]
-                            ftc = [x for x in ftc if x != pos]
-                            combined_set = set(ftc + ftg)  # Combine into a set
-                            sorted_combined = sorted(combined_set) if combined_set else []  # Sort if not empty, else return [0]
-                            all_windows.append((self.pipeline_name, window_source, pos, ref, mut, ws, final_window, window_desc, off_target_sites, sorted_combined, TALES, FLAG))
+        TALES = False
+        for (window_source, window_size, window_desc, start, target_index,
+             (first_lo, first_hi), (second_lo, second_hi), first_shift, second_shift) in self._window_geometry():
+            offset = start + self.WINDOW_REACH  # window start inside the region
+            target = offset + target_index
+            first_indexes = [k - offset for k in first_marks[bisect_left(first_marks, offset + first_lo):
+                                                            bisect_left(first_marks, offset + first_hi)]]
+            second_indexes = [k - offset for k in second_marks[bisect_left(second_marks, offset + second_lo):
+                                                              bisect_left(second_marks, offset + second_hi)]]
+            marks = set(first_indexes)
+            marks.update(second_indexes)
+            marks.discard(target_index)
+            off_target_sites = len(marks) + dummy
+            #to deal with the same base on either side of the target --> so it can be present in any context
+            shown = set(marks)
+            if target_index + 1 not in marks and region[target + 1] == ref:
+                shown.add(target_index + 1)
+            elif target_index - 1 not in marks and region[target - 1] == ref:
+                shown.add(target_index - 1)
+            final_window = WindowMarkup(region, offset, window_size, target_index, sorted(shown))
+            window_position = pos + start + 1
+            # Positions before the origin or after the last base wrap to 1..sequence_length
+            bystanders = {(window_position + k + first_shift - 1) % sequence_length + 1 for k in first_indexes}
+            bystanders.update((window_position + k + second_shift - 1) % sequence_length + 1 for k in second_indexes)
+            bystanders.discard(pos)
+            all_windows.append((self.pipeline_name, window_source, pos, ref, mut, f"{window_size}bp", final_window,
+                                window_desc, off_target_sites, sorted(bystanders), TALES, FLAG))
+        return self._render_windows(all_windows), adjacent_bases
 
-                    elif window_source == "sTALED with AD on the left_TALE":
-                        sTALED_right_A_windows = self._generate_windows_from_right_sTALED(circular_seq, pos, window_size) #generating the A windows(14bp-18bp)
-                        TALES=False
-                        for num, window in enumerate(sTALED_right_A_windows, start=5):
-                            window_desc = f"Position {num} from the 5' end"
-                            ws = f"{window_size}bp"
+    def process_mtDNA(self, mtDNA_seq, pos, context_index=None):
+        """Main function which processes the DNA"""
+        logger.info(f"Processing mtDNA sequence for position {pos}.")
 
-                            marked_window = self._mark_bases(window, num, [(x + 3) for x in self._find_consecutive_GA_sequences(window[3:12])] + [(x + 4) for x in self._find_consecutive_AC_sequences(window[4:13])] + [(x + 4) for x in self._find_consecutive_AG_sequences(window[4:13])] + [(x + 3) for x in self._find_consecutive_CA_sequences(window[3:12])] + [(x + 3) for x in self._find_consecutive_CT_sequences(window[3:12])] + [(x + 3) for x in self._find_consecutive_GT_sequences(window[3:12])] + [(x + 4) for x in self._find_consecutive_TG_sequences(window[4:13])] + [(x + 4) for x in self._find_consecutive_TC_sequences(window[4:13])])
-                            off_target_sites = marked_window.count('{') + dummy
-                            int_pos_end = marked_window.find(']')
-                            int_pos_ini = marked_window.find('[')
-                            #to deal with T on either sides of the --> so it can be present in any context
-                            if marked_window[int_pos_end + 1] == 'A':
-                                final_window = self._mark_base_at_position(marked_window, int_pos_end + 1)
-                            elif marked_window[int_pos_ini - 1] == 'A':
-                                final_window = self._mark_base_at_position(marked_window, int_pos_ini - 1)
-                            else:
-                                final_window = marked_window
-                            start_position = pos -num + 1
-                            ac_positions = self._find_N_positions(window[4:13], start_position + 3 , 'AC')
-                            tc_positions = self._find_N_positions(window[4:13], start_position + 3 , 'TC')
-                            ag_positions = self._find_N_positions(window[4:13], start_position + 3 , 'AG')
-                            tg_positions = self._find_N_positions(window[4:13], start_position + 3 , 'TG')
-                            ca_positions = self._find_N_positions(window[3:12], start_position + 3, 'CA')
-                            ct_positions = self._find_N_positions(window[3:12], start_position + 3, 'CT')
-                            ga_positions = self._find_N_positions(window[3:12], start_position + 3, 'GA')
-                            gt_positions = self._find_N_positions(window[3:12], start_position + 3, 'GT')
-                            ftc = tc_positions + tg_positions + ct_positions + gt_positions
-                            ftg = ac_positions + ag_positions + ca_positions + ga_positions
-                            ftg = [x for x in ftg if x != pos]
-                            ftc = [x for x in ftc if x != pos]
-                            combined_set = set(ftc + ftg)  # Combine into a set
-                            sorted_combined = sorted(combined_set) if combined_set else []  # Sort if not empty, else return [0]
-                            all_windows.append((self.pipeline_name, window_source, pos, ref, mut, ws, final_window, window_desc, off_target_sites, sorted_combined, TALES, FLAG))
+        nospace_mtDNA = self._normalize(mtDNA_seq)
+        context_index = self._get_context_index(nospace_mtDNA, context_index)
 
+        if context_index.contains_any(self.T_CONTEXTS, pos):
+            return self._process_editing_context(nospace_mtDNA, pos, context_index, 'T', 'C')
+
+        elif context_index.contains_any(self.A_CONTEXTS, pos):
+            logger.info("Base at position %d is in a editable context.", pos)
+            return self._process_editing_context(nospace_mtDNA, pos, context_index, 'A', 'G')
 
         else:
             raise ValueError(f"Base at position {pos} is not in a editable context and cannot be edited by the {self.pipeline_name} pipeline.")
-
-        return all_windows, adjacent_bases
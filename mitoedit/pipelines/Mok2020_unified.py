@@ -1,6 +1,8 @@
 import logging
+import numpy as np
 logger = logging.getLogger(__name__)
 from .base_pipeline import BasePipeline
+from .circular_sequence import CircularSequence
 
 
 class Mok2020UnifiedPipeline(BasePipeline):
@@ -26,11 +28,32 @@ class Mok2020UnifiedPipeline(BasePipeline):
     - Supports all sequence contexts from original pipelines
     - Returns combined results from all sub-approaches
     - Single adjacent_bases output (same for all variants)
+    - Windows and adjacent bases wrap around the origin of the circular genome
+    - Windows shared by several strategies are computed once and either reported per strategy
+      (default) or once with their strategy set (collapse_strategies=True)
     """
     
-    def __init__(self):
-        super().__init__()
+    # Editable contexts in lookup order: (context, reference base, mutant base)
+    EDITING_CONTEXTS = [
+        ('TC', 'C', 'T'),
+        ('AC', 'C', 'T'),
+        ('CC', 'C', 'T'),
+        ('GA', 'G', 'A'),
+        ('GT', 'G', 'A'),
+        ('GG', 'G', 'A'),
+    ]
+
+    def __init__(self, collapse_strategies=False, lazy_markup=False):
+        """
+        Args:
+            collapse_strategies (bool): Report each unique window once, with the strategies producing it
+                joined by '+' (e.g. "G1397+G1333+DddA11"), instead of one row per strategy
+            lazy_markup (bool): Accepted for a uniform constructor; the windows of this pipeline are unmarked
+        """
+        super().__init__(lazy_markup)
         self.pipeline_name = "Mok2020_Unified"
+        self.collapse_strategies = collapse_strategies
+        self._geometry = None
 
     def _get_g1397_position_range(self, window_size):
         """Get the position range for G1397 window generation."""
@@ -44,96 +67,142 @@ class Mok2020UnifiedPipeline(BasePipeline):
         """Get the position range for DddA11 window generation."""
         return range(4, window_size - 3)
 
+    def _window_geometry(self):
+        """
+        Return the window geometry shared by every position.
+
+        The G1397 and DddA11 ranges are identical and contained in the G1333 range, so the same
+        (window size, target offset) pair is produced by up to three strategies. The geometry holds:
+        - window_sizes, target_offsets: arrays of the unique pairs, in order of first appearance
+        - strategy_sets: list with the strategies producing each unique pair
+        - strategy_names, unique_index: the expanded (strategy, pair) rows in reporting order
+          (strategy, then window size, then offset) and the unique pair each of them uses
+
+        The geometry does not depend on the sequence or position, so it is built once per instance.
+        """
+        if self._geometry is None:
+            strategies = [
+                ("G1397", self._get_g1397_position_range),
+                ("G1333", self._get_g1333_position_range),
+                ("DddA11", self._get_ddda11_position_range)
+            ]
+            unique_pairs = {}
+            strategy_sets = []
+            strategy_names, unique_index = [], []
+            for strategy_name, position_range_func in strategies:
+                for window_size in range(14, 21):
+                    for target_pos in position_range_func(window_size):
+                        index = unique_pairs.setdefault((window_size, target_pos), len(unique_pairs))
+                        if index == len(strategy_sets):
+                            strategy_sets.append([])
+                        strategy_sets[index].append(strategy_name)
+                        strategy_names.append(strategy_name)
+                        unique_index.append(index)
+            self._geometry = {
+                'window_sizes': np.array([size for size, _ in unique_pairs], dtype=np.int64),
+                'target_offsets': np.array([offset for _, offset in unique_pairs], dtype=np.int64),
+                'strategy_sets': strategy_sets,
+                'strategy_names': strategy_names,
+                'unique_index': np.array(unique_index, dtype=np.int64),
+            }
+        return self._geometry
+
     def _process_context_all_variants(self, nospace_mtDNA, pos, context_positions, ref_base, mut_base, edit_type):
         """Process a context using all three positioning strategies."""
-        all_windows = []
-        
-        # Generate circular sequence for window extraction
-        circular_seq = nospace_mtDNA + nospace_mtDNA
-        
-        # Calculate adjacent bases (same for all variants)
+        sequence_length = len(nospace_mtDNA)
+        circular_seq = CircularSequence(nospace_mtDNA)
+
+        # Calculate adjacent bases (same for all variants), wrapping around the origin
         start_index = pos - 31
         end_index = pos + 30
-        adjacent_bases = circular_seq[start_index:end_index]
-        
-        # Process with all three positioning strategies
-        strategies = [
-            ("G1397", self._get_g1397_position_range),
-            ("G1333", self._get_g1333_position_range),
-            ("DddA11", self._get_ddda11_position_range)
-        ]
-        
-        for strategy_name, position_range_func in strategies:
-            for window_size in range(14, 21):
-                position_range = position_range_func(window_size)
-                
-                for target_pos in position_range:
-                    start_pos = pos - target_pos
-                    end_pos = start_pos + window_size
-                    
-                    if start_pos < 1 or end_pos > len(nospace_mtDNA):
-                        continue
-                    
-                    window = circular_seq[start_pos - 1:end_pos - 1]
-                    
-                    # Find bystander positions in this window
-                    bystander_positions = []
-                    for ctx_pos in context_positions:
-                        if start_pos <= ctx_pos <= end_pos and ctx_pos != pos:
-                            bystander_positions.append(ctx_pos)
-                    
-                    # Create window data tuple
-                    window_data = (
-                        f"{self.pipeline_name}_{strategy_name}",  # Pipeline variant name
-                        pos,                                      # Target position
-                        ref_base,                                # Reference base
-                        mut_base,                                # Mutant base
-                        f"{window_size}bp",                      # Window size
-                        window,                                  # Window sequence
-                        f"Position {target_pos}",               # Target position in window
-                        len(bystander_positions),               # Bystander count
-                        bystander_positions,                    # Bystander positions
-                        edit_type,                              # Edit type description
-                        strategy_name                           # Strategy identifier
-                    )
-                    
-                    all_windows.append(window_data)
-        
+        adjacent_bases = circular_seq.wrap_slice(start_index, end_index)
+
+        geometry = self._window_geometry()
+        window_sizes = geometry['window_sizes']
+        target_offsets = geometry['target_offsets']
+
+        # Window bounds for every unique (size, offset). Bounds outside [1, sequence_length]
+        # denote windows crossing the origin of the circular genome.
+        start_pos = pos - target_offsets
+        end_pos = start_pos + window_sizes
+        keep = window_sizes < sequence_length
+
+        # Bystanders are the context positions in [start_pos, end_pos] other than pos itself.
+        # Window coordinates c <= 0 and c > sequence_length map to positions c + length and
+        # c - length, so each window is matched against the context positions in three passes,
+        # listed in window order: before the origin, inside the sequence, after the end.
+        context_array = np.asarray(context_positions, dtype=np.int64)
+        context_list = context_array.tolist()
+        segments = []
+        for shift in (sequence_length, 0, -sequence_length):
+            segments.append((np.searchsorted(context_array, start_pos + shift, side='left'),
+                             np.searchsorted(context_array, end_pos + shift, side='right')))
+        lo, hi = segments[1]
+        target_index = int(np.searchsorted(context_array, pos, side='left'))
+        if target_index < len(context_list) and context_list[target_index] == pos:
+            has_target = (lo <= target_index) & (target_index < hi)
+        else:
+            has_target = np.zeros(len(lo), dtype=bool)
+        bystander_counts = sum(last - first for first, last in segments) - has_target
+
+        # Cut and scan each unique window once
+        windows = {}
+        for index in np.flatnonzero(keep).tolist():
+            start, end = int(start_pos[index]), int(end_pos[index])
+            bystander_positions = []
+            for segment, (first, last) in enumerate(segments):
+                first, last = int(first[index]), int(last[index])
+                if segment == 1 and has_target[index]:
+                    bystander_positions += context_list[first:target_index] + context_list[target_index + 1:last]
+                else:
+                    bystander_positions += context_list[first:last]
+            windows[index] = (circular_seq.wrap_slice(start - 1, end - 1), int(bystander_counts[index]),
+                              bystander_positions)
+
+        # Fan the windows out to one row per strategy, or one row per window with its strategy set
+        if self.collapse_strategies:
+            rows = [(index, '+'.join(geometry['strategy_sets'][index])) for index in windows]
+        else:
+            rows = [(index, strategy_name)
+                    for strategy_name, index in zip(geometry['strategy_names'], geometry['unique_index'].tolist())
+                    if index in windows]
+
+        all_windows = []
+        for index, strategy_name in rows:
+            window, bystander_count, bystander_positions = windows[index]
+
+            # Create window data tuple
+            window_data = (
+                f"{self.pipeline_name}_{strategy_name}",  # Pipeline variant name
+                pos,                                      # Target position
+                ref_base,                                # Reference base
+                mut_base,                                # Mutant base
+                f"{int(window_sizes[index])}bp",         # Window size
+                window,                                  # Window sequence
+                f"Position {int(target_offsets[index])}",  # Target position in window
+                bystander_count,                        # Bystander count
+                list(bystander_positions),              # Bystander positions
+                edit_type,                              # Edit type description
+                strategy_name                           # Strategy identifier
+            )
+
+            all_windows.append(window_data)
+
         return all_windows, adjacent_bases
 
-    def process_mtDNA(self, mtDNA_seq, pos):
+    def process_mtDNA(self, mtDNA_seq, pos, context_index=None):
         """Main function which processes the DNA using all Mok2020 variants."""
         logger.info(f"Processing mtDNA sequence for position {pos} using unified Mok2020 pipeline.")
         
-        nospace_mtDNA = self._capitalize(self._remove_whitespace(mtDNA_seq))
-        
-        # Find all context positions (from all variants)
-        consecutive_TC_positions = self._find_consecutive_TC_sequences(nospace_mtDNA)
-        consecutive_AC_positions = self._find_consecutive_AC_sequences(nospace_mtDNA)
-        consecutive_CC_positions = self._find_consecutive_CC_sequences(nospace_mtDNA)
-        consecutive_GA_positions = self._find_consecutive_GA_sequences(nospace_mtDNA)
-        consecutive_GT_positions = self._find_consecutive_GT_sequences(nospace_mtDNA)
-        consecutive_GG_positions = self._find_consecutive_GG_sequences(nospace_mtDNA)
+        nospace_mtDNA = self._normalize(mtDNA_seq)
+        context_index = self._get_context_index(nospace_mtDNA, context_index)
         
         # Check which context the position belongs to and process with all variants
-        if pos in consecutive_TC_positions:
-            logger.info(f"Base at position {pos} is in a 5'-TC context.")
-            return self._process_context_all_variants(nospace_mtDNA, pos, consecutive_TC_positions, 'C', 'T', "C→T (TC context)")
-        elif pos in consecutive_AC_positions:
-            logger.info(f"Base at position {pos} is in a 5'-AC context.")
-            return self._process_context_all_variants(nospace_mtDNA, pos, consecutive_AC_positions, 'C', 'T', "C→T (AC context)")
-        elif pos in consecutive_CC_positions:
-            logger.info(f"Base at position {pos} is in a 5'-CC context.")
-            return self._process_context_all_variants(nospace_mtDNA, pos, consecutive_CC_positions, 'C', 'T', "C→T (CC context)")
-        elif pos in consecutive_GA_positions:
-            logger.info(f"Base at position {pos} is in a 5'-GA context.")
-            return self._process_context_all_variants(nospace_mtDNA, pos, consecutive_GA_positions, 'G', 'A', "G→A (GA context)")
-        elif pos in consecutive_GT_positions:
-            logger.info(f"Base at position {pos} is in a 5'-GT context.")
-            return self._process_context_all_variants(nospace_mtDNA, pos, consecutive_GT_positions, 'G', 'A', "G→A (GT context)")
-        elif pos in consecutive_GG_positions:
-            logger.info(f"Base at position {pos} is in a 5'-GG context.")
-            return self._process_context_all_variants(nospace_mtDNA, pos, consecutive_GG_positions, 'G', 'A', "G→A (GG context)")
-        else:
-            logger.warning(f"Base at position {pos} is not in any editable context for Mok2020 pipelines.")
-            return [], []
\ No newline at end of file
+        for context, ref_base, mut_base in self.EDITING_CONTEXTS:
+            if context_index.contains(context, pos):
+                logger.info(f"Base at position {pos} is in a 5'-{context} context.")
+                return self._process_context_all_variants(nospace_mtDNA, pos, context_index.positions(context),
+                                                          ref_base, mut_base, f"{ref_base}→{mut_base} ({context} context)")
+        
+        logger.warning(f"Base at position {pos} is not in any editable context for Mok2020 pipelines.")
+        return [], []
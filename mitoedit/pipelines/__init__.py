@@ -1,6 +1,9 @@
 from .base_pipeline import BasePipeline
 from .Cho_sTALEDs import ChosTALEDsPipeline
 from .Mok2020_unified import Mok2020UnifiedPipeline
+from .circular_sequence import CircularSequence
+from .context_index import ContextIndex
+from .window_markup import WindowMarkup, render_windows
 
 PIPELINE_CATALOG = {
     "Cho_sTALEDs": ChosTALEDsPipeline,
@@ -11,5 +14,9 @@ __all__ = [
     "BasePipeline",
     "ChosTALEDsPipeline",
     "Mok2020UnifiedPipeline",
+    "CircularSequence",
+    "ContextIndex",
+    "WindowMarkup",
+    "render_windows",
     "PIPELINE_CATALOG"
 ]
\ No newline at end of file
@@ -1,21 +1,38 @@
-import random 
 import os 
 import pandas as pd
 from abc import ABC, abstractmethod
 import logging
+from .circular_sequence import CircularSequence
+from .context_index import ContextIndex
+from .window_markup import render_window, render_windows
+from ..seqops import complement, normalize_sequence, remove_whitespace, reverse_complement
 logger = logging.getLogger(__name__)
 
 
 class BasePipeline(ABC):
     """Abstract base class for all MitoEdit pipelines"""
+
+    # Index of the window sequence in the window tuples returned by process_mtDNA
+    WINDOW_FIELD = 6
     
-    def __init__(self):
+    def __init__(self, lazy_markup=False):
+        """
+        Args:
+            lazy_markup (bool): Return marked windows as WindowMarkup objects instead of rendering
+                them to strings, for callers that store or filter windows before writing them out
+        """
         self.pipeline_name = None  # To be set by subclasses
+        self.lazy_markup = lazy_markup
     
     @abstractmethod
-    def process_mtDNA(self, mtDNA_seq, pos):
+    def process_mtDNA(self, mtDNA_seq, pos, context_index=None):
         """Main function which processes the DNA - must be implemented by subclasses
         
+        Args:
+            mtDNA_seq (str or EncodedSequence): mtDNA sequence
+            pos (int): Position of the base to be changed (1-based)
+            context_index (ContextIndex, optional): Prebuilt index for the normalized sequence
+        
         Returns:
             tuple: (all_windows, adjacent_bases) where all_windows is a list of window data
                    and adjacent_bases is the sequence context around the target position
@@ -49,63 +66,63 @@ class BasePipeline(ABC):
         
         return all_windows_df, new_data
 
+    def _get_context_index(self, nospace_mtDNA, context_index=None):
+        """Return the context index for the normalized sequence, building it if none was supplied"""
+        if context_index is None:
+            return ContextIndex(nospace_mtDNA)
+        if not context_index.matches(nospace_mtDNA):
+            raise ValueError("The supplied context index was built for a different sequence.")
+        return context_index
+
     def _mark_bases(self, sequence, target_position, off_target_positions):
         """Mark the target and bystander bases in the window"""
         logger.debug("Marking bases in the sequence.")
-        target_position -= 1
-        off_target_positions = set(p - 1 for p in off_target_positions)
-        marked_sequence = []
-        for index, char in enumerate(sequence):
-            if index == target_position:
-                marked_sequence.append(f"[{char}]")  # Target base with square brackets []
-            elif index in off_target_positions:
-                marked_sequence.append(f"{{{char}}}")  # Off-target base with curly braces {}
-            else:
-                marked_sequence.append(char)  # No special marking
-        return ''.join(marked_sequence)
+        return render_window(sequence, target_position - 1, [p - 1 for p in off_target_positions])
 
     def _mark_base_at_position(self, sequence, target_position):
         """Mark the base at the target position --> to mark the target base in the window"""
         logger.debug("Marking base at the specific position")
-        marked_sequence = []
-        for index, char in enumerate(sequence):
-            if index == target_position:
-                marked_sequence.append(f"{{{char}}}")  # Target base with curly brackets {}
-            else:
-                marked_sequence.append(char)  # No special marking
-        return ''.join(marked_sequence)
+        return render_window(sequence, -1, [target_position])
+
+    def _render_windows(self, all_windows):
+        """Render the WindowMarkup of every window tuple in one pass, unless lazy_markup is set"""
+        if self.lazy_markup or not all_windows:
+            return all_windows
+        field = self.WINDOW_FIELD
+        rendered = render_windows([window[field] for window in all_windows])
+        return [window[:field] + (marked,) + window[field + 1:] for window, marked in zip(all_windows, rendered)]
 
     def _reverse_complement(self, sequence):
-        """Get the reverse complement of a DNA sequence"""
+        """Get the reverse complement of a DNA sequence, keeping target and bystander markers in place"""
         logger.debug("Generating reverse complement.")
-        complement_dict = {'A': 'T', 'T': 'A', 'C': 'G', 'G': 'C', '}' : '{', '{' : '}', '[':']', ']':'['}
-        reverse_complement_sequence = ''.join([complement_dict.get(base, random.choice(['A', 'T', 'C', 'G']) if base == 'N' else base) for base in sequence])
-        return reverse_complement_sequence[::-1]
+        return reverse_complement(sequence)
 
     def _complementing(self, sequence):
         """Get the complement of a DNA sequence."""
         logger.debug("Generating complement.")
-        complement_dict = {'A': 'T', 'T': 'A', 'C': 'G', 'G': 'C'}
-        complement_sequence = ''.join([complement_dict.get(base, random.choice(['A', 'T', 'C', 'G']) if base == 'N' else base) for base in sequence])
-        return complement_sequence
+        return complement(sequence)
 
     def _create_window(self, mtDNA_seq, pos, start_index, end_index):
-        """To create the window"""
+        """To create the window (mtDNA_seq may be a string or a CircularSequence)"""
         logger.debug(f"Creating window from position {pos}.")
-        circular_seq = mtDNA_seq + mtDNA_seq
+        circular_seq = mtDNA_seq if isinstance(mtDNA_seq, CircularSequence) else CircularSequence(mtDNA_seq)
         window = circular_seq[start_index:end_index]
         return window
 
     def _remove_whitespace(self, sequence):
         """Remove whitespace from the sequence"""
         logger.debug("Removing whitespace from the sequence.")
-        return sequence.replace(" ", "").replace("\t", "").replace("\n", "")
+        return remove_whitespace(sequence)
 
     def _capitalize(self, sequence):
         """Capitalize the sequence"""
         logger.debug("Capitalizing the sequence.")
         return sequence.upper()
 
+    def _normalize(self, sequence):
+        """Remove whitespace and capitalize the sequence, sharing the cached normalized copy"""
+        return normalize_sequence(sequence)
+
     def _find_consecutive_GA_sequences(self, sequence):
         """Find all positions where 'GA' sequences occur"""
         logger.debug("Finding consecutive GA sequences.")
@@ -0,0 +1,68 @@
+import logging
+logger = logging.getLogger(__name__)
+
+
+class CircularSequence:
+    """
+    Read-only view of a circular sequence that never duplicates the genome.
+
+    Indexing and slicing behave exactly like the ``sequence + sequence`` strings the
+    pipelines used to build, so existing window arithmetic keeps its results:
+    - ``circular[i]`` for -2n <= i < 2n
+    - ``circular[start:stop]`` with the usual clamping of out-of-range bounds
+
+    wrap_slice() additionally gives true circular slices with any start, including
+    negative ones, for windows crossing the origin.
+    """
+
+    def __init__(self, sequence):
+        self.sequence = sequence
+        self.length = len(sequence)
+
+    def __len__(self):
+        """Length of the doubled sequence this view stands in for."""
+        return 2 * self.length
+
+    def __str__(self):
+        return self.sequence
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(2 * self.length)
+            if step != 1:
+                return ''.join(self[i] for i in range(start, stop, step))
+            return self._doubled_slice(start, stop)
+        if not -2 * self.length <= index < 2 * self.length:
+            raise IndexError("circular sequence index out of range")
+        return self.sequence[index % self.length]
+
+    def _doubled_slice(self, start, stop):
+        """Slice [start, stop) of the doubled sequence, with 0 <= start and stop <= 2n."""
+        n = self.length
+        if stop <= start:
+            return ''
+        if stop <= n:
+            return self.sequence[start:stop]
+        if start >= n:
+            return self.sequence[start - n:stop - n]
+        return self.sequence[start:] + self.sequence[:stop - n]
+
+    def wrap_slice(self, start, stop):
+        """
+        Circular slice [start, stop) in 0-based coordinates that may lie outside [0, n).
+
+        A slice starting before the origin or ending after the last base wraps around,
+        e.g. wrap_slice(-2, 3) returns the last two bases followed by the first three.
+        """
+        if stop - start > self.length:
+            raise ValueError(f"Cannot cut {stop - start} bases from a circular sequence of length {self.length}.")
+        if stop <= start:
+            return ''
+        offset = start - start % self.length
+        return self._doubled_slice(start - offset, stop - offset)
+
+    def find(self, sub, start=0, end=None):
+        """str.find on the doubled sequence; only the [start, end) region is materialized."""
+        start, end, _ = slice(start, end).indices(2 * self.length)
+        index = self._doubled_slice(start, end).find(sub)
+        return index if index == -1 else start + index
@@ -0,0 +1,103 @@
+import logging
+import numpy as np
+from ..seqops import EncodedSequence, normalize_sequence
+logger = logging.getLogger(__name__)
+
+
+# Offset of the reported base inside each dinucleotide context. These follow the
+# BasePipeline._find_consecutive_*_sequences conventions, e.g. 'TC' reports the
+# position of the C (second base) while 'GA' reports the position of the G.
+CONTEXT_OFFSETS = {
+    'TC': 1,
+    'AC': 1,
+    'CC': 1,
+    'GA': 0,
+    'GT': 0,
+    'GG': 0,
+    'CT': 0,
+    'TG': 1,
+    'AG': 1,
+    'CA': 0,
+}
+
+
+class ContextIndex:
+    """
+    Per-sequence index of every dinucleotide editing context.
+
+    The index is built once for a normalized (whitespace-free, upper case) sequence
+    and can be shared by all pipelines and by repeated process_mitoedit calls
+    against the same sequence.
+
+    For every context in CONTEXT_OFFSETS it holds:
+    - a sorted array of 1-based positions (same values as the matching
+      BasePipeline._find_consecutive_*_sequences method)
+    - a boolean membership mask indexed by 1-based position
+    """
+
+    def __init__(self, sequence):
+        """
+        Args:
+            sequence (str or EncodedSequence): Normalized sequence, or the same sequence encoded
+        """
+        if isinstance(sequence, EncodedSequence):
+            encoded, sequence = sequence, str(sequence)
+        else:
+            encoded = EncodedSequence.from_string(sequence)
+        self.sequence = sequence
+        self.length = len(sequence)
+        self._positions = {}
+        self._masks = {}
+        self._circular_masks = {}
+
+        logger.debug("Building context index for a sequence of length %d.", self.length)
+        for context, offset in CONTEXT_OFFSETS.items():
+            positions = encoded.dinucleotide_positions(context) + 1 + offset  # 1-based position of the reported base
+            mask = np.zeros(self.length + 1, dtype=bool)
+            mask[positions] = True
+            positions.flags.writeable = False
+            mask.flags.writeable = False
+            self._positions[context] = positions
+            self._masks[context] = mask
+
+    @classmethod
+    def from_sequence(cls, mtDNA_seq):
+        """Build an index from a raw sequence, normalizing it the same way the pipelines do."""
+        return cls(normalize_sequence(mtDNA_seq))
+
+    def matches(self, nospace_mtDNA):
+        """Check whether this index was built for the given normalized sequence."""
+        return self.length == len(nospace_mtDNA) and self.sequence == nospace_mtDNA
+
+    def positions(self, context):
+        """Sorted 1-based positions of the reported base for a context."""
+        return self._positions[context]
+
+    def mask(self, context):
+        """Boolean membership mask for a context, indexed by 1-based position."""
+        return self._masks[context]
+
+    def contains(self, context, pos):
+        """O(1) check whether the 1-based position is reported by a context."""
+        return 1 <= pos <= self.length and bool(self._masks[context][pos])
+
+    def contains_any(self, contexts, pos):
+        """O(1) check whether the 1-based position is reported by any of the contexts."""
+        return any(self.contains(context, pos) for context in contexts)
+
+    def circular_mask(self, contexts):
+        """
+        Boolean mask, indexed by 0-based position, of the bases reported by any of the contexts
+        when the sequence is read as a circle, i.e. also counting the pair formed by the last and
+        the first base. Masks are built once per set of contexts.
+        """
+        key = tuple(contexts)
+        if key not in self._circular_masks:
+            mask = np.zeros(self.length, dtype=bool)
+            for context in contexts:
+                mask[self._positions[context] - 1] = True
+                if self.length > 1 and self.sequence[-1] + self.sequence[0] == context:
+                    mask[(self.length - 1 + CONTEXT_OFFSETS[context]) % self.length] = True
+            mask.flags.writeable = False
+            self._circular_masks[key] = mask
+        return self._circular_masks[key]
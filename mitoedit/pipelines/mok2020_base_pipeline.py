@@ -2,13 +2,15 @@ import logging
 from multiprocessing import Value
 logger = logging.getLogger(__name__)
 from .base_pipeline import BasePipeline
+from .circular_sequence import CircularSequence
+from .window_markup import WindowMarkup
 
 
 class Mok2020BasePipeline(BasePipeline):
     """Base class for Mok2020 pipelines (G1397 and G1333) that handle C→T and G→A editing"""
     
-    def __init__(self):
-        super().__init__()
+    def __init__(self, lazy_markup=False):
+        super().__init__(lazy_markup)
     
     def _find_C_positions(self, sequence):
         """Find all positions where 'C' occurs in TC contexts"""
@@ -61,11 +63,12 @@ class Mok2020BasePipeline(BasePipeline):
     def _process_editing_context(self, nospace_mtDNA, pos, ref, mut, editing_type):
         """Process a specific editing context (C→T or G→A)"""
         all_windows = []
+        circular_seq = CircularSequence(nospace_mtDNA)
         
         # Create 60bp window around the target position
         start_index = pos - 31
         end_index = pos + 29
-        adjacent_bases = self._create_window(nospace_mtDNA, pos, start_index, end_index)
+        adjacent_bases = self._create_window(circular_seq, pos, start_index, end_index)
         
         # Generate editing windows of different sizes
         for window_size in range(14, 21):  # 14-20bp windows
@@ -73,16 +76,16 @@ class Mok2020BasePipeline(BasePipeline):
             for position_in_window in position_range:
                 window_start = pos - position_in_window
                 window_end = pos + (window_size - position_in_window)
-                window = self._create_window(nospace_mtDNA, pos, window_start, window_end)
+                window = self._create_window(circular_seq, pos, window_start, window_end)
                 
                 # Find bystander positions
                 ga_positions = self._find_GA_positions(window, window_start)
                 tc_positions = self._find_TC_positions(window, window_start)
                 bystander_positions = [p for p in ga_positions + tc_positions if p != pos]
                 
-                # Mark the window
-                marked_window = self._mark_bases(window, position_in_window + 1, 
-                                               [p - window_start + 1 for p in bystander_positions])
+                # Mark the window (rendered for all windows at once)
+                marked_window = WindowMarkup(window, 0, len(window), position_in_window,
+                                             [p - window_start for p in bystander_positions])
                 
                 all_windows.append((
                     self.pipeline_name, editing_type, pos, ref, mut, f"{window_size}bp",
@@ -90,23 +93,20 @@ class Mok2020BasePipeline(BasePipeline):
                     len(bystander_positions), sorted(bystander_positions), True, None
                 ))
         
-        return all_windows, adjacent_bases
+        return self._render_windows(all_windows), adjacent_bases
 
-    def process_mtDNA(self, mtDNA_seq, pos):
+    def process_mtDNA(self, mtDNA_seq, pos, context_index=None):
         """Main function which processes the DNA sequence."""
         logger.info("Processing mtDNA sequence for position %d.", pos)
         
-        nospace_mtDNA = self._capitalize(self._remove_whitespace(mtDNA_seq))
-        C_positions = self._find_C_positions(nospace_mtDNA)
-        logger.debug("C positions in TC contexts: %s", C_positions)
-        G_positions = self._find_G_positions(nospace_mtDNA)
-        logger.debug("G positions in GA contexts: %s", G_positions)
+        nospace_mtDNA = self._normalize(mtDNA_seq)
+        context_index = self._get_context_index(nospace_mtDNA, context_index)
         
-        if pos in C_positions:
+        if context_index.contains('TC', pos):
             logger.info("Base at position %d is C in TC context and can be edited to T.", pos)
             return self._process_editing_context(nospace_mtDNA, pos, 'C', 'T', "C→T editing")
         
-        elif pos in G_positions:
+        elif context_index.contains('GA', pos):
             logger.info("Base at position %d is G in GA context and can be edited to A.", pos)
             return self._process_editing_context(nospace_mtDNA, pos, 'G', 'A', "G→A editing")
         
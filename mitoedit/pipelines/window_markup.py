@@ -0,0 +1,120 @@
+import logging
+import numpy as np
+logger = logging.getLogger(__name__)
+
+
+class WindowMarkup:
+    """
+    Marked editing window kept as numbers until it is written out.
+
+    The window is sequence[start:start + size]; its target base is rendered as ``[x]`` and its
+    bystander bases as ``{x}`` (the target wins when both apply). Offsets are 0-based within the
+    window and offsets outside it are ignored. The sequence is typically the region around a
+    target shared by all its windows, so no window string is cut until the markup is rendered.
+    str() renders one window; render_windows renders many at once.
+    """
+
+    __slots__ = ['sequence', 'start', 'size', 'target', 'bystanders']
+
+    def __init__(self, sequence, start, size, target, bystanders):
+        self.sequence = sequence
+        self.start = start
+        self.size = size
+        self.target = target
+        self.bystanders = bystanders
+
+    @property
+    def window(self):
+        """The unmarked window sequence."""
+        return self.sequence[self.start:self.start + self.size]
+
+    def marked(self):
+        """Sorted 0-based offsets inside the window of the bystander marks that are rendered."""
+        return sorted(set(offset for offset in self.bystanders
+                          if 0 <= offset < self.size and offset != self.target))
+
+    def bystander_count(self):
+        """Number of ``{x}`` marks of the rendered window."""
+        return len(self.marked())
+
+    def __str__(self):
+        return render_window(self.window, self.target, self.bystanders)
+
+    def __repr__(self):
+        return f"WindowMarkup({str(self)!r})"
+
+
+def render_window(window, target, bystanders):
+    """
+    Render one window with ``[x]`` around the target and ``{x}`` around the bystanders.
+
+    Args:
+        window (str): Unmarked window sequence
+        target (int): 0-based offset of the target base
+        bystanders (iterable): 0-based offsets of the bystander bases
+
+    Returns:
+        str: Marked window
+    """
+    marks = {offset: '{' for offset in bystanders if 0 <= offset < len(window)}
+    if 0 <= target < len(window):
+        marks[target] = '['
+    parts = []
+    last = 0
+    for offset in sorted(marks):
+        opening = marks[offset]
+        closing = ']' if opening == '[' else '}'
+        parts.append(window[last:offset])
+        parts.append(f"{opening}{window[offset]}{closing}")
+        last = offset + 1
+    parts.append(window[last:])
+    return ''.join(parts)
+
+
+def render_windows(markups):
+    """
+    Render many WindowMarkup objects at once.
+
+    The windows are joined into one byte array and the brackets of every mark are inserted with
+    array operations, so rendering costs a few NumPy passes instead of a Python loop per base.
+
+    Args:
+        markups (list): WindowMarkup objects
+
+    Returns:
+        list: Marked window strings, in the order of markups
+    """
+    windows = [markup.window for markup in markups]
+    plain = ''.join(windows)
+    if not plain.isascii():
+        return [str(markup) for markup in markups]
+
+    sizes = np.array([len(window) for window in windows], dtype=np.int64)
+    window_starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    opening = np.zeros(len(plain), dtype=np.uint8)
+
+    bystander_counts = [len(markup.bystanders) for markup in markups]
+    if sum(bystander_counts):
+        offsets = np.array([offset for markup in markups for offset in markup.bystanders], dtype=np.int64)
+        owners = np.repeat(np.arange(len(markups)), bystander_counts)
+        inside = (offsets >= 0) & (offsets < sizes[owners])
+        opening[window_starts[owners[inside]] + offsets[inside]] = ord('{')
+    targets = np.array([markup.target for markup in markups], dtype=np.int64)
+    inside = (targets >= 0) & (targets < sizes)
+    opening[window_starts[inside] + targets[inside]] = ord('[')
+
+    closing = np.zeros(len(plain), dtype=np.uint8)
+    closing[opening == ord('{')] = ord('}')
+    closing[opening == ord('[')] = ord(']')
+
+    # Every base becomes (opening bracket, base, closing bracket), keeping the brackets of marked bases only
+    marked = opening != 0
+    chars = np.stack([opening, np.frombuffer(plain.encode('ascii'), dtype=np.uint8), closing], axis=1).reshape(-1)
+    keep = np.stack([marked, np.ones(len(plain), dtype=bool), marked], axis=1).reshape(-1)
+    rendered = chars[keep].tobytes().decode('ascii')
+
+    # Marks per window: each marked base belongs to the last window starting at or before it
+    owners = np.searchsorted(window_starts, np.flatnonzero(marked), 'right') - 1
+    marked_counts = np.bincount(owners, minlength=len(markups))
+    ends = np.cumsum(sizes + 2 * marked_counts).tolist()
+    return [rendered[start:end] for start, end in zip([0] + ends[:-1], ends)]
@@ -0,0 +1,316 @@
+"""Sequence operations and the encoded sequence type shared by the pipelines and talent_tools.
+
+Every string function here runs in a single ``str.translate``/``bytes.translate`` pass, so
+it is linear in the sequence length and never loops over bases in Python.
+IUPAC ambiguity codes complement deterministically: R<->Y, K<->M, B<->V, D<->H,
+while S, W and N are their own complements.
+
+EncodedSequence holds a sequence as base codes (A=0, C=1, G=2, T=3, anything else 4, the
+codes of talent_tools.talscore), either one uint8 per base or packed 2 bits per base with an
+N-mask, and can be passed wherever the engines take encoded reference records.
+"""
+from functools import lru_cache
+import logging
+import numpy as np
+logger = logging.getLogger(__name__)
+
+_COMPLEMENT_PAIRS = {
+    'A': 'T', 'T': 'A', 'C': 'G', 'G': 'C',
+    'R': 'Y', 'Y': 'R', 'K': 'M', 'M': 'K',
+    'B': 'V', 'V': 'B', 'D': 'H', 'H': 'D',
+    'S': 'S', 'W': 'W', 'N': 'N',
+}
+
+_COMPLEMENT_TABLE = str.maketrans({**_COMPLEMENT_PAIRS,
+                                   **{base.lower(): other.lower() for base, other in _COMPLEMENT_PAIRS.items()}})
+
+# Reversing a marked-up window turns its brackets around, so they are swapped back
+_MARKUP_COMPLEMENT_TABLE = str.maketrans({**_COMPLEMENT_TABLE, ord('['): ']', ord(']'): '[', ord('{'): '}', ord('}'): '{'})
+
+_ACGT_COMPLEMENT_TABLE = bytes.maketrans(b'ACGT', b'TGCA')
+_NON_ACGT_TO_N = bytes(ord('N') if byte not in b'ACGT' else byte for byte in range(256))
+
+WHITESPACE = ' \t\n\r\v\f'
+_UPPER_TABLE = bytes.maketrans(b'abcdefghijklmnopqrstuvwxyz', b'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+_WHITESPACE_BYTES = WHITESPACE.encode('ascii')
+_REMOVE_WHITESPACE_TABLE = str.maketrans('', '', WHITESPACE)
+
+
+def complement(sequence):
+    """Complement of a DNA sequence, keeping its case.
+
+    Args:
+        sequence (str): DNA sequence, which may contain IUPAC codes
+
+    Returns:
+        str: Complemented sequence; characters that are not IUPAC codes are kept as they are
+    """
+    return sequence.translate(_COMPLEMENT_TABLE)
+
+
+def reverse_complement(sequence):
+    """Reverse complement of a DNA sequence, keeping its case.
+
+    Target ``[x]`` and bystander ``{x}`` markers stay around the base they mark.
+
+    Args:
+        sequence (str): DNA sequence, which may contain IUPAC codes and window markup
+
+    Returns:
+        str: Reverse complemented sequence
+    """
+    return sequence.translate(_MARKUP_COMPLEMENT_TABLE)[::-1]
+
+
+def reverse_complement_acgt(sequence):
+    """Reverse complement of an uppercase sequence where every base other than A, C, G and T becomes N.
+
+    Args:
+        sequence (str): DNA sequence
+
+    Returns:
+        str: Reverse complemented sequence over A, C, G, T and N
+    """
+    data = sequence.encode('ascii', 'replace')
+    return data.translate(_NON_ACGT_TO_N).translate(_ACGT_COMPLEMENT_TABLE)[::-1].decode('ascii')
+
+
+def remove_whitespace(sequence):
+    """Remove all whitespace from a sequence.
+
+    Args:
+        sequence (str): Sequence as pasted or read from a file
+
+    Returns:
+        str: Sequence without whitespace
+    """
+    if sequence.isascii():
+        return sequence.encode('ascii').translate(None, _WHITESPACE_BYTES).decode('ascii')
+    return sequence.translate(_REMOVE_WHITESPACE_TABLE)
+
+
+@lru_cache(maxsize=8)
+def normalize_sequence(sequence):
+    """Remove whitespace and capitalize a sequence.
+
+    The result is cached per input sequence, so the pipelines, the context index and
+    the TALE search share one normalized copy of the genome instead of each making their own.
+
+    Args:
+        sequence (str or EncodedSequence): Sequence as pasted or read from a file, or encoded
+
+    Returns:
+        str: Normalized sequence; an EncodedSequence reads back with N for every base other than A, C, G and T
+    """
+    logger.debug("Normalizing the sequence.")
+    if isinstance(sequence, EncodedSequence):
+        return str(sequence)
+    if sequence.isascii():
+        return sequence.encode('ascii').translate(_UPPER_TABLE, _WHITESPACE_BYTES).decode('ascii')
+    return sequence.translate(_REMOVE_WHITESPACE_TABLE).upper()
+
+
+# Base codes of EncodedSequence
+INVALID_CODE = 4
+_CODE_TABLE = np.full(256, INVALID_CODE, dtype=np.uint8)
+for _code, _base in enumerate('ACGT'):
+    _CODE_TABLE[ord(_base)] = _code
+    _CODE_TABLE[ord(_base.lower())] = _code
+_CODE_BASES = np.frombuffer(b'ACGTN', dtype=np.uint8)
+_COMPLEMENT_CODES = np.array([3, 2, 1, 0, INVALID_CODE], dtype=np.uint8)
+
+
+def encode_sequence(sequence):
+    """Base codes of a sequence string, whitespace removed.
+
+    Args:
+        sequence (str): DNA sequence
+
+    Returns:
+        np.ndarray: uint8 codes, A=0, C=1, G=2, T=3 and 4 for any other character
+    """
+    return _CODE_TABLE[np.frombuffer(remove_whitespace(sequence).encode('ascii', 'replace'), dtype=np.uint8)]
+
+
+def decode_sequence(codes):
+    """Sequence string of base codes, with N for invalid bases."""
+    return _CODE_BASES[np.asarray(codes)].tobytes().decode('ascii')
+
+
+def _invalid_runs(codes):
+    """(start, end) intervals of the invalid codes of a code array."""
+    invalid = np.zeros(len(codes) + 2, dtype=np.int8)
+    invalid[1:-1] = codes == INVALID_CODE
+    return np.flatnonzero(np.diff(invalid)).reshape(-1, 2)
+
+
+class EncodedSequence:
+    """
+    DNA sequence held as base codes, sliced and reverse complemented without copying the genome.
+
+    The codes are kept either as one uint8 per base or, after pack(), as 2 bits per base (4 bases
+    per byte, high bits first) with an N-mask of (start, end) runs of invalid bases, a quarter of
+    the memory of the sequence string. Both forms behave the same:
+    - len(seq), str(seq) (N for invalid bases) and np.asarray(seq) (the codes)
+    - seq[i] gives a base code and seq[start:stop] an EncodedSequence view of the same data,
+      which pickles with its own bases only, so views can be sent to worker processes
+    - reverse_complement() is a view reading the other strand
+    - dinucleotide_positions() finds a two-base context with array comparisons
+
+    window() is an alias of slicing matching talent_tools.packed_genome.PackedSequence, so the
+    scoring, mismatch and FM-index engines take EncodedSequence records as they take packed ones.
+    """
+
+    __slots__ = ['_codes', '_packed', '_offset', '_nmask', '_length', '_reverse']
+
+    def __init__(self, codes=None, packed=None, offset=0, nmask=None, length=None, reverse=False):
+        """
+        Args:
+            codes (np.ndarray, optional): uint8 base codes of the plus strand
+            packed (np.ndarray, optional): 2-bit packed bases of the plus strand, used when codes is None
+            offset (int): Index of the first base in the first packed byte
+            nmask (np.ndarray, optional): (start, end) runs of invalid bases of the packed bases
+            length (int, optional): Number of packed bases
+            reverse (bool): Read the reverse complement of the bases
+        """
+        if codes is None and packed is None:
+            raise ValueError("An encoded sequence needs either base codes or packed bases.")
+        self._codes = None if codes is None else np.asarray(codes, dtype=np.uint8)
+        self._packed = packed
+        self._offset = offset
+        self._nmask = np.zeros((0, 2), dtype=np.int64) if nmask is None else nmask
+        self._length = len(self._codes) if codes is not None else length
+        self._reverse = reverse
+
+    @classmethod
+    def from_string(cls, sequence):
+        """Encode a sequence string, ignoring whitespace and case."""
+        return cls(encode_sequence(sequence))
+
+    @property
+    def is_packed(self):
+        return self._codes is None
+
+    @property
+    def nbytes(self):
+        """Bytes held for the bases of this sequence (shared by its views)."""
+        if self._codes is not None:
+            return self._codes.nbytes
+        return self._packed.nbytes + self._nmask.nbytes
+
+    def pack(self):
+        """The same sequence packed 2 bits per base."""
+        if self._codes is None:
+            return self
+        codes = self._codes.copy()
+        nmask = _invalid_runs(codes)
+        codes[codes == INVALID_CODE] = 0
+        codes = np.concatenate([codes, np.zeros(-len(codes) % 4, dtype=np.uint8)]).reshape(-1, 4)
+        packed = (codes[:, 0] << 6) | (codes[:, 1] << 4) | (codes[:, 2] << 2) | codes[:, 3]
+        return EncodedSequence(packed=packed, nmask=nmask, length=self._length, reverse=self._reverse)
+
+    def unpack(self):
+        """The same sequence with one uint8 code per base."""
+        if self._codes is not None:
+            return self
+        return EncodedSequence(self._plus_codes(0, self._length), reverse=self._reverse)
+
+    def _plus_codes(self, start, stop):
+        """Codes of the plus strand bases [start, stop), 0 <= start <= stop <= len(self)."""
+        if self._codes is not None:
+            return self._codes[start:stop]
+        first_byte = (self._offset + start) // 4
+        packed = self._packed[first_byte:(self._offset + stop + 3) // 4]
+        codes = np.empty((len(packed), 4), dtype=np.uint8)
+        for i in range(4):
+            codes[:, i] = (packed >> (6 - 2 * i)) & 3
+        skip = self._offset + start - 4 * first_byte
+        codes = codes.reshape(-1)[skip:skip + stop - start]
+        for nmask_start, nmask_end in self._nmask_runs(start, stop):
+            codes[max(nmask_start - start, 0):max(nmask_end - start, 0)] = INVALID_CODE
+        return codes
+
+    def _nmask_runs(self, start, stop):
+        """N-mask runs overlapping the bases [start, stop)."""
+        return self._nmask[np.searchsorted(self._nmask[:, 1], start, 'right'):
+                           np.searchsorted(self._nmask[:, 0], stop, 'left')]
+
+    def _plus_view(self, start, stop):
+        """View of the plus strand bases [start, stop), keeping the strand this sequence reads."""
+        if self._codes is not None:
+            return EncodedSequence(self._codes[start:stop], reverse=self._reverse)
+        first_byte = (self._offset + start) // 4
+        nmask = np.clip(self._nmask_runs(start, stop) - start, 0, stop - start)
+        return EncodedSequence(packed=self._packed[first_byte:(self._offset + stop + 3) // 4],
+                               offset=(self._offset + start) % 4, nmask=nmask, length=stop - start,
+                               reverse=self._reverse)
+
+    @property
+    def codes(self):
+        """uint8 base codes of the sequence, in reading order."""
+        codes = self._plus_codes(0, self._length)
+        if self._reverse:
+            return _COMPLEMENT_CODES[codes[::-1]]
+        return codes
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            if index < 0:
+                index += self._length
+            if not 0 <= index < self._length:
+                raise IndexError("encoded sequence index out of range")
+            if self._reverse:
+                return int(_COMPLEMENT_CODES[self._plus_codes(self._length - 1 - index, self._length - index)[0]])
+            return int(self._plus_codes(index, index + 1)[0])
+        start, stop, step = index.indices(self._length)
+        if step != 1:
+            return EncodedSequence(self.codes[index])
+        stop = max(start, stop)
+        if self._reverse:
+            return self._plus_view(self._length - stop, self._length - start)
+        return self._plus_view(start, stop)
+
+    def window(self, start, stop):
+        """View of the bases [start, stop), as PackedSequence.window."""
+        return self[start:stop]
+
+    def __array__(self, dtype=None, copy=None):
+        codes = self.codes
+        return codes if dtype is None else codes.astype(dtype)
+
+    def __str__(self):
+        return decode_sequence(self.codes)
+
+    def __repr__(self):
+        form = "packed" if self.is_packed else "uint8"
+        return f"EncodedSequence(length={self._length}, {form}{', reverse complement' if self._reverse else ''})"
+
+    def reverse_complement(self):
+        """View reading the reverse complement of the sequence."""
+        view = self._plus_view(0, self._length)
+        view._reverse = not self._reverse
+        return view
+
+    def dinucleotide_positions(self, context):
+        """
+        0-based positions i where the bases i and i + 1 read the given context.
+
+        Args:
+            context (str): Two bases out of A, C, G and T, e.g. 'TC'
+
+        Returns:
+            np.ndarray: Sorted int64 positions of the first base of each occurrence
+        """
+        first_code, second_code = encode_sequence(context)
+        codes = self.codes
+        return np.flatnonzero((codes[:-1] == first_code) & (codes[1:] == second_code))
+
+
+def as_encoded(sequence):
+    """An EncodedSequence of a sequence string, or the sequence itself when it is already encoded."""
+    if isinstance(sequence, EncodedSequence):
+        return sequence
+    return EncodedSequence.from_string(sequence)
@@ -1,4 +1,7 @@
-from talesf import ScoreTalesfTask
+try:
+    from talesf import ScoreTalesfTask
+except ImportError:
+    from .talscore import ScoreTalesfTask
 
 from .talconfig import RVD_SEQ_REGEX, GENOME_FILE, PROMOTEROME_FILE, VALID_GENOME_ORGANISMS, VALID_PROMOTEROME_ORGANISMS
 from .talutil import validate_options_handler, OptParser, create_logger, OptionObject, TaskError, check_fasta_pasta, Conditional
@@ -30,7 +30,7 @@
 
 
 from .talconfig import GENOME_FILE, PROMOTEROME_FILE, VALID_GENOME_ORGANISMS, VALID_PROMOTEROME_ORGANISMS, OFFTARGET_COUNTING_SIZE_LIMIT
-from .talutil import validate_options_handler, OptParser, FastaIterator, create_logger, check_fasta_pasta, OptionObject, TaskError, Conditional
+from .talutil import validate_options_handler, OptParser, FastaIterator, create_logger, check_fasta_pasta, OptionObject, TaskError, reverseComplement, Conditional
 from .entrez_cache import CachedEntrezFile
 
 celery_found = True
@@ -41,15 +41,23 @@ try:
 except ImportError:
     celery_found = False
 
+#off-target counting uses the tfcount extension when it is installed, the built-in NumPy counting otherwise
 tfcount_found = True
 try:
     from btfcount import TargetFinderCountTask
 except ImportError:
     tfcount_found = False
+    from .talscore import TargetFinderCountTask
+
+from .mismatch import MAX_MISMATCHES, mismatchProfiles
+from .talscore import loadReference
 
 import os
 import math
 import string
+from array import array
+
+import numpy as np
 
 #import code
 #import signal
@@ -65,9 +73,106 @@ class Binding_site:
         self.upstream = upstream
         self.offtarget_count = 0
 
+#Columnar store of the binding sites found in a set of genes: parallel arrays of gene index,
+#start, length, strand and upstream base. Target sequences and RVDs are only cut from the gene
+#sequences when written, instead of keeping a Binding_site object per hit.
+class BindingSiteTable:
+    
+    def __init__(self, strong_binding_RVDs):
+        
+        #base -> "RVD " for plus strand sites, base -> "RVD of the complement " for the reversed minus strand sites
+        self.rvd_table = str.maketrans(dict((nt, rvd + ' ') for nt, rvd in strong_binding_RVDs.items()))
+        self.complement_rvd_table = str.maketrans(dict((nt, strong_binding_RVDs[complement[nt]] + ' ') for nt in strong_binding_RVDs))
+        
+        #(gene id, upper case sequence) of each gene
+        self.genes = []
+        
+        self.gene_index = array('i')
+        self.start1 = array('l')
+        self.length = array('b')
+        self.is_plus = bytearray()
+        self.upstream = bytearray()
+        
+        #filled in by off-target counting, in output order
+        self.offtarget_counts = None
+        
+        #filled in by mismatch searches, in output order
+        self.mismatch_profiles = None
+    
+    def __len__(self):
+        return len(self.start1)
+    
+    def addGene(self, gene_id, sequence):
+        
+        self.genes.append((gene_id, sequence))
+        
+        return len(self.genes) - 1
+    
+    def append(self, gene_index, start1, length, is_plus, upstream):
+        
+        self.gene_index.append(gene_index)
+        self.start1.append(start1)
+        self.length.append(length)
+        self.is_plus.append(is_plus)
+        self.upstream.append(ord(upstream))
+    
+    def extend(self, gene_index, starts, length, is_plus, upstreams):
+        
+        #add the sites of one size and strand: a NumPy array of starts and the bytes of their upstream bases
+        
+        self.gene_index.extend([gene_index] * len(starts))
+        self.start1.extend(starts.tolist())
+        self.length.extend([length] * len(starts))
+        self.is_plus.extend([is_plus] * len(starts))
+        self.upstream.extend(upstreams)
+    
+    def seq1(self, i):
+        
+        #plus strand sequence of the site; minus strand sites end at start1
+        
+        sequence = self.genes[self.gene_index[i]][1]
+        
+        if self.is_plus[i]:
+            return sequence[self.start1[i] : self.start1[i] + self.length[i]]
+        else:
+            return sequence[self.start1[i] - self.length[i] + 1 : self.start1[i] + 1]
+    
+    def perfectTAL1(self, i):
+        
+        #"strong-binding" RVDs of the site, read on its own strand
+        
+        if self.is_plus[i]:
+            return self.seq1(i).translate(self.rvd_table)[:-1]
+        else:
+            return self.seq1(i)[::-1].translate(self.complement_rvd_table)[:-1]
+    
+    def outputOrder(self):
+        
+        #Site indices in output order: genes in input order, and within a gene the sites grouped by
+        #start position in the order the positions were first found, each group in scan order
+        
+        first_found = {}
+        
+        for i in range(len(self)):
+            first_found.setdefault((self.gene_index[i], self.start1[i]), len(first_found))
+        
+        return sorted(range(len(self)), key=lambda i: (self.gene_index[i], first_found[(self.gene_index[i], self.start1[i])]))
+    
+    def outputLine(self, i, offtarget_string=""):
+        
+        gene_id = self.genes[self.gene_index[i]][0]
+        seq1 = self.seq1(i)
+        upstream = chr(self.upstream[i])
+        
+        if self.is_plus[i]:
+            return gene_id + '\t' + str(self.start1[i]) + '\t' + str(len(seq1)) + '\t' + self.perfectTAL1(i) + '\t' +  'Plus' + '\t' + upstream + " " + seq1 + '\t' + upstream + " " + seq1 + offtarget_string + '\n'
+        else:
+            return gene_id + '\t' + str(self.start1[i]) + '\t' + str(len(seq1)) + '\t' + self.perfectTAL1(i) + '\t' +  'Minus' + '\t' + ("T" if upstream == "A" else "C") + " " + reverseComplement(seq1) + '\t' + seq1 + " " + upstream + offtarget_string + '\n'
+
 #DNA list and dictionary
 DNA = ['A', 'C', 'G', 'T']
 DNA_dict = {'A':0, 'C':1, 'G':2, 'T':3}
+complement = {'A':'T', 'C':'G', 'G':'C', 'T':'A'}
 
 #Average percent composition of known TAL binding sites
 avg_percents = {'A':0.31, 'C':0.37, 'G':0.09, 'T':0.22}
@@ -81,6 +186,104 @@ for nt in DNA:
     percent_comp_range_top[nt] = avg_percents[nt] + 2*stdev[nt]
     percent_comp_range_bottom[nt] = avg_percents[nt] - 2*stdev[nt]
 
+#Scan one upper case gene sequence for single TAL binding sites meeting the rules enabled in options.
+#For each half site size every rule is a boolean mask over the candidate positions of a strand, and
+#base composition comes from cumulative base counts. Yields (start indices, size, is_plus, upstream
+#bases as bytes) per size and strand in scan order: plus strand sites by increasing start, then (with
+#revcomp) minus strand sites by increasing end, which is the position minus strand sites are reported at.
+def scanGene(sequence, half_site_size, options):
+    
+    codes = np.frombuffer(sequence.encode('ascii', 'replace'), dtype=np.uint8)
+    
+    #cumulative[nt][i] is the number of nt bases in sequence[:i]
+    cumulative = {}
+    
+    for nt in DNA:
+        cumulative[nt] = np.concatenate(([0], np.cumsum(codes == ord(nt))))
+    
+    #the number of bases outside of DNA in sequence[:i]
+    cumulative_invalid = np.arange(len(codes) + 1) - sum(cumulative[nt] for nt in DNA)
+    
+    def isBase(positions, nt):
+        return codes[positions] == ord(nt)
+    
+    def composition_ok(window_starts, window_ends, size1, counted):
+        
+        #counted maps each TAL nucleotide to the base it binds on the scanned strand
+        
+        ok = np.ones(len(window_starts), dtype=bool)
+        
+        for nt in DNA:
+            percent = (cumulative[counted[nt]][window_ends] - cumulative[counted[nt]][window_starts]) / float(size1)
+            ok &= (percent <= percent_comp_range_top[nt]) & (percent >= percent_comp_range_bottom[nt])
+        
+        return ok
+    
+    upstream_bases = [nt for nt, use in (('T', options.cupstream != 1), ('C', options.cupstream != 0)) if use]
+    
+    for size1 in half_site_size:
+        
+        #Plus strand: site sequence[sindex:sindex+size1] after a T (or C) at -1
+        sindex = np.arange(1, max(len(codes) - size1, 1))
+        
+        site = np.zeros(len(sindex), dtype=bool)
+        
+        for nt in upstream_bases:
+            site |= isBase(sindex - 1, nt)
+        
+        site &= cumulative_invalid[sindex + size1] == cumulative_invalid[sindex]
+        
+        if options.t1:
+            site &= ~isBase(sindex, 'T')
+        
+        if options.a2:
+            site &= ~isBase(sindex + 1, 'A')
+        
+        if options.tn:
+            site &= isBase(sindex + size1 - 1, 'T')
+        
+        if options.gn:
+            site &= ~isBase(sindex + size1 - 1, 'G')
+        
+        if options.comp:
+            site &= composition_ok(sindex, sindex + size1, size1, {'A':'A', 'C':'C', 'G':'G', 'T':'T'})
+        
+        starts = sindex[site]
+        
+        yield starts, size1, True, codes[starts - 1].tobytes()
+        
+        if options.revcomp: #Search for binding sites on the reverse complement strand
+            
+            #Minus strand: site sequence[sindex-size1+1:sindex+1] before an A (or G) at sindex+1
+            sindex = np.arange(size1 - 1, max(len(codes) - 1, size1 - 1))
+            
+            site = np.zeros(len(sindex), dtype=bool)
+            
+            for nt in upstream_bases:
+                site |= isBase(sindex + 1, complement[nt])
+            
+            site &= cumulative_invalid[sindex + 1] == cumulative_invalid[sindex - size1 + 1]
+            
+            #same rules read on the minus strand
+            if options.t1:
+                site &= ~isBase(sindex, 'A')
+            
+            if options.a2:
+                site &= ~isBase(sindex - 1, 'T')
+            
+            if options.tn:
+                site &= isBase(sindex - size1 + 1, 'A')
+            
+            if options.gn:
+                site &= ~isBase(sindex - size1 + 1, 'C')
+            
+            if options.comp:
+                site &= composition_ok(sindex - size1 + 1, sindex + 1, size1, complement)
+            
+            starts = sindex[site]
+            
+            yield starts, size1, False, codes[starts + 1].tobytes()
+
 if celery_found:
     @task(base=BaseTask)
     def FindSingleTALSiteTask(*args, **kwargs):
@@ -103,6 +306,9 @@ def validateOptions(options):
     if options.arraymax < options.arraymin:
         raise TaskError("Maximum repeat array length must be greater than the minimum repeat array length")
     
+    if getattr(options, "processes", 1) < 1:
+        raise TaskError("At least one process is required")
+    
     if options.offtargets_ncbi != "NA":
         
         if options.offtargets_fasta != "NA" or options.genome or options.promoterome:
@@ -127,6 +333,14 @@ def validateOptions(options):
         if ((options.genome and options.organism not in VALID_GENOME_ORGANISMS) or (options.promoterome and options.organism not in VALID_PROMOTEROME_ORGANISMS)):
             raise TaskError("Invalid organism specified.")
     
+    if options.mismatch_fasta != "NA":
+        
+        if not os.path.exists(options.mismatch_fasta) or os.path.getsize(options.mismatch_fasta) <= 2:
+            raise TaskError("Mismatch FASTA file must exist and be non-empty.")
+        
+        if options.mismatches < 0 or options.mismatches > MAX_MISMATCHES:
+            raise TaskError("Between 0 and %d mismatches can be searched for" % MAX_MISMATCHES)
+    
     with open(options.fasta, 'r') as seq_file:
         
         check_fasta_pasta(seq_file)
@@ -154,9 +368,6 @@ def RunFindSingleTALSiteTask(options):
         
         if options.check_offtargets:
             
-            if not tfcount_found:
-                raise TaskError("Non off-target counting worker attempted to process off-target counting task.")
-            
             if options.offtargets_ncbi != "NA":
                 
                 logger("Finished retrieving NCBI off-target sequence.")
@@ -201,7 +412,7 @@ def RunFindSingleTALSiteTask(options):
             half_site_size = list(range(options.arraymin, options.arraymax + 1))
         
         #Initialize half site data structures:
-        gene_binding_sites = {}
+        binding_sites = BindingSiteTable(strong_binding_RVDs)
         
         #Open and read FASTA sequence file
         genes = []
@@ -211,159 +422,18 @@ def RunFindSingleTALSiteTask(options):
         
         seq_file.close()
         
-        for gene in genes:
-            gene.seq = gene.seq.upper()
+        genes = [gene._replace(seq = gene.seq.upper()) for gene in genes]
         
         #Scan each gene sequence:
         for gene in genes: #Scan sequence based on above criteria:
             logger("Scanning %s for binding sites" % (gene.id))
-            sequence = gene.seq
-            
-            #Check each position along the sequence for possible binding sites using all combinations of binding site lengths and spacer lengths
-            for size1 in half_site_size:
-                for sindex in range(1, len(sequence)-size1):
+            gene_index = binding_sites.addGene(gene.id, str(gene.seq))
             
-                    #Check for T at -1
-                    if ((options.cupstream != 1 and sequence[sindex-1] == 'T') or (options.cupstream != 0 and sequence[sindex-1] == 'C')) and len(set(DNA) | set(sequence[sindex:sindex+size1])) ==4:
-                        half_site1 = sequence[sindex:sindex+size1]
-                        Binding_site_flag = True
-        
-                        #Check for not T at 1
-                        if Binding_site_flag==True and options.t1==True:
-                            if sequence[sindex] != 'T':
-                                Binding_site_flag=True
-                            else:
-                                Binding_site_flag=False
-                            
-        
-                        #Check not A at 2
-                        if Binding_site_flag==True and options.a2==True:
-                            if sequence[sindex+1] !='A':
-                                Binding_site_flag=True
-                            else:
-                                Binding_site_flag=False
-        
-                        #Require T at end
-                        if Binding_site_flag==True and options.tn==True:
-                            if sequence[sindex+size1-1] == 'T':
-                                Binding_site_flag=True
-                            else:
-                                Binding_site_flag=False
-                                
-                        #Require last position to not be G's
-                        if Binding_site_flag==True and options.gn==True:
-                            if sequence[sindex+size1-1] != 'G':
-                                Binding_site_flag=True
-                            else:
-                                Binding_site_flag=False
-        
-                        #Check nucleotide composition of the binding site
-                        if Binding_site_flag==True and options.comp==True:
-                            A1 = half_site1.count('A')/float(len(half_site1))
-                            C1 = half_site1.count('C')/float(len(half_site1))
-                            G1 = half_site1.count('G')/float(len(half_site1))
-                            T1 = half_site1.count('T')/float(len(half_site1))
-                    
-                            if A1<=percent_comp_range_top['A'] and A1>=percent_comp_range_bottom['A'] and C1<=percent_comp_range_top['C'] and C1>=percent_comp_range_bottom['C'] and G1<=percent_comp_range_top['G'] and G1>=percent_comp_range_bottom['G'] and T1<=percent_comp_range_top['T'] and T1>=percent_comp_range_bottom['T']:
-                                Binding_site_flag=True
-                            else:
-                                Binding_site_flag=False
-        
-                                        
-                        #Create a binding site if all enforced rules have been met
-                        if Binding_site_flag==True:
-                            binding_site = Binding_site(perfectTAL1 = 'none', start1 = sindex, seq1 = half_site1, is_plus=True, upstream=sequence[sindex-1])
-                            if gene not in list(gene_binding_sites.keys()):
-                                gene_binding_sites[gene] = {}
-        
-                            if sindex not in list(gene_binding_sites[gene].keys()):
-                                gene_binding_sites[gene][sindex] = []
-                                            
-                            gene_binding_sites[gene][sindex].append(binding_site)
-        
-        
-                if options.revcomp==True: #Search for binding sites on the reverse complement strand
-                    for sindex in range(size1-1, len(sequence)-1):
-                            
-                        #Check for T at -1 for each half_site (A on plus strand)
-                        
-                        if ((options.cupstream != 1 and sequence[sindex+1] == 'A') or (options.cupstream != 0 and sequence[sindex+1] == 'G')) and len(set(DNA) | set(sequence[sindex-size1+1:sindex+1])) == 4:
-                            half_site1 = sequence[sindex-size1+1:sindex+1]
-                            Binding_site_flag = True
-        
-                            #Check for not T at 1 (A at 1 on plus strand)
-                            if Binding_site_flag==True and options.t1==True:
-                                if sequence[sindex] != 'A':
-                                    Binding_site_flag=True
-                                else:
-                                    Binding_site_flag=False
-                            
-                            #Check not A at 2 (T on plus strand)
-                            if Binding_site_flag==True and options.a2==True:
-                                if sequence[sindex-1] !='T':
-                                    Binding_site_flag=True
-                                else:
-                                    Binding_site_flag=False
-        
-                            #Require T at end so bound by NG (A on plus)
-                            if Binding_site_flag==True and options.tn==True:
-                                if sequence[sindex-size1+1] =='A':
-                                    Binding_site_flag=True
-                                else:
-                                    Binding_site_flag=False
-                                
-                            #Require last position to not be G (C on plus)
-                            if Binding_site_flag==True and options.gn==True:
-                                if sequence[sindex-size1+1] != 'C':
-                                    Binding_site_flag=True
-                                else:
-                                    Binding_site_flag=False
-        
-                            #Check nucleotide composition of the binding site
-                            if Binding_site_flag==True and options.comp==True:
-                                
-                                A2 = half_site1.count('T')/float(len(half_site1))
-                                C2 = half_site1.count('G')/float(len(half_site1))
-                                G2 = half_site1.count('C')/float(len(half_site1))
-                                T2 = half_site1.count('A')/float(len(half_site1))
-                    
-                                if A2<=percent_comp_range_top['A'] and A2>=percent_comp_range_bottom['A'] and C2<=percent_comp_range_top['C'] and C2>=percent_comp_range_bottom['C'] and G2<=percent_comp_range_top['G'] and G2>=percent_comp_range_bottom['G'] and T2<=percent_comp_range_top['T'] and T2>=percent_comp_range_bottom['T']:
-                                    Binding_site_flag=True
-                                else:
-                                    Binding_site_flag=False
-                                        
-                            #Create a binding site if all enforced rules have been met
-                            if Binding_site_flag==True:
-                                binding_site = Binding_site(perfectTAL1 = 'none', start1 = sindex, seq1 = half_site1, is_plus=False, upstream=sequence[sindex+1])
-                                if gene not in list(gene_binding_sites.keys()):
-                                    gene_binding_sites[gene] = {}
-        
-                                if sindex not in list(gene_binding_sites[gene].keys()):
-                                    gene_binding_sites[gene][sindex] = []
-                                        
-                                gene_binding_sites[gene][sindex].append(binding_site)
-        
-        
-        #Compute TALs for each gene, using "strong-binding" RVDs for each nucleotide (binds the nucleotide more than half the time and we have more than 10 observations)
-        logger('Designing best scoring perfect TALs for each potential site...')
-        
-        for gene in list(gene_binding_sites.keys()):
-            for start in list(gene_binding_sites[gene].keys()):
-                #Find the perfect RVD sequence from each potential plus strand start site
-                for binding_site in gene_binding_sites[gene][start]:
-                    TAL_1 = []
-                    if binding_site.is_plus:
-                        for bindex in range(0, len(binding_site.seq1)):
-                            TAL_1.append(strong_binding_RVDs[binding_site.seq1[bindex]])
-        
-                        TAL_1 = ' '.join(TAL_1)
-                    else:
-                        rev_comp_seq = binding_site.seq1.reverse_complement()
-                        for bindex in range(0, len(rev_comp_seq)):
-                            TAL_1.append(strong_binding_RVDs[rev_comp_seq[bindex]])
-                        TAL_1 = ' '.join(TAL_1)
-        
-                    binding_site.perfectTAL1 = TAL_1
+            for starts, size1, is_plus, upstreams in scanGene(binding_sites.genes[gene_index][1], half_site_size, options):
+                binding_sites.extend(gene_index, starts, size1, is_plus, upstreams)
+        
+        #TALs use "strong-binding" RVDs for each nucleotide (binds the nucleotide more than half the time and we have more than 10 observations)
+        #and are only built when the sites are written
         
         #Print output results to file: binding sites
         
@@ -374,34 +444,25 @@ def RunFindSingleTALSiteTask(options):
         else:
           filename = options.outpath
         
-        binding_sites = []
-        if len(list(gene_binding_sites.keys())) > 0:
-            for gene in sorted(gene_binding_sites.keys()):
-                for start_site in list(gene_binding_sites[gene].keys()):
-                    for binding_site in gene_binding_sites[gene][start_site]:
-                        binding_site.gene_id = gene.id
-                        binding_sites.append(binding_site)
+        output_order = binding_sites.outputOrder()
         
         if options.check_offtargets:
             
-            if len(binding_sites) > 0:
+            if len(output_order) > 0:
                 
-                off_target_seqs = []
+                off_target_seqs = [binding_sites.perfectTAL1(i) for i in output_order]
                 
-                for i, binding_site in enumerate(binding_sites):
-                    off_target_seqs.append(binding_site.perfectTAL1)
+                #the built-in counting scores the distinct RVD strings in a pool of --processes workers
+                count_options = {} if tfcount_found else {"workers": getattr(options, "processes", 1)}
                 
-                off_target_counts = TargetFinderCountTask(offtarget_seq_filename, options.logFilepath, options.cupstream, 3.0, off_target_seqs)
-                
-                for i, binding_site in enumerate(binding_sites):
-                    binding_site.offtarget_count = off_target_counts[i]
+                binding_sites.offtarget_counts = TargetFinderCountTask(offtarget_seq_filename, options.logFilepath, options.cupstream, 3.0, off_target_seqs, **count_options)
         
         out = open(filename, 'w')
         table_ignores = []
         if not options.revcomp:
             table_ignores.append("Plus strand sequence")
         if len(table_ignores) > 0:
-            out.write("table_ignores:" + string.join(table_ignores, ",") + "\n")
+            out.write("table_ignores:" + ",".join(table_ignores) + "\n")
         
         u_bases = []
         
@@ -423,21 +484,30 @@ def RunFindSingleTALSiteTask(options):
             ("Search reverse complement" if options.revcomp else ""),
         ]) + "\n")
         
+        check_mismatches = getattr(options, "mismatch_fasta", "NA") != "NA"
+        
+        if check_mismatches and len(output_order) > 0:
+            
+            logger("Searching for TAL sites with up to %d mismatches in %s" % (options.mismatches, options.mismatch_fasta))
+            
+            binding_sites.mismatch_profiles = mismatchProfiles(loadReference(options.mismatch_fasta), [binding_sites.seq1(i) for i in output_order], options.mismatches)
+        
         offtarget_header = "\tOff-Target Counts" if options.check_offtargets else ""
+        mismatch_header = "\tMismatch Profile" if check_mismatches else ""
         
-        out.write('Sequence Name\tTAL start\tTAL length\tRVD sequence\tStrand\tTarget sequence\tPlus strand sequence' + offtarget_header + '\n')
+        out.write('Sequence Name\tTAL start\tTAL length\tRVD sequence\tStrand\tTarget sequence\tPlus strand sequence' + offtarget_header + mismatch_header + '\n')
         
-        for i, binding_site in enumerate(binding_sites):
+        for output_index, i in enumerate(output_order):
             
             offtarget_string = ""
             
             if options.check_offtargets:
-                offtarget_string = "\t%d" % binding_site.offtarget_count
+                offtarget_string = "\t%d" % binding_sites.offtarget_counts[output_index]
             
-            if binding_site.is_plus:
-                out.write(binding_site.gene_id + '\t' + str(binding_site.start1) + '\t' + str(len(binding_site.seq1)) + '\t' + binding_site.perfectTAL1 + '\t' +  'Plus' + '\t' + binding_site.upstream + " " + str(binding_site.seq1) + '\t' + binding_site.upstream + " " + str(binding_site.seq1) + offtarget_string + '\n')
-            else:
-                out.write(binding_site.gene_id + '\t' + str(binding_site.start1) + '\t' + str(len(binding_site.seq1)) + '\t' + binding_site.perfectTAL1 + '\t' +  'Minus' + '\t' + ("T" if binding_site.upstream == "A" else "C") + " " + str(binding_site.seq1.reverse_complement()) + '\t' + str(binding_site.seq1) + " " + binding_site.upstream + offtarget_string + '\n')
+            if check_mismatches:
+                offtarget_string += "\t" + " ".join(str(count) for count in binding_sites.mismatch_profiles[output_index])
+            
+            out.write(binding_sites.outputLine(i, offtarget_string))
         
         out.close()
         
@@ -464,10 +534,13 @@ if __name__ == '__main__':
     parser.add_option('-y', '--arraymax', dest='arraymax', type='int', default=None, help='the maximum repeat array length to try')
     parser.add_option('-u', '--cupstream', dest='cupstream', type='int', default = 0, help='1 to look for C instead of T, 2 to look for either')
     parser.add_option('-s', '--gspec', dest='gspec', action='store_true', default = False, help='If true, use NH instead of NN for G')
+    parser.add_option('--processes', dest='processes', type='int', default = 1, help='number of workers counting off-targets')
     # Offtarget Options
     parser.add_option('--offtargets', dest='check_offtargets', action = 'store_true', default = False, help='Check offtargets')
     parser.add_option('--offtargets-fasta', dest='offtargets_fasta', type='string', default='NA', help='FASTA file containing to search for off-targets')
     parser.add_option('--offtargets-ncbi', dest='offtargets_ncbi', type='string', default='NA', help='NCBI nucleotide sequence ID to search for off-targets')
+    parser.add_option('--mismatch-fasta', dest='mismatch_fasta', type='string', default='NA', help='FASTA file to search for each TAL site with up to --mismatches mismatches')
+    parser.add_option('--mismatches', dest='mismatches', type='int', default=2, help='the maximum number of mismatches of --mismatch-fasta hits')
     parser.add_option('--genome', dest='genome', action = 'store_true', default = False, help='Input is a genome file')
     parser.add_option('--promoterome', dest='promoterome', action = 'store_true', default = False, help='Input is a promoterome file')
     parser.add_option('--organism', dest='organism', type = 'string', default='NA', help='Name of organism for the genome to be searched.')
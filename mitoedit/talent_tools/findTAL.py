@@ -1,10 +1,10 @@
 #!/usr/bin/python
-import os, sys
+import os
 
-from .talconfig import BASE_DIR, GENOME_FILE, PROMOTEROME_FILE, VALID_GENOME_ORGANISMS, VALID_PROMOTEROME_ORGANISMS, OFFTARGET_COUNTING_SIZE_LIMIT
+from .talconfig import BASE_DIR, GENOME_FILE, PROMOTEROME_FILE, VALID_GENOME_ORGANISMS, VALID_PROMOTEROME_ORGANISMS, OFFTARGET_COUNTING_SIZE_LIMIT, RE_SITES_FILE, RE_SITES_FORMAT_VERSION
 from .talutil import validate_options_handler, OptParser, FastaIterator, create_logger, check_fasta_pasta, OptionObject, TaskError, reverseComplement, Conditional
 from .entrez_cache import CachedEntrezFile
-from functools import reduce
+from functools import lru_cache
 
 # Set BASE_DIR explicitly if needed
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))  # This is still useful for other paths
@@ -19,110 +19,457 @@ except ImportError:
 
 import re
 import math
-import pickle
+import json
 import os
-from itertools import filterfalse
+from itertools import accumulate, chain
+from concurrent.futures import ProcessPoolExecutor
+from bisect import bisect_left
+from array import array
+
+import numpy as np
 
+#off-target counting uses the tfcount extension when it is installed, the built-in NumPy counting otherwise
 tfcount_found = True
 try:
     from btfcount import PairedTargetFinderCountTask
 except ImportError:
     tfcount_found = False
+    from .talscore import PairedTargetFinderCountTask
+
+from .fmindex import loadIndex
+from .mismatch import MAX_MISMATCHES, mismatchProfiles
+from .talscore import loadReference
 
 #Define a binding site object
 class BindingSite:
     
-    def __init__(self, **kwargs):
+    __slots__ = ("seq_id", "cutsite", "seq1_start", "seq1_end", "seq1_seq", "seq1_rvd", "spacer_start", "spacer_end", "spacer_seq",
+                 "seq2_start", "seq2_end", "seq2_seq", "seq2_rvd", "upstream", "cg_percent", "re_sites", "offtarget_counts", "site_counts", "mismatch_profiles")
+    
+    def __init__(self, seq_id=0, cutsite=0, seq1_start=0, seq1_end=0, seq1_seq="", seq1_rvd="", spacer_start=0, spacer_end=0, spacer_seq="",
+                 seq2_start=0, seq2_end=0, seq2_seq="", seq2_rvd="", upstream="", cg_percent=0, re_sites="", offtarget_counts=None, site_counts=None, mismatch_profiles=None):
+        
+        self.seq_id = seq_id
         
-        self.seq_id = kwargs.pop("seq_id", 0)
+        self.cutsite = cutsite
+        self.seq1_start = seq1_start
+        self.seq1_end = seq1_end
+        self.seq1_seq = seq1_seq
+        self.seq1_rvd = seq1_rvd
         
-        self.cutsite = kwargs.pop("cutsite", 0)
-        self.seq1_start = kwargs.pop("seq1_start", 0)
-        self.seq1_end = kwargs.pop("seq1_end", 0)
-        self.seq1_seq = kwargs.pop("seq1_seq", "")
-        self.seq1_rvd = kwargs.pop("seq1_rvd", "")
+        self.spacer_start = spacer_start
+        self.spacer_end = spacer_end
+        self.spacer_seq = spacer_seq
         
-        self.spacer_start = kwargs.pop("spacer_start", 0)
-        self.spacer_end = kwargs.pop("spacer_end", 0)
-        self.spacer_seq = kwargs.pop("spacer_seq", "")
+        self.seq2_start = seq2_start
+        self.seq2_end = seq2_end
+        self.seq2_seq = seq2_seq
+        self.seq2_rvd = seq2_rvd
         
-        self.seq2_start = kwargs.pop("seq2_start", 0)
-        self.seq2_end = kwargs.pop("seq2_end", 0)
-        self.seq2_seq = kwargs.pop("seq2_seq", "")
-        self.seq2_rvd = kwargs.pop("seq2_rvd", "")
+        self.upstream = upstream
         
-        self.upstream = kwargs.pop("upstream", "")
+        self.cg_percent = cg_percent
         
-        self.cg_percent = kwargs.pop("cg_percent", 0)
+        self.re_sites = re_sites
         
-        self.offtarget_counts = kwargs.pop("offtarget_counts", [0, 0, 0, 0, 0])
+        self.offtarget_counts = [0, 0, 0, 0, 0] if offtarget_counts is None else offtarget_counts
         
-        self.re_sites = ""
+        #exact occurrences of the TAL1 and TAL2 sites on either strand of a reference
+        self.site_counts = [0, 0] if site_counts is None else site_counts
+        
+        #[TAL1 profile, TAL2 profile], each the number of places in a reference the TAL site is found with 0, 1, ... mismatches
+        self.mismatch_profiles = [[], []] if mismatch_profiles is None else mismatch_profiles
 
-#re_dict_path = os.path.join(BASE_DIR, "re_dict_dump")
-#re_dict_path = "software/talent_tools_master/re_dict_dump"
-# Construct the full path to re_dict_dump
-re_dict_path = os.path.abspath(os.path.join(BASE_DIR, "re_dict_dump"))
-print(( "TALE-NT Tool is attempting to open:"), re_dict_path)
+class BindingSiteTable:
+    
+    #Columnar store of the binding sites found in one or more sequences, in output order.
+    #Positions are kept in parallel arrays and the TAL, spacer and RVD strings are only cut from the
+    #scanned sequence when a site is read, so unfiltered scans don't keep hundreds of thousands of
+    #objects alive. Indexing or iterating the table gives BindingSite objects built on the fly.
+    
+    def __init__(self, strong_binding_RVDs):
+        
+        #base -> "RVD " so that translating a TAL sequence gives its space separated RVDs plus a trailing space,
+        #and base -> "RVD of the complement " for the reversed TAL2 sequence
+        self.rvd_table = str.maketrans(dict((base, rvd + ' ') for base, rvd in strong_binding_RVDs.items()))
+        self.complement_rvd_table = str.maketrans(dict((base, strong_binding_RVDs[reverseComplement(base)] + ' ') for base in strong_binding_RVDs))
+        
+        #(seq_id, upper case sequence) of each scanned sequence
+        self.sequences = []
+        
+        self.sequence_index = array('i')
+        self.cutsite = array('l')
+        self.seq1_start = array('l')
+        self.seq1_end = array('l')
+        self.seq2_start = array('l')
+        self.seq2_end = array('l')
+        self.upstream = bytearray()
+        self.cg_percent = array('b')
+        #RE site strings are shared by every site with the same spacer
+        self.re_sites = []
+        
+        #one list of 5 counts per site once off-targets have been counted
+        self.offtarget_counts = None
+        
+        #one [TAL1 count, TAL2 count] per site once the sites have been looked up in a reference index
+        self.site_counts = None
+        
+        #one [TAL1 profile, TAL2 profile] per site once the sites have been searched for with mismatches
+        self.mismatch_profiles = None
+    
+    def __len__(self):
+        return len(self.cutsite)
+    
+    def __getitem__(self, i):
+        
+        seq_id, sequence = self.sequences[self.sequence_index[i]]
+        
+        seq1_start = self.seq1_start[i]
+        seq1_end = self.seq1_end[i]
+        seq2_start = self.seq2_start[i]
+        seq2_end = self.seq2_end[i]
+        
+        seq1_seq = sequence[seq1_start : seq1_end]
+        seq2_seq = sequence[seq2_start : seq2_end]
+        
+        return BindingSite(seq_id = seq_id,
+                           cutsite = self.cutsite[i],
+                           seq1_start = seq1_start,
+                           seq1_end = seq1_end,
+                           seq1_seq = seq1_seq,
+                           seq1_rvd = seq1_seq.translate(self.rvd_table)[:-1],
+                           spacer_start = seq1_end,
+                           spacer_end = seq2_start,
+                           spacer_seq = sequence[seq1_end : seq2_start],
+                           seq2_start = seq2_start,
+                           seq2_end = seq2_end,
+                           seq2_seq = seq2_seq,
+                           seq2_rvd = seq2_seq[::-1].translate(self.complement_rvd_table)[:-1],
+                           upstream = chr(self.upstream[i]),
+                           cg_percent = self.cg_percent[i],
+                           re_sites = self.re_sites[i],
+                           offtarget_counts = None if self.offtarget_counts is None else self.offtarget_counts[i],
+                           site_counts = None if self.site_counts is None else self.site_counts[i],
+                           mismatch_profiles = None if self.mismatch_profiles is None else self.mismatch_profiles[i])
+    
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+    
+    def addSequence(self, seq_id, sequence):
+        
+        self.sequences.append((seq_id, sequence))
+        
+        return len(self.sequences) - 1
+    
+    def append(self, sequence_index, cutsite, seq1_start, seq1_end, seq2_start, seq2_end, upstream, cg_percent, re_sites):
+        
+        self.sequence_index.append(sequence_index)
+        self.cutsite.append(cutsite)
+        self.seq1_start.append(seq1_start)
+        self.seq1_end.append(seq1_end)
+        self.seq2_start.append(seq2_start)
+        self.seq2_end.append(seq2_end)
+        self.upstream.append(ord(upstream))
+        self.cg_percent.append(cg_percent)
+        self.re_sites.append(re_sites)
+    
+    def rvdPairs(self):
+        
+        #[TAL1 RVDs, TAL2 RVDs] of every site, as taken by off-target counting
+        
+        rvd_pairs = []
+        
+        for i in range(len(self)):
+            sequence = self.sequences[self.sequence_index[i]][1]
+            rvd_pairs.append([sequence[self.seq1_start[i] : self.seq1_end[i]].translate(self.rvd_table)[:-1],
+                              sequence[self.seq2_start[i] : self.seq2_end[i]][::-1].translate(self.complement_rvd_table)[:-1]])
+        
+        return rvd_pairs
+    
+    def talSites(self):
+        
+        #[TAL1 plus strand sequence, TAL2 plus strand sequence] of every site
+        
+        tal_sites = []
+        
+        for i in range(len(self)):
+            sequence = self.sequences[self.sequence_index[i]][1]
+            tal_sites.append([sequence[self.seq1_start[i] : self.seq1_end[i]], sequence[self.seq2_start[i] : self.seq2_end[i]]])
+        
+        return tal_sites
+    
+    def countSites(self, index):
+        
+        #[TAL1 count, TAL2 count] of every site in an fmindex.FMIndex, each distinct TAL site looked up once
+        
+        counts = {}
+        site_counts = []
+        
+        for tal_sites in self.talSites():
+            
+            for tal_site in tal_sites:
+                if tal_site not in counts:
+                    counts[tal_site] = index.count(tal_site)
+            
+            site_counts.append([counts[tal_site] for tal_site in tal_sites])
+        
+        return site_counts
+    
+    def mismatchProfiles(self, reference, max_mismatches):
+        
+        #[TAL1 profile, TAL2 profile] of every site in a reference, see mismatch.mismatchProfiles.
+        #All TAL sites are searched for in one pass over the reference.
+        
+        tal_sites = self.talSites()
+        
+        profiles = mismatchProfiles(reference, [tal_site for pair in tal_sites for tal_site in pair], max_mismatches)
+        
+        return [profiles[2 * i : 2 * i + 2] for i in range(len(tal_sites))]
+    
+    def records(self, check_offtargets=False, check_uniqueness=False, check_mismatches=False):
+        
+        #output table rows of every site, see bindingSiteRecord
+        
+        for i in range(len(self)):
+            yield bindingSiteRecord(self[i], check_offtargets, check_uniqueness, check_mismatches)
+
+@lru_cache(maxsize=None)
+def loadRESites(re_sites_path=RE_SITES_FILE):
+    
+    #Load the enzyme table on first use: enzyme -> {"compiled": regex, "short": IUPAC string}, in report order
+    
+    if not os.path.isfile(re_sites_path):
+        raise TaskError("Restriction enzyme table not found: %s (generate it with utils/re_dict_builder.py)" % re_sites_path)
+    
+    with open(re_sites_path, "r") as re_sites_file:
+        re_sites = json.load(re_sites_file)
+    
+    if re_sites.get("format_version") != RE_SITES_FORMAT_VERSION:
+        raise TaskError("Restriction enzyme table %s has format version %s, expected %d; regenerate it with utils/re_dict_builder.py" % (re_sites_path, re_sites.get("format_version"), RE_SITES_FORMAT_VERSION))
+    
+    return dict((enzyme, {"compiled": re.compile(pattern), "short": short}) for enzyme, pattern, short in re_sites["enzymes"])
 
+def __getattr__(name):
+    
+    #NEB_RE_sites used to be loaded at import time; keep it available as a lazily loaded attribute
+    
+    if name == "NEB_RE_sites":
+        return loadRESites()
+    
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
-if not os.path.isfile(re_dict_path):
-    print(("TALE-NT Tool [Error] File not found:"), re_dict_path)
-    sys.exit(1)
+STREUBEL_AT_STREAK = 6
 
-with open(re_dict_path, "rb") as re_dict_file:
-#with open(BASE_DIR + "/re_dict_dump", "rb") as re_dict_file:
-#with open(os.path.join(BASE_DIR, "talent_tools-master", "re_dict_dump"), "rb") as re_dict_file:
-    NEB_RE_sites = pickle.load(re_dict_file)
+#restriction sites in a spacer are only reported if they are unique within this many bases around it
+RE_UNIQUENESS_FLANK = 250
+
+streubel_at_streak_re = re.compile('[AT]{%d,}' % STREUBEL_AT_STREAK)
+
+#parallel scans split each sequence into about this many chunks per process, each of at least
+#SCAN_CHUNK_MIN_CUT_SITES cut sites so that small sequences are not spread thin
+SCAN_CHUNKS_PER_PROCESS = 4
+SCAN_CHUNK_MIN_CUT_SITES = 1000
+
+OUTPUT_COLUMNS = ['Sequence Name', 'Cut Site', 'TAL1 start', 'TAL2 start', 'TAL1 length', 'TAL2 length', 'Spacer length', 'Spacer range', 'TAL1 RVDs', 'TAL2 RVDs', 'Plus strand sequence', 'Unique RE sites in spacer', '% RVDs HD or NN/NH']
+
+#columns added by mismatch searches
+MISMATCH_COLUMNS = ['TAL1 Mismatch Profile', 'TAL2 Mismatch Profile']
 
-streubel_at_streak_re = re.compile('[AT]{6,}')
 
 if celery_found:
     @task(base=BaseTask)
     def FindTALTask(*args, **kwargs):
         RunFindTALTask(OptionObject(**kwargs))
 
-def findRESitesInSpacer(sequence, binding_site):
+#Fixed-length enzyme patterns that can be answered from precomputed hit positions
+simple_re_site_re = re.compile(r'^(?:[ACGT]|\[[ACGT]+\])+(?:\|(?:[ACGT]|\[[ACGT]+\])+)*$')
+
+def buildREScanTable(re_sites):
     
-    enzymes_in_spacer = []
+    #For each enzyme (in table order) store a lookahead regex finding overlapping hits and the site length.
+    #Enzymes whose sites do not all have the same length are flagged to be checked with findall instead.
+    
+    scan_table = []
+    
+    for enzyme in re_sites:
+        
+        pattern = re_sites[enzyme]["compiled"].pattern
+        site_lengths = set(len(re.sub(r'\[[ACGT]+\]', 'N', branch)) for branch in pattern.split('|'))
+        
+        if simple_re_site_re.match(pattern) and len(site_lengths) == 1:
+            scan_table.append((enzyme, re.compile('(?=(?:%s))' % pattern), site_lengths.pop()))
+        else:
+            scan_table.append((enzyme, None, 0))
+    
+    return scan_table
+
+@lru_cache(maxsize=None)
+def defaultREScanTable():
+    return buildREScanTable(loadRESites())
 
+class RESiteIndex:
+    
+    #Positions of every restriction enzyme hit in one sequence, built once per scanned sequence.
+    #For a fixed-length site of length L, findall on sequence[a:b] returns exactly one match iff the
+    #first hit p0 in [a, b - L] exists and no hit starts in [p0 + L, b - L], which is answered with
+    #two bisections on the enzyme's sorted hit positions. The hits of all enzymes are also kept in one
+    #position-sorted array, so the enzymes with a hit in a spacer are found with one bisection too.
+    
+    def __init__(self, sequence, re_sites=None):
+        
+        self.sequence = sequence
+        
+        if re_sites is None:
+            self.re_sites = loadRESites()
+            self.scan_table = defaultREScanTable()
+        else:
+            self.re_sites = re_sites
+            self.scan_table = buildREScanTable(re_sites)
+        
+        #enzyme index -> sorted hit start positions, None for the enzymes checked with findall
+        self.hits = []
+        #enzymes that must be checked with findall
+        self.irregular = []
+        
+        for enzyme_index, (enzyme, lookahead_re, site_length) in enumerate(self.scan_table):
+            
+            if lookahead_re is None:
+                self.hits.append(None)
+                self.irregular.append(enzyme_index)
+                continue
+            
+            self.hits.append(array('q', (match.start() for match in lookahead_re.finditer(sequence))))
+        
+        #hit start positions of all enzymes in sequence order, with the index of each hit's enzyme
+        positions = np.concatenate([np.frombuffer(hits, dtype=np.int64) for hits in self.hits if hits is not None] + [np.zeros(0, dtype=np.int64)])
+        enzymes = np.repeat(np.arange(len(self.hits), dtype=np.int32), [len(hits) if hits is not None else 0 for hits in self.hits])
+        order = np.argsort(positions, kind='stable')
+        
+        self.hit_positions = array('q', positions[order].tobytes())
+        self.hit_enzymes = array('i', enzymes[order].tobytes())
+    
+    def isUnique(self, enzyme_index, start, end):
+        
+        #True if findall finds the enzyme exactly once in sequence[start:end]
+        
+        enzyme, lookahead_re, site_length = self.scan_table[enzyme_index]
+        
+        if lookahead_re is None:
+            return len(self.re_sites[enzyme]["compiled"].findall(self.sequence[start:end])) == 1
+        
+        end = min(end, len(self.sequence))
+        last_start = end - site_length
+        hits = self.hits[enzyme_index]
+        
+        first = bisect_left(hits, start)
+        
+        if first == len(hits) or hits[first] > last_start:
+            return False
+        
+        second = bisect_left(hits, hits[first] + site_length)
+        
+        return second == len(hits) or hits[second] > last_start
+    
+    def uniqueEnzymes(self, start, end, check_start, check_end):
+        
+        #Enzymes (in table order) found exactly once in sequence[start:end] and in sequence[check_start:check_end]
+        
+        candidates = set(self.irregular)
+        
+        first = bisect_left(self.hit_positions, start)
+        last = bisect_left(self.hit_positions, end)
+        
+        for position, enzyme_index in zip(self.hit_positions[first:last], self.hit_enzymes[first:last]):
+            if position + self.scan_table[enzyme_index][2] <= end:
+                candidates.add(enzyme_index)
+        
+        return [self.scan_table[enzyme_index][0] for enzyme_index in sorted(candidates)
+                if self.isUnique(enzyme_index, start, end) and self.isUnique(enzyme_index, check_start, check_end)]
+
+def spacerRESites(re_site_index, spacer_start, spacer_end, sequence_length, offset=0):
+    
+    #Enzymes that occur once in the spacer and don't occur again in the flanking sequence, formatted for output.
+    #re_site_index may cover a chunk of the sequence starting at offset, as long as the chunk spans
+    #RE_UNIQUENESS_FLANK bases on each side of the spacer (or reaches the end of the sequence).
+    
     #identify sequence to check around the spacer for unique-ness
     
-    if binding_site.spacer_start >= 250:
-        seq_check_start = binding_site.spacer_start - 250
+    if spacer_start >= RE_UNIQUENESS_FLANK:
+        seq_check_start = spacer_start - RE_UNIQUENESS_FLANK
     else:
         seq_check_start = 0
     
-    if len(sequence) - binding_site.spacer_end >= 250:
-        seq_check_end = binding_site.spacer_end + 250 + 1
+    if sequence_length - spacer_end >= RE_UNIQUENESS_FLANK:
+        seq_check_end = spacer_end + RE_UNIQUENESS_FLANK + 1
     else:
-        seq_check_end = len(sequence)
-    
-    #For each enzyme check if it occurs once in the spacer:
-    for enzyme in NEB_RE_sites:
-        if len(NEB_RE_sites[enzyme]["compiled"].findall(binding_site.spacer_seq)) == 1:
+        seq_check_end = sequence_length
     
-            #If unique in spacer, check that it doesen't occur in  the flanking sequence                
-            if len(NEB_RE_sites[enzyme]["compiled"].findall(sequence[seq_check_start : seq_check_end])) == 1:                   
-                enzymes_in_spacer.append(enzyme)
+    enzymes_in_spacer = re_site_index.uniqueEnzymes(spacer_start - offset, spacer_end - offset, seq_check_start - offset, seq_check_end - offset)
     
     #Create a string listing the enzymes and their sequences that can printed in the output
-    enzyme_string = ' '.join(["%s:%s" % (enzyme, NEB_RE_sites[enzyme]["short"]) for enzyme in enzymes_in_spacer])
+    enzyme_string = ' '.join(["%s:%s" % (enzyme, re_site_index.re_sites[enzyme]["short"]) for enzyme in enzymes_in_spacer])
     
     if len(enzyme_string) == 0:
         enzyme_string = 'none'
     
+    return enzyme_string
+
+def findRESitesInSpacer(sequence, binding_site, re_site_index=None):
+    
+    if re_site_index is None or re_site_index.sequence != sequence:
+        re_site_index = RESiteIndex(sequence)
+    
     #append enzyme string to binding site object
-    binding_site.re_sites = enzyme_string
+    binding_site.re_sites = spacerRESites(re_site_index, binding_site.spacer_start, binding_site.spacer_end, len(sequence))
 
-def filterByTALSize(x, y):
-    x_average_tal_len = float(len(x.seq1_seq) + len(x.seq2_seq)) / 2
-    y_average_tal_len = float(len(y.seq1_seq) + len(y.seq2_seq)) / 2
+class SequenceStats:
     
-    if x_average_tal_len == y_average_tal_len:
-        return y if len(y.spacer_seq) < len(x.spacer_seq) else x
-    else:
-        return y if y_average_tal_len > x_average_tal_len else x
+    #Prefix sums over one scanned sequence so candidate TAL pairs are checked in O(1):
+    #invalid (non-ACGT) bases, C/G bases and positions ending an A/T streak of Streubel length.
+    #The reverse complement of a range has the same C/G count and the same A/T streaks, so TAL2
+    #is checked on the plus strand.
+    
+    def __init__(self, sequence):
+        
+        self.invalid = list(accumulate((c not in 'ACGT' for c in sequence), initial=0))
+        self.cg = list(accumulate((c == 'C' or c == 'G' for c in sequence), initial=0))
+        
+        streak_ends = [False] * len(sequence)
+        
+        for streak in streubel_at_streak_re.finditer(sequence):
+            for position in range(streak.start() + STREUBEL_AT_STREAK - 1, streak.end()):
+                streak_ends[position] = True
+        
+        self.streak_ends = list(accumulate(streak_ends, initial=0))
+    
+    def isValid(self, start, end):
+        return self.invalid[end] == self.invalid[start]
+    
+    def cgCount(self, start, end):
+        return self.cg[end] - self.cg[start]
+    
+    def hasATStreak(self, start, end):
+        
+        #a streak lies inside [start, end) iff one ends at a position >= start + STREUBEL_AT_STREAK - 1
+        
+        first_end = start + STREUBEL_AT_STREAK - 1
+        
+        return first_end < end and self.streak_ends[end] > self.streak_ends[first_end]
+    
+    def failsStreubel(self, seq1_start, seq1_end, seq2_start, seq2_end):
+        
+        #same verdict as filterStreubel for the site with these TALs
+        
+        for start, end in ((seq1_start, seq1_end), (seq2_start, seq2_end)):
+            
+            if float(self.cgCount(start, end)) / (end - start) < 0.25:
+                return True
+            
+            if self.hasATStreak(start, end):
+                return True
+        
+        return False
 
 def filterStreubel(binding_site):
     
@@ -171,6 +518,9 @@ def validateOptions(options):
     if options.max < options.min:
         raise TaskError("Maximum spacer length cannot be less than the minimum spacer length")
     
+    if options.processes < 1:
+        raise TaskError("At least one process is required")
+    
     if options.offtargets_ncbi != "NA":
         
         options.offtargets_ncbi = options.offtargets_ncbi.strip()
@@ -192,6 +542,17 @@ def validateOptions(options):
         
         options.check_offtargets = True
     
+    if options.unique_fasta != "NA" and (not os.path.exists(options.unique_fasta) or os.path.getsize(options.unique_fasta) <= 2):
+        raise TaskError("Uniqueness FASTA file must exist and be non-empty.")
+    
+    if options.mismatch_fasta != "NA":
+        
+        if not os.path.exists(options.mismatch_fasta) or os.path.getsize(options.mismatch_fasta) <= 2:
+            raise TaskError("Mismatch FASTA file must exist and be non-empty.")
+        
+        if options.mismatches < 0 or options.mismatches > MAX_MISMATCHES:
+            raise TaskError("Between 0 and %d mismatches can be searched for" % MAX_MISMATCHES)
+    
     if options.check_offtargets:
         
         if ((options.genome and options.organism not in VALID_GENOME_ORGANISMS) or (options.promoterome and options.organism not in VALID_PROMOTEROME_ORGANISMS)):
@@ -213,6 +574,399 @@ def validateOptions(options):
             
             if gene_length_total > 1000:
                 raise TaskError("Off-target counting is only available when designing TALENs for sequences that are 1000 bases or less")
+def scanOptions(options):
+    """Return the (strand_min, strand_max, spacer_min, spacer_max, u_bases, strong_binding_RVDs) used by a scan"""
+    
+    strong_binding_RVDs = {
+        'A':'NI',
+        'C':'HD',
+        'G':'NN',
+        'T':'NG'
+    }
+    
+    if options.gspec:
+        strong_binding_RVDs['G'] = 'NH'
+    
+    strand_min = 15 if options.arraymin is None else options.arraymin
+    strand_max = 20 if options.arraymax is None else options.arraymax
+    
+    spacer_min = 15 if options.min is None else options.min
+    spacer_max = 30 if options.max is None else options.max
+    
+    u_bases = []
+    
+    if options.cupstream != 1:
+        u_bases.append("T")
+    
+    if options.cupstream != 0:
+        u_bases.append("C")
+    
+    return strand_min, strand_max, spacer_min, spacer_max, u_bases, strong_binding_RVDs
+
+def scanCutSites(sequence, options):
+    
+    #cut sites scanned in a sequence, None if the filter 1 cut site lies past its end
+    
+    if options.filter == 1:
+        if options.filterbase > len(sequence):
+            return None
+        return [options.filterbase]
+    
+    return range(len(sequence))
+
+def scanCandidates(sequence, cut_site_positions, scan_options, offset=0, sequence_length=None):
+    
+    #Enumerate the valid TAL pairs around each cut site, before any deduplication or filtering.
+    #sequence may be a chunk of a longer upper case sequence that starts at offset; cut sites and
+    #returned positions are always in the coordinates of the full sequence of length sequence_length.
+    #Yields (cut site, [(spacer size, upstream base, spacer RE sites, [(tal1_start, tal2_end, cg_count), ...]), ...])
+    #in scan order, leaving out spacer sizes and cut sites without candidates.
+    
+    strand_min, strand_max, spacer_min, spacer_max, u_bases, strong_binding_RVDs = scan_options
+    
+    if sequence_length is None:
+        sequence_length = len(sequence)
+    
+    sequence_stats = None
+    re_site_index = None
+    
+    for i in cut_site_positions:
+        
+        cut_site_groups = []
+        
+        for spacer_size in range(spacer_min, spacer_max + 1):
+            
+            spacer_re_sites = None
+            
+            spacer_size_left = int(math.floor(float(spacer_size) / 2))
+            spacer_size_right = int(math.ceil(float(spacer_size) / 2))
+            
+            if i < (strand_min + spacer_size_left + 1) or i > (sequence_length - (strand_min + spacer_size_right) - 1):
+                continue
+            
+            for u_base in u_bases:
+                
+                if u_base == "T":
+                    d_base = "A"
+                elif u_base == "C":
+                    d_base = "G"
+                    
+                u_pos_search_start = i - (strand_max + spacer_size_left) - 1
+                
+                if u_pos_search_start < 0:
+                    u_pos_search_start = 0
+                    
+                u_pos_search_end = i - (strand_min + spacer_size_left)
+                
+                d_pos_search_start = i + (strand_min + spacer_size_right)
+                d_pos_search_end = i + (strand_max + spacer_size_right) + 1
+                
+                #search in chunk coordinates
+                u_pos_search_start -= offset
+                u_pos_search_end -= offset
+                d_pos_search_start -= offset
+                d_pos_search_end -= offset
+                
+                u_positions = []
+
+                u_pos = 0
+                
+                while True:
+                    
+                    u_pos = sequence.rfind(u_base, u_pos_search_start, u_pos_search_end)
+                    
+                    if u_pos == -1:
+                        break
+                    else:
+                        u_pos_search_end = u_pos
+                        u_positions.append(u_pos)
+                
+                d_positions = []
+                
+                d_pos = 0
+                
+                while True:
+                    
+                    d_pos = sequence.find(d_base, d_pos_search_start, d_pos_search_end)
+                    
+                    if d_pos == -1:
+                        break
+                    else:
+                        d_pos_search_start = d_pos + 1
+                        d_positions.append(d_pos)
+                
+                if len(u_positions) == 0 or len(d_positions) == 0:
+                    continue
+                
+                if sequence_stats is None:
+                    sequence_stats = SequenceStats(sequence)
+                
+                #uses inclusive start, exclusive end
+                tal1_end = i - spacer_size_left - offset
+                tal2_start = i + spacer_size_right - offset
+                
+                candidates = []
+                
+                for u_pos in reversed(u_positions):
+                    
+                    tal1_start = u_pos + 1
+                    
+                    #reject candidates containing bases without a strong binding RVD
+                    if not sequence_stats.isValid(tal1_start, tal1_end):
+                        continue
+                    
+                    tal1_cg_count = sequence_stats.cgCount(tal1_start, tal1_end)
+                    
+                    for d_pos in reversed(d_positions):
+                        
+                        if sequence_stats.isValid(tal2_start, d_pos):
+                            candidates.append((tal1_start + offset, d_pos + offset, tal1_cg_count + sequence_stats.cgCount(tal2_start, d_pos)))
+                
+                if len(candidates) > 0:
+                    
+                    #the spacer only depends on the cut site and spacer size
+                    if spacer_re_sites is None:
+                        
+                        if re_site_index is None:
+                            re_site_index = RESiteIndex(sequence)
+                        
+                        spacer_re_sites = spacerRESites(re_site_index, tal1_end + offset, tal2_start + offset, sequence_length, offset)
+                    
+                    cut_site_groups.append((spacer_size, u_base, spacer_re_sites, candidates))
+        
+        if len(cut_site_groups) > 0:
+            yield i, cut_site_groups
+
+def selectBindingSites(sequence, seq_id, candidates, options, scan_options, binding_sites=None):
+    
+    #Replay scanCandidates output in scan order, keeping the first occurrence of each TAL pair,
+    #the site with the longest TALs (then shortest spacer) of each spacer size and cut site for
+    #filter 0, and the Streubel guidelines. The sites are appended to binding_sites, a new
+    #BindingSiteTable if not given, which is returned.
+    
+    strand_min, strand_max, spacer_min, spacer_max, u_bases, strong_binding_RVDs = scan_options
+    
+    if binding_sites is None:
+        binding_sites = BindingSiteTable(strong_binding_RVDs)
+    
+    sequence_index = binding_sites.addSequence(seq_id, sequence)
+    
+    #(TAL1 sequence, TAL2 sequence) of every site kept so far; a candidate is a repeat if
+    #(TAL1, TAL2), (TAL1, TAL1), (TAL2, TAL1) or (TAL2, TAL2) was kept
+    registered_pairs = set()
+    
+    sequence_stats = SequenceStats(sequence) if options.streubel else None
+    
+    #sites are (tal1_start, tal1_end, tal2_start, tal2_end, upstream base, cg_percent, RE sites) until they are kept
+    def tal_size(site):
+        return (site[1] - site[0] + site[3] - site[2], site[1] - site[2])
+    
+    def keep(site):
+        tal1_start, tal1_end, tal2_start, tal2_end, u_base, cg_percent, re_sites = site
+        if sequence_stats is None or not sequence_stats.failsStreubel(tal1_start, tal1_end, tal2_start, tal2_end):
+            binding_sites.append(sequence_index, i, tal1_start, tal1_end, tal2_start, tal2_end, u_base, cg_percent, re_sites)
+    
+    for i, cut_site_groups in candidates:
+        
+        cut_site_potential_sites = []
+        
+        spacer_potential_sites = []
+        
+        for group_index, (spacer_size, u_base, spacer_re_sites, group_candidates) in enumerate(cut_site_groups):
+            
+            spacer_size_left = int(math.floor(float(spacer_size) / 2))
+            spacer_size_right = int(math.ceil(float(spacer_size) / 2))
+            
+            tal1_end = i - spacer_size_left
+            tal2_start = i + spacer_size_right
+            
+            for tal1_start, tal2_end, cg_count in group_candidates:
+                
+                tal1_seq = sequence[tal1_start : tal1_end]
+                tal2_seq = sequence[tal2_start : tal2_end]
+                
+                if not ((tal1_seq, tal2_seq) in registered_pairs or (tal1_seq, tal1_seq) in registered_pairs or \
+                (tal2_seq, tal1_seq) in registered_pairs or (tal2_seq, tal2_seq) in registered_pairs):
+                    
+                    registered_pairs.add((tal1_seq, tal2_seq))
+                    
+                    cg_percent = int(round(float(cg_count) / (len(tal1_seq) + len(tal2_seq)), 2) * 100)
+                    
+                    spacer_potential_sites.append((tal1_start, tal1_end, tal2_start, tal2_end, u_base, cg_percent, spacer_re_sites))
+                    
+                    #filter 0 stops at the first new site of each upstream base
+                    if options.filter == 0:
+                        break
+            
+            #the sites of one spacer size are pooled over both upstream bases
+            if group_index + 1 == len(cut_site_groups) or cut_site_groups[group_index + 1][0] != spacer_size:
+                
+                if len(spacer_potential_sites) > 0:
+                    if options.filter == 0:
+                        #longest TALs, then shortest spacer, then the first such site
+                        cut_site_potential_sites.append(max(spacer_potential_sites, key=tal_size))
+                    else:
+                        cut_site_potential_sites.extend(spacer_potential_sites)
+                
+                spacer_potential_sites = []
+        
+        if len(cut_site_potential_sites) > 0:
+            if options.filter == 0:
+                keep(max(cut_site_potential_sites, key=tal_size))
+            else:
+                for site in cut_site_potential_sites:
+                    keep(site)
+    
+    return binding_sites
+
+def find_tal_sites(sequence, options, seq_id="sequence", logger=None, binding_sites=None):
+    """
+    Scan one sequence for TALEN binding sites in-process.
+    
+    sequence is a string or a seqops.EncodedSequence.
+    options uses the RunFindTALTask option names (min, max, arraymin, arraymax, cupstream,
+    filter, filterbase, gspec, streubel). Off-target counting is not performed here.
+    The sites are appended in output order to binding_sites, a new BindingSiteTable if not
+    given, which is returned.
+    """
+    
+    if logger is None:
+        logger = lambda message: None
+    
+    scan_options = scanOptions(options)
+    
+    if binding_sites is None:
+        binding_sites = BindingSiteTable(scan_options[5])
+    
+    sequence = str(sequence).upper()
+    
+    cut_site_positions = scanCutSites(sequence, options)
+    
+    if cut_site_positions is None:
+        logger("Skipped %s as the provided cut site was greater than the sequence length" % (seq_id))
+        return binding_sites
+    
+    logger("Scanning %s for binding sites" % (seq_id))
+    
+    return selectBindingSites(sequence, seq_id, scanCandidates(sequence, cut_site_positions, scan_options), options, scan_options, binding_sites)
+
+def scanChunk(task):
+    
+    #process pool entry point, see chunkTasks
+    
+    chunk, offset, sequence_length, cut_site_positions, scan_options = task
+    
+    return list(scanCandidates(chunk, cut_site_positions, scan_options, offset, sequence_length))
+
+def chunkTasks(sequence, cut_site_positions, scan_options, chunk_count):
+    
+    #Split the cut sites of one sequence into about chunk_count runs of at least SCAN_CHUNK_MIN_CUT_SITES.
+    #Each task only carries the part of the sequence its cut sites can reach: the TAL arrays and
+    #spacer around a cut site never extend more than the maximum array plus spacer length from it,
+    #and restriction sites are checked for uniqueness RE_UNIQUENESS_FLANK bases beyond the spacer.
+    
+    strand_min, strand_max, spacer_min, spacer_max, u_bases, strong_binding_RVDs = scan_options
+    
+    overlap = strand_max + spacer_max + RE_UNIQUENESS_FLANK + 1
+    
+    chunk_size = max(SCAN_CHUNK_MIN_CUT_SITES, int(math.ceil(float(len(cut_site_positions)) / chunk_count)))
+    
+    tasks = []
+    
+    for start in range(0, len(cut_site_positions), chunk_size):
+        
+        chunk_positions = cut_site_positions[start : start + chunk_size]
+        
+        chunk_start = max(0, chunk_positions[0] - overlap)
+        chunk_end = min(len(sequence), chunk_positions[-1] + overlap + 1)
+        
+        tasks.append((sequence[chunk_start : chunk_end], chunk_start, len(sequence), chunk_positions, scan_options))
+    
+    return tasks
+
+def find_tal_sites_in_records(records, options, logger=None, processes=1):
+    """
+    Scan (seq_id, sequence) records for TALEN binding sites, as find_tal_sites does for each.
+    Sequences are strings or seqops.EncodedSequence objects.
+    
+    With processes > 1 the cut sites of every record are split into overlapping chunks that are
+    enumerated concurrently in a process pool. The candidates then go through the same in-order
+    deduplication and filtering as a serial scan, so the output is identical.
+    Returns the BindingSiteTable of all records in output order.
+    """
+    
+    if logger is None:
+        logger = lambda message: None
+    
+    scan_options = scanOptions(options)
+    
+    binding_sites = BindingSiteTable(scan_options[5])
+    
+    if processes is None or processes <= 1:
+        
+        for seq_id, sequence in records:
+            find_tal_sites(sequence, options, seq_id, logger, binding_sites)
+        
+        return binding_sites
+    
+    scans = []
+    tasks = []
+    
+    for seq_id, sequence in records:
+        
+        sequence = str(sequence).upper()
+        
+        cut_site_positions = scanCutSites(sequence, options)
+        
+        if cut_site_positions is None:
+            logger("Skipped %s as the provided cut site was greater than the sequence length" % (seq_id))
+            continue
+        
+        logger("Scanning %s for binding sites" % (seq_id))
+        
+        sequence_tasks = chunkTasks(sequence, cut_site_positions, scan_options, processes * SCAN_CHUNKS_PER_PROCESS)
+        
+        scans.append((seq_id, sequence, len(sequence_tasks)))
+        tasks.extend(sequence_tasks)
+    
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        chunk_candidates = executor.map(scanChunk, tasks)
+        
+        for seq_id, sequence, task_count in scans:
+            candidates = chain.from_iterable(next(chunk_candidates) for task_index in range(task_count))
+            selectBindingSites(sequence, seq_id, candidates, options, scan_options, binding_sites)
+    
+    return binding_sites
+
+def bindingSiteRecord(binding_site, check_offtargets=False, check_uniqueness=False, check_mismatches=False):
+    """Return the output table row of a binding site as typed values, in OUTPUT_COLUMNS order"""
+    
+    record = [
+        str(binding_site.seq_id),
+        binding_site.cutsite,
+        binding_site.seq1_start,
+        binding_site.seq2_end - 1,
+        binding_site.seq1_end - binding_site.seq1_start,
+        binding_site.seq2_end - binding_site.seq2_start,
+        binding_site.spacer_end - binding_site.spacer_start,
+        str(binding_site.spacer_start) + '-' + str(binding_site.spacer_end - 1),
+        binding_site.seq1_rvd,
+        binding_site.seq2_rvd,
+        binding_site.upstream + ' ' + binding_site.seq1_seq + ' ' + binding_site.spacer_seq.lower() + ' ' + binding_site.seq2_seq + ' ' + ("A" if binding_site.upstream == "T" else "G"),
+        binding_site.re_sites,
+        binding_site.cg_percent
+    ]
+    
+    if check_offtargets:
+        record.append(' '.join(str(binding_site.offtarget_counts[x]) for x in range(5)))
+    
+    if check_uniqueness:
+        record.append(' '.join(str(count) for count in binding_site.site_counts))
+    
+    if check_mismatches:
+        record.extend(' '.join(str(count) for count in profile) for profile in binding_site.mismatch_profiles)
+    
+    return record
 
 def RunFindTALTask(options):
     
@@ -227,9 +981,6 @@ def RunFindTALTask(options):
         
         if options.check_offtargets:
             
-            if not tfcount_found:
-                raise TaskError("Non off-target counting worker attempted to process off-target counting task.")
-            
             if options.offtargets_ncbi != "NA":
                 
                 logger("Finished retrieving NCBI off-target sequence.")
@@ -255,15 +1006,7 @@ def RunFindTALTask(options):
             else:
                 offtarget_seq_filename = options.fasta
         
-        strong_binding_RVDs = {
-            'A':'NI',
-            'C':'HD',
-            'G':'NN',
-            'T':'NG'
-        }
-        
-        if options.gspec:
-            strong_binding_RVDs['G'] = 'NH'
+        strand_min, strand_max, spacer_min, spacer_max, u_bases, strong_binding_RVDs = scanOptions(options)
         
         seq_file = open(options.fasta, 'r')
         
@@ -278,20 +1021,6 @@ def RunFindTALTask(options):
         
         out.write("table_ignores:" + ','.join(table_ignores) + "\n")
     
-        strand_min = 15 if options.arraymin is None else options.arraymin
-        strand_max = 20 if options.arraymax is None else options.arraymax
-        
-        spacer_min = 15 if options.min is None else options.min
-        spacer_max = 30 if options.max is None else options.max
-        
-        u_bases = []
-        
-        if options.cupstream != 1:
-            u_bases.append("T")
-        
-        if options.cupstream != 0:
-            u_bases.append("C")
-            
         out.write("options_used:" + ', '.join([
             "array_min = " + str(strand_min),
             "array_max = " + str(strand_max),
@@ -300,234 +1029,45 @@ def RunFindTALTask(options):
             "upstream_base = " + (" or ".join(u_bases))
         ]) + "\n")
         
-        offtarget_header = "\tOff-Target Counts" if options.check_offtargets else ""
+        check_uniqueness = getattr(options, "unique_fasta", "NA") != "NA"
+        check_mismatches = getattr(options, "mismatch_fasta", "NA") != "NA"
         
-        out.write('Sequence Name\tCut Site\tTAL1 start\tTAL2 start\tTAL1 length\tTAL2 length\tSpacer length\tSpacer range\tTAL1 RVDs\tTAL2 RVDs\tPlus strand sequence\tUnique RE sites in spacer\t% RVDs HD or NN/NH' + offtarget_header + '\n')
+        offtarget_header = ["Off-Target Counts"] if options.check_offtargets else []
+        uniqueness_header = ["Exact Site Counts"] if check_uniqueness else []
+        mismatch_header = MISMATCH_COLUMNS if check_mismatches else []
         
-        binding_sites = []
+        out.write('\t'.join(OUTPUT_COLUMNS + offtarget_header + uniqueness_header + mismatch_header) + '\n')
         
-        for gene in FastaIterator(seq_file):
-            
-            sequence = str(gene.seq).upper()
-            
-            site_entry_counts = {}
-            
-            if options.filter == 1:
-                if options.filterbase > len(sequence):
-                    logger("Skipped %s as the provided cut site was greater than the sequence length" % (gene.id))
-                    continue
-                cut_site_positions = [options.filterbase]
-            else:
-                cut_site_positions = list(range(len(sequence)))
-            
-            logger("Scanning %s for binding sites" % (gene.id))
-            
-            for i in cut_site_positions:
-                
-                cut_site_potential_sites = []
-                
-                for spacer_size in range(spacer_min, spacer_max + 1):
-                    
-                    spacer_potential_sites = []
-                    
-                    spacer_size_left = int(math.floor(float(spacer_size) / 2))
-                    spacer_size_right = int(math.ceil(float(spacer_size) / 2))
-                    
-                    if i < (strand_min + spacer_size_left + 1) or i > (len(sequence) - (strand_min + spacer_size_right) - 1):
-                        continue
-                    
-                    for u_base in u_bases:
-                        
-                        if u_base == "T":
-                            d_base = "A"
-                        elif u_base == "C":
-                            d_base = "G"
-                            
-                        u_pos_search_start = i - (strand_max + spacer_size_left) - 1
-                        
-                        if u_pos_search_start < 0:
-                            u_pos_search_start = 0
-                            
-                        u_pos_search_end = i - (strand_min + spacer_size_left)
-                        
-                        d_pos_search_start = i + (strand_min + spacer_size_right)
-                        d_pos_search_end = i + (strand_max + spacer_size_right) + 1
-                        
-                        u_positions = []
+        records = [(gene.id, str(gene.seq)) for gene in FastaIterator(seq_file)]
         
-                        u_pos = 0
-                        
-                        while True:
-                            
-                            u_pos = sequence.rfind(u_base, u_pos_search_start, u_pos_search_end)
-                            
-                            if u_pos == -1:
-                                break
-                            else:
-                                u_pos_search_end = u_pos
-                                u_positions.append(u_pos)
-                        
-                        d_positions = []
-                        
-                        d_pos = 0
-                        
-                        while True:
-                            
-                            d_pos = sequence.find(d_base, d_pos_search_start, d_pos_search_end)
-                            
-                            if d_pos == -1:
-                                break
-                            else:
-                                d_pos_search_start = d_pos + 1
-                                d_positions.append(d_pos)
-                        
-                        break_out = False
-                        
-                        for u_pos in reversed(u_positions):
-                            
-                            for d_pos in reversed(d_positions):
-                                
-                                #uses inclusive start, exclusive end
-                                tal1_start = u_pos + 1
-                                tal1_end = i - spacer_size_left
-                                tal1_seq = sequence[tal1_start : tal1_end]
-                                tal2_start = i + spacer_size_right
-                                tal2_end = d_pos
-                                tal2_seq = sequence[tal2_start : tal2_end]
-                                
-                                if not ((tal1_seq in site_entry_counts and tal2_seq in site_entry_counts[tal1_seq]) or \
-                                (tal1_seq in site_entry_counts and tal1_seq in site_entry_counts[tal1_seq]) or \
-                                (tal2_seq in site_entry_counts and tal1_seq in site_entry_counts[tal2_seq]) or \
-                                (tal2_seq in site_entry_counts and tal2_seq in site_entry_counts[tal2_seq])):
-                                    
-                                    bad_site = False
-                                    
-                                    cg_count = 0
-                                    
-                                    tal1_rvd = []
-                                    
-                                    for c in tal1_seq:
-                                        
-                                        if c not in strong_binding_RVDs:
-                                            bad_site = True
-                                            break
-                                        
-                                        if c == 'C' or c == 'G':
-                                            cg_count += 1
-                                        
-                                        tal1_rvd.append(strong_binding_RVDs[c])
-                                    
-                                    if bad_site:
-                                        continue
-                                    
-                                    tal1_rvd = ' '.join(tal1_rvd)
-                                    
-                                    tal2_rvd = []
-                                    
-                                    for c in reverseComplement(tal2_seq):
-                                        
-                                        if c not in strong_binding_RVDs:
-                                            bad_site = True
-                                            break
-                                        
-                                        if c == 'C' or c == 'G':
-                                            cg_count += 1
-                                            
-                                        tal2_rvd.append(strong_binding_RVDs[c])
-                                    
-                                    if bad_site:
-                                        continue
-                                    
-                                    tal2_rvd = ' '.join(tal2_rvd)
-                                    
-                                    if options.filter == 0:
-                                        break_out = True
-                                    
-                                    binding_site = BindingSite(seq_id = gene.id,
-                                                   cutsite = i,
-                                                   seq1_start = tal1_start,
-                                                   seq1_end = tal1_end,
-                                                   seq1_seq = tal1_seq,
-                                                   seq1_rvd = tal1_rvd,
-                                                   spacer_start = tal1_end,
-                                                   spacer_end = tal2_start,
-                                                   spacer_seq = sequence[tal1_end : tal2_start],
-                                                   seq2_start = tal2_start,
-                                                   seq2_end = tal2_end,
-                                                   seq2_seq = tal2_seq,
-                                                   seq2_rvd = tal2_rvd,
-                                                   upstream = u_base,
-                                                   cg_percent = int(round(float(cg_count) / (len(tal1_seq) + len(tal2_seq)), 2) * 100))
-                                    
-                                    findRESitesInSpacer(sequence, binding_site)
-                                    
-                                    if binding_site.seq1_seq not in site_entry_counts:
-                                        site_entry_counts[binding_site.seq1_seq] = {}
-                                        
-                                    if binding_site.seq2_seq not in site_entry_counts[tal1_seq]:
-                                        site_entry_counts[binding_site.seq1_seq][binding_site.seq2_seq] = []
-                                        
-                                    site_entry_counts[binding_site.seq1_seq][binding_site.seq2_seq].append(binding_site)
-                                    spacer_potential_sites.append(binding_site)
-                                    
-                                if break_out:
-                                    break
-                                
-                            if break_out:
-                                break
-                    
-                    if len(spacer_potential_sites) > 0:
-                        if options.filter == 0:
-                            cut_site_potential_sites.append(reduce(filterByTALSize, spacer_potential_sites))
-                        else:
-                            cut_site_potential_sites.extend(spacer_potential_sites)
-                    
-                
-                if len(cut_site_potential_sites) > 0:
-                    if options.filter == 0:
-                        binding_sites.append(reduce(filterByTALSize, cut_site_potential_sites))
-                    else:
-                        binding_sites.extend(cut_site_potential_sites)
-        
-        
-        if options.streubel:
-            binding_sites[:] = list(filterfalse(filterStreubel, binding_sites))
+        binding_sites = find_tal_sites_in_records(records, options, logger, getattr(options, "processes", 1))
         
         if options.check_offtargets:
             
             if len(binding_sites) > 0:
                 
-                off_target_pairs = []
-                
-                for i, binding_site in enumerate(binding_sites):
-                    off_target_pairs.append([binding_site.seq1_rvd, binding_site.seq2_rvd])
+                off_target_pairs = binding_sites.rvdPairs()
                 
+                #the built-in counting scores the distinct RVD strings in a pool of --processes workers
+                count_options = {} if tfcount_found else {"workers": getattr(options, "processes", 1)}
                 
-                off_target_counts = PairedTargetFinderCountTask(offtarget_seq_filename, options.logFilepath, options.cupstream, 3.0, spacer_min, spacer_max, off_target_pairs)
-                
-                for i, binding_site in enumerate(binding_sites):
-                    binding_site.offtarget_counts = off_target_counts[i]
+                binding_sites.offtarget_counts = PairedTargetFinderCountTask(offtarget_seq_filename, options.logFilepath, options.cupstream, 3.0, spacer_min, spacer_max, off_target_pairs, **count_options)
         
-        for i, binding_site in enumerate(binding_sites):
+        if check_uniqueness:
+            
+            logger("Looking up TAL sites in %s" % options.unique_fasta)
             
-            output_items = [
-                str(binding_site.seq_id),
-                str(binding_site.cutsite),
-                str(binding_site.seq1_start),
-                str(binding_site.seq2_end - 1),
-                str(binding_site.seq1_end - binding_site.seq1_start),
-                str(binding_site.seq2_end - binding_site.seq2_start),
-                str(binding_site.spacer_end - binding_site.spacer_start),
-                str(binding_site.spacer_start) + '-' + str(binding_site.spacer_end - 1),
-                binding_site.seq1_rvd,
-                binding_site.seq2_rvd,
-                binding_site.upstream + ' ' + binding_site.seq1_seq + ' ' + binding_site.spacer_seq.lower() + ' ' + binding_site.seq2_seq + ' ' + ("A" if binding_site.upstream == "T" else "G"),
-                binding_site.re_sites,
-                str(binding_site.cg_percent)
-            ]
+            binding_sites.site_counts = binding_sites.countSites(loadIndex(options.unique_fasta))
+        
+        if check_mismatches:
+            
+            logger("Searching for TAL sites with up to %d mismatches in %s" % (options.mismatches, options.mismatch_fasta))
+            
+            binding_sites.mismatch_profiles = binding_sites.mismatchProfiles(loadReference(options.mismatch_fasta), options.mismatches)
+        
+        for record in binding_sites.records(options.check_offtargets, check_uniqueness, check_mismatches):
             
-            if options.check_offtargets:
-                output_items.append(' '.join(str(binding_site.offtarget_counts[x]) for x in range(5)))
+            output_items = [str(item) for item in record]
             
             out.write("\t".join(output_items) + "\n")
         
@@ -551,10 +1091,14 @@ if __name__ == '__main__':
     parser.add_option('--filterbase', dest='filterbase', type='int', default = -1, help='if filter is 1 this gives the cutpos')
     parser.add_option('--gspec', dest='gspec', action='store_true', default = False, help='If true, use NH instead of NN for G')
     parser.add_option('--streubel', dest='streubel', action='store_true', default = False, help='If true, filter out TALENs that don\'t mean Streubel et. al. design guidelines')
+    parser.add_option('--processes', dest='processes', type='int', default = 1, help='number of processes scanning sequences in parallel, also used to count off-targets')
     # Offtarget Options
     parser.add_option('--offtargets', dest='check_offtargets', action = 'store_true', default = False, help='Check offtargets')
     parser.add_option('--offtargets-fasta', dest='offtargets_fasta', type='string', default='NA', help='FASTA file containing to search for off-targets')
     parser.add_option('--offtargets-ncbi', dest='offtargets_ncbi', type='string', default='NA', help='NCBI nucleotide sequence ID to search for off-targets')
+    parser.add_option('--unique-fasta', dest='unique_fasta', type='string', default='NA', help='FASTA file to count exact occurrences of each TAL site in, indexed on first use')
+    parser.add_option('--mismatch-fasta', dest='mismatch_fasta', type='string', default='NA', help='FASTA file to search for each TAL site with up to --mismatches mismatches')
+    parser.add_option('--mismatches', dest='mismatches', type='int', default=2, help='the maximum number of mismatches of --mismatch-fasta hits')
     parser.add_option('--genome', dest='genome', action = 'store_true', default = False, help='Input is a genome file')
     parser.add_option('--promoterome', dest='promoterome', action = 'store_true', default = False, help='Input is a promoterome file')
     parser.add_option('--organism', dest='organism', type = 'string', default='NA', help='Name of organism for the genome to be searched.')
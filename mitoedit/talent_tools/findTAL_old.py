@@ -163,8 +163,7 @@ def RunFindTALOldTask(options):
     
     seq_file.close()
     
-    for gene in genes:
-        gene.seq = gene.seq.upper()
+    genes = [gene._replace(seq = gene.seq.upper()) for gene in genes]
     
     #Set up binding site counter for each gene
     binding_site_count_genes = {}
@@ -0,0 +1,287 @@
+#Suffix array and FM-index of a FASTA reference, for exact binding site lookup
+
+#The records of a reference are joined into one text over $ < A < C < G < T < N, with an N between
+#records so that no match spans two of them, and the suffix array and Burrows-Wheeler transform of
+#that text are kept in the directory FASTA + FM_INDEX_SUFFIX:
+#  sa.npy      suffix array
+#  bwt.npy     Burrows-Wheeler transform
+#  occ.npy     occurrences of each character in the BWT before every OCC_STEP-th row
+#  starts.npy  text offset of each record
+#  index.json  size and mtime of the FASTA file, record ids, OCC_STEP and the first BWT row of each character
+#Counting a site walks the FM-index backwards once per base and locating it reads the suffix array
+#rows of the match, so lookups never scan the reference. The index is built in memory with prefix
+#doubling, which suits mtDNA, promoteromes and references of up to a few hundred megabases.
+
+from .talutil import OptParser, TaskError
+from .talscore import loadReference
+
+from functools import lru_cache
+
+import json
+import os
+import shutil
+import numpy as np
+
+FM_INDEX_SUFFIX = ".fmindex"
+
+#BWT rows between occurrence checkpoints
+OCC_STEP = 128
+
+#text characters: 0 is the terminator, talscore base codes are shifted up by one
+ALPHABET_SIZE = 6
+SEPARATOR = 5
+
+text_codes = np.full(256, SEPARATOR, dtype=np.uint8)
+
+for code, nt in enumerate("ACGT"):
+    text_codes[ord(nt)] = code + 1
+    text_codes[ord(nt.lower())] = code + 1
+
+complement_text_codes = np.array([0, 4, 3, 2, 1, SEPARATOR], dtype=np.uint8)
+
+def referenceText(reference):
+    
+    #(text, record offsets) of the records of talscore.loadReference
+    
+    parts = []
+    starts = []
+    offset = 0
+    
+    for record_id, codes in reference:
+        starts.append(offset)
+        parts.append(np.asarray(codes) + 1)
+        parts.append(np.array([SEPARATOR], dtype=np.uint8))
+        offset += len(codes) + 1
+    
+    parts.append(np.zeros(1, dtype=np.uint8))
+    
+    return np.concatenate(parts), np.array(starts, dtype=np.int64)
+
+def suffixArray(text):
+    
+    #Suffix array by prefix doubling: suffixes are sorted on their first k characters as (rank of the
+    #first k/2, rank of the next k/2) until every rank is distinct. The terminator is unique, so
+    #no two suffixes tie for ever.
+    
+    n = len(text)
+    rank = text.astype(np.int64)
+    k = 1
+    
+    while True:
+        
+        second = np.full(n, -1, dtype=np.int64)
+        second[: n - k] = rank[k:]
+        
+        sa = np.lexsort((second, rank))
+        
+        changed = np.empty(n, dtype=np.int64)
+        changed[0] = 0
+        changed[1:] = (rank[sa[1:]] != rank[sa[:-1]]) | (second[sa[1:]] != second[sa[:-1]])
+        
+        rank[sa] = np.cumsum(changed)
+        
+        if rank[sa[-1]] == n - 1 or k >= n:
+            return sa
+        
+        k *= 2
+
+def buildIndex(seq_filename, index_path=None):
+    
+    #Writes the index of a FASTA file, replacing any existing one, and returns its path
+    
+    if index_path is None:
+        index_path = seq_filename + FM_INDEX_SUFFIX
+    
+    source_stat = os.stat(seq_filename)
+    
+    reference = loadReference(seq_filename)
+    
+    text, starts = referenceText(reference)
+    
+    sa = suffixArray(text)
+    
+    bwt = text[sa - 1]
+    
+    occ = np.zeros((len(bwt) // OCC_STEP + 1, ALPHABET_SIZE), dtype=np.int64)
+    
+    for c in range(ALPHABET_SIZE):
+        occ[1:, c] = np.cumsum(np.add.reduceat((bwt == c).astype(np.int64), np.arange(0, len(bwt), OCC_STEP)))[: len(occ) - 1]
+    
+    first_rows = np.concatenate([[0], np.cumsum(np.bincount(text, minlength=ALPHABET_SIZE))[:-1]])
+    
+    build_path = index_path + ".tmp"
+    
+    if os.path.isdir(build_path):
+        shutil.rmtree(build_path)
+    
+    os.makedirs(build_path)
+    
+    np.save(os.path.join(build_path, "sa.npy"), sa.astype(np.uint32 if len(text) < 2 ** 32 else np.int64))
+    np.save(os.path.join(build_path, "bwt.npy"), bwt)
+    np.save(os.path.join(build_path, "occ.npy"), occ)
+    np.save(os.path.join(build_path, "starts.npy"), starts)
+    
+    with open(os.path.join(build_path, "index.json"), "w") as index_file:
+        json.dump({"source_size": source_stat.st_size, "source_mtime": source_stat.st_mtime,
+                   "record_ids": [record_id for record_id, codes in reference], "occ_step": OCC_STEP, "first_rows": first_rows.tolist()}, index_file)
+    
+    if os.path.isdir(index_path):
+        shutil.rmtree(index_path)
+    
+    os.rename(build_path, index_path)
+    
+    return index_path
+
+class FMIndex(object):
+    
+    #read-only lookups in an index written by buildIndex, with its arrays memory-mapped
+    
+    def __init__(self, index_path):
+        
+        with open(os.path.join(index_path, "index.json"), "r") as index_file:
+            index = json.load(index_file)
+        
+        self.record_ids = index["record_ids"]
+        self.occ_step = index["occ_step"]
+        self.first_rows = index["first_rows"]
+        
+        self.sa = np.load(os.path.join(index_path, "sa.npy"), mmap_mode="r")
+        self.bwt = np.load(os.path.join(index_path, "bwt.npy"), mmap_mode="r")
+        self.occ = np.load(os.path.join(index_path, "occ.npy"), mmap_mode="r")
+        self.starts = np.load(os.path.join(index_path, "starts.npy"))
+    
+    def occurrences(self, c, row):
+        
+        #occurrences of c in the BWT before row
+        
+        checkpoint = row // self.occ_step
+        
+        return int(self.occ[checkpoint, c]) + int(np.count_nonzero(self.bwt[checkpoint * self.occ_step : row] == c))
+    
+    def rows(self, site_codes):
+        
+        #[first, last) suffix array rows of the suffixes starting with site_codes
+        
+        first = 0
+        last = len(self.bwt)
+        
+        for c in site_codes[::-1]:
+            
+            c = int(c)
+            
+            first = self.first_rows[c] + self.occurrences(c, first)
+            last = self.first_rows[c] + self.occurrences(c, last)
+            
+            if first >= last:
+                return 0, 0
+        
+        return first, last
+    
+    def strandCodes(self, site):
+        
+        #(plus strand codes, minus strand codes) of a site, or None if it has other bases than A, C, G and T
+        
+        codes = text_codes[np.frombuffer(site.encode("ascii", "replace"), dtype=np.uint8)]
+        
+        if len(codes) == 0 or (codes == SEPARATOR).any():
+            return None
+        
+        return codes, complement_text_codes[codes[::-1]]
+    
+    def count(self, site):
+        
+        #number of places the site is found on either strand, a palindrome counting once at each
+        
+        strand_codes = self.strandCodes(site)
+        
+        if strand_codes is None:
+            return 0
+        
+        plus, minus = strand_codes
+        
+        first, last = self.rows(plus)
+        count = last - first
+        
+        if not np.array_equal(plus, minus):
+            first, last = self.rows(minus)
+            count += last - first
+        
+        return count
+    
+    def locate(self, site):
+        
+        #[(record id, 0-based start, strand)] of the places the site is found, strand being "+" when
+        #the site reads on the plus strand and "-" when its reverse complement does
+        
+        strand_codes = self.strandCodes(site)
+        
+        if strand_codes is None:
+            return []
+        
+        plus, minus = strand_codes
+        
+        hits = []
+        
+        for strand, codes in [("+", plus), ("-", minus)]:
+            
+            if strand == "-" and np.array_equal(plus, minus):
+                break
+            
+            first, last = self.rows(codes)
+            
+            positions = np.sort(self.sa[first:last].astype(np.int64))
+            record_indexes = np.searchsorted(self.starts, positions, "right") - 1
+            
+            hits.extend((self.record_ids[record_index], int(position - self.starts[record_index]), strand)
+                        for record_index, position in zip(record_indexes, positions))
+        
+        return hits
+
+def openIndex(seq_filename, index_path=None):
+    
+    #FMIndex of a FASTA file, or None if it has no index or has changed since it was indexed
+    
+    if index_path is None:
+        index_path = seq_filename + FM_INDEX_SUFFIX
+    
+    index_filepath = os.path.join(index_path, "index.json")
+    
+    if not os.path.isfile(index_filepath):
+        return None
+    
+    with open(index_filepath, "r") as index_file:
+        index = json.load(index_file)
+    
+    if os.path.isfile(seq_filename):
+        
+        source_stat = os.stat(seq_filename)
+        
+        if index["source_size"] != source_stat.st_size or index["source_mtime"] != source_stat.st_mtime:
+            return None
+    
+    return FMIndex(index_path)
+
+@lru_cache(maxsize=4)
+def loadIndex(seq_filename):
+    
+    #FMIndex of a FASTA file, building the index first if it is missing or out of date
+    
+    index = openIndex(seq_filename)
+    
+    if index is None:
+        buildIndex(seq_filename)
+        index = openIndex(seq_filename)
+    
+    return index
+
+if __name__ == '__main__':
+    
+    usage = 'usage: %prog [options] FASTA [FASTA ...]'
+    parser = OptParser(usage=usage)
+    (options, args) = parser.parse_args()
+    
+    if not args:
+        raise TaskError("No FASTA files given")
+    
+    for seq_filename in args:
+        print("Indexed %s to %s" % (seq_filename, buildIndex(seq_filename)))
@@ -0,0 +1,218 @@
+#Bit-parallel search for the places a reference matches TAL sites with up to k mismatches
+
+#Each chunk of the reference is turned into one bit plane per base, 64 positions per word, with the
+#bit of position s set when the base at s is that base. For a site of length m, position s of the
+#plane of site base i shifted by i says whether s + i matches, so the mismatches of every start in the
+#chunk are summed 64 starts per word operation in bit-sliced counters (one word array per bit of the
+#count, Shift-Add style). Shifted planes are shared by all sites searched in the same pass, so many
+#sites cost one pass over the reference. Invalid bases (N, IUPAC codes) never match.
+
+from .talscore import loadReference, encodeSequence, complement_codes, INVALID_BASE
+from ..seqops import EncodedSequence
+
+import numpy as np
+
+#reference positions searched per pass, a multiple of 64
+MISMATCH_CHUNK_SIZE = 1 << 20
+
+#counting more mismatches than this finds a large part of any reference for TAL sized sites
+MAX_MISMATCHES = 5
+
+WORD_BITS = 64
+
+#sites longer than this many words of positions are not supported
+MAX_SITE_WORDS = 1
+
+def sequenceReference(records):
+    
+    #[(record id, encoded sequence)] of (record id, sequence string or EncodedSequence) records, as loadReference
+    #returns for a FASTA file; EncodedSequence records are used as they are
+    
+    return [(record_id, sequence if isinstance(sequence, EncodedSequence) else encodeSequence(sequence.upper())) for record_id, sequence in records]
+
+def basePlanes(codes, words):
+    
+    #per base code, words uint64 with bit j of word w set when codes[64 w + j] is that base
+    
+    planes = []
+    
+    for code in range(INVALID_BASE):
+        bits = np.packbits(codes == code, bitorder='little')
+        padded = np.zeros(words * 8, dtype=np.uint8)
+        padded[: len(bits)] = bits
+        planes.append(padded.view('<u8'))
+    
+    return planes
+
+class ShiftedPlanes(object):
+    
+    #base planes of one chunk shifted left by each site offset, computed once per (base, offset)
+    
+    def __init__(self, codes, words):
+        
+        self.words = words
+        self.planes = basePlanes(codes, words + MAX_SITE_WORDS + 1)
+        self.shifted = {}
+    
+    def get(self, code, shift):
+        
+        #words whose bit for start s is set when the base at s + shift is code
+        
+        if code == INVALID_BASE:
+            return np.zeros(self.words, dtype=np.uint64)
+        
+        if (code, shift) not in self.shifted:
+            
+            plane = self.planes[code]
+            q, r = divmod(shift, WORD_BITS)
+            
+            if r == 0:
+                self.shifted[(code, shift)] = plane[q : q + self.words].copy()
+            else:
+                self.shifted[(code, shift)] = (plane[q : q + self.words] >> np.uint64(r)) | (plane[q + 1 : q + 1 + self.words] << np.uint64(WORD_BITS - r))
+        
+        return self.shifted[(code, shift)]
+
+def countMismatches(shifted, site_codes, max_mismatches):
+    
+    #(within, counter) where bit s of within is set when the site starting at s has at most max_mismatches
+    #mismatches, and counter holds the bit planes of each start's mismatch count, least significant first.
+    #Words in which every start has gone over max_mismatches are dropped from the sums as they appear.
+    
+    levels = max(max_mismatches, 1).bit_length()
+    
+    active = np.arange(shifted.words)
+    counter = [np.zeros(shifted.words, dtype=np.uint64) for level in range(levels)]
+    overflow = np.zeros(shifted.words, dtype=np.uint64)
+    
+    for i, code in enumerate(site_codes):
+        
+        carry = ~shifted.get(int(code), i)[active]
+        
+        for level in range(levels):
+            counter[level], carry = counter[level] ^ carry, counter[level] & carry
+        
+        overflow |= carry
+        
+        #once few words have a start left, keep going with those only
+        if i % 4 == 3:
+            
+            alive = np.flatnonzero(~overflow)
+            
+            if len(alive) * 2 < len(active):
+                active = active[alive]
+                counter = [plane[alive] for plane in counter]
+                overflow = overflow[alive]
+    
+    #count > max_mismatches, compared from the most significant bit down
+    greater = np.zeros(len(active), dtype=np.uint64)
+    equal = ~greater
+    
+    for level in range(levels - 1, -1, -1):
+        
+        if (max_mismatches >> level) & 1:
+            equal &= counter[level]
+        else:
+            greater |= equal & counter[level]
+            equal &= ~counter[level]
+    
+    within = np.zeros(shifted.words, dtype=np.uint64)
+    within[active] = ~(overflow | greater)
+    
+    full_counter = []
+    
+    for plane in counter:
+        full_plane = np.zeros(shifted.words, dtype=np.uint64)
+        full_plane[active] = plane
+        full_counter.append(full_plane)
+    
+    return within, full_counter
+
+def setBits(words, limit):
+    
+    #positions below limit of the set bits of uint64 words
+    
+    positions = np.flatnonzero(np.unpackbits(words.view(np.uint8), bitorder='little'))
+    
+    return positions[positions < limit]
+
+def siteStrands(site):
+    
+    #[(strand, codes)] to search for a site: the site itself and, unless it is its own reverse complement,
+    #the reverse complement, which is reported as a minus strand hit at its plus strand start
+    
+    codes = encodeSequence(site.upper())
+    reverse = complement_codes[codes[::-1]]
+    
+    if np.array_equal(codes, reverse):
+        return [(0, codes)]
+    
+    return [(0, codes), (1, reverse)]
+
+def mismatchHits(reference, sites, max_mismatches):
+    
+    #Per site, (record indexes, starts, strands, mismatches) arrays of the places on either strand of the
+    #reference where the site is found with at most max_mismatches mismatches, strand 0 for plus and
+    #1 for minus. reference is as returned by talscore.loadReference or sequenceReference.
+    
+    if not 0 <= max_mismatches <= MAX_MISMATCHES:
+        raise ValueError("Between 0 and %d mismatches can be searched for" % MAX_MISMATCHES)
+    
+    searches = [siteStrands(site) for site in sites]
+    
+    longest = max([len(codes) for strands in searches for strand, codes in strands] + [1])
+    
+    if longest > MAX_SITE_WORDS * WORD_BITS:
+        raise ValueError("Sites longer than %d bases can't be searched for" % (MAX_SITE_WORDS * WORD_BITS))
+    
+    hits = [[] for site in sites]
+    
+    for record_index, (record_id, codes) in enumerate(reference):
+        
+        for chunk_start in range(0, len(codes), MISMATCH_CHUNK_SIZE):
+            
+            chunk_codes = np.asarray(codes[chunk_start : chunk_start + MISMATCH_CHUNK_SIZE + longest - 1])
+            chunk_size = min(MISMATCH_CHUNK_SIZE, len(chunk_codes))
+            
+            shifted = ShiftedPlanes(chunk_codes, -(-chunk_size // WORD_BITS))
+            
+            for site_index, strands in enumerate(searches):
+                
+                for strand, site_codes in strands:
+                    
+                    if len(site_codes) == 0:
+                        continue
+                    
+                    within, counter = countMismatches(shifted, site_codes, max_mismatches)
+                    
+                    #starts whose site lies within the record
+                    positions = setBits(within, min(chunk_size, len(chunk_codes) - len(site_codes) + 1))
+                    
+                    words = positions // WORD_BITS
+                    bits = (positions % WORD_BITS).astype(np.uint64)
+                    
+                    mismatches = sum(((counter[level][words] >> bits) & np.uint64(1)).astype(np.int64) << level for level in range(len(counter)))
+                    
+                    hits[site_index].append((np.full(len(positions), record_index, dtype=np.int64), positions + chunk_start,
+                                             np.full(len(positions), strand, dtype=np.int8), np.asarray(mismatches, dtype=np.int64)))
+    
+    empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int8), np.zeros(0, dtype=np.int64))
+    
+    return [tuple(np.concatenate(columns) for columns in zip(empty, *site_hits)) for site_hits in hits]
+
+def mismatchProfiles(reference, sites, max_mismatches):
+    
+    #per site, the number of places it is found with 0, 1, ... max_mismatches mismatches; each distinct site is searched once
+    
+    distinct = list(dict.fromkeys(sites))
+    
+    profiles = dict((site, np.bincount(site_hits[3], minlength=max_mismatches + 1).tolist())
+                    for site, site_hits in zip(distinct, mismatchHits(reference, distinct, max_mismatches)))
+    
+    return [profiles[site] for site in sites]
+
+def MismatchProfileTask(seq_filename, sites, max_mismatches):
+    
+    #mismatchProfiles of sites in a FASTA file, or its packed copy
+    
+    return mismatchProfiles(loadReference(seq_filename), sites, max_mismatches)
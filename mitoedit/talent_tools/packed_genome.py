@@ -0,0 +1,290 @@
+#2-bit packed, memory-mapped copies of FASTA references
+
+#A FASTA file at PATH is packed into the directory PATH + PACKED_FASTA_SUFFIX:
+#  bases       4 bases per byte, A=0 C=1 G=2 T=3 from the high bits down, each record starting on a byte
+#  nmask.npy   (start, end) intervals of the bases that are not A, C, G or T, per record in increasing order
+#  index.json  size and mtime of the FASTA file and, per record, its id, length, byte offset and nmask rows
+#The scoring engines map the bases file read-only, so every process reading a reference shares the
+#same page cache instead of holding its own copy of the sequence.
+
+from .talutil import OptParser, FastaChunkIterator, TaskError
+
+from functools import lru_cache
+
+import json
+import os
+import shutil
+import numpy as np
+
+PACKED_FASTA_SUFFIX = ".packed"
+
+#bytes of sequence encoded at a time while packing
+PACK_CHUNK_SIZE = 1 << 22
+
+INVALID_BASE = 4
+
+pack_codes = np.full(256, INVALID_BASE, dtype=np.uint8)
+
+for code, nt in enumerate("ACGT"):
+    pack_codes[ord(nt)] = code
+    pack_codes[ord(nt.lower())] = code
+
+def packCodes(codes):
+    
+    #4 base codes per byte; len(codes) must be a multiple of 4 and invalid bases must already be 0
+    
+    quads = codes.reshape(-1, 4)
+    
+    return (quads[:, 0] << 6) | (quads[:, 1] << 4) | (quads[:, 2] << 2) | quads[:, 3]
+
+def invalidRuns(codes, offset):
+    
+    #(start, end) intervals of the invalid bases of codes, shifted by offset
+    
+    invalid = np.zeros(len(codes) + 2, dtype=np.int8)
+    invalid[1:-1] = codes == INVALID_BASE
+    
+    edges = np.flatnonzero(np.diff(invalid))
+    
+    return edges.reshape(-1, 2) + offset
+
+class RecordPacker(object):
+    
+    #packs the sequence of one record as it is read
+    
+    def __init__(self, bases_file, record_id, byte_offset, nmask_start):
+        
+        self.bases_file = bases_file
+        self.record_id = record_id
+        self.byte_offset = byte_offset
+        self.nmask_start = nmask_start
+        self.length = 0
+        self.pending = []
+        self.pending_size = 0
+        self.carry = np.zeros(0, dtype=np.uint8)
+        self.nmask = []
+    
+    def addChunk(self, chunk):
+        
+        self.pending.append(chunk)
+        self.pending_size += len(chunk)
+        
+        if self.pending_size >= PACK_CHUNK_SIZE:
+            self.flush(False)
+    
+    def flush(self, final):
+        
+        codes = pack_codes[np.frombuffer(b"".join(self.pending), dtype=np.uint8)]
+        
+        self.pending = []
+        self.pending_size = 0
+        
+        for start, end in invalidRuns(codes, self.length):
+            
+            #runs continuing from the previous chunk are merged
+            if self.nmask and self.nmask[-1][1] == start:
+                self.nmask[-1][1] = end
+            else:
+                self.nmask.append([start, end])
+        
+        self.length += len(codes)
+        
+        codes = np.concatenate([self.carry, codes])
+        codes[codes == INVALID_BASE] = 0
+        
+        packed_size = len(codes) // 4 * 4
+        
+        if final and packed_size < len(codes):
+            codes = np.concatenate([codes, np.zeros(4 - len(codes) + packed_size, dtype=np.uint8)])
+            packed_size = len(codes)
+        
+        self.carry = codes[packed_size:]
+        
+        self.bases_file.write(packCodes(codes[:packed_size]).tobytes())
+    
+    def finish(self):
+        
+        self.flush(True)
+        
+        return {
+            "id": self.record_id,
+            "length": self.length,
+            "byte_offset": self.byte_offset,
+            "nmask_start": self.nmask_start,
+            "nmask_end": self.nmask_start + len(self.nmask),
+        }
+
+def packFasta(seq_filename, store_path=None):
+    
+    #Writes the packed copy of a FASTA file, replacing any existing one, without holding more than
+    #PACK_CHUNK_SIZE bases of it in memory. Records are named as by talutil.FastaIterator.
+    
+    if store_path is None:
+        store_path = seq_filename + PACKED_FASTA_SUFFIX
+    
+    source_stat = os.stat(seq_filename)
+    
+    build_path = store_path + ".tmp"
+    
+    if os.path.isdir(build_path):
+        shutil.rmtree(build_path)
+    
+    os.makedirs(build_path)
+    
+    records = []
+    nmask = []
+    packer = None
+    
+    with open(seq_filename, "rb") as seq_file, open(os.path.join(build_path, "bases"), "wb") as bases_file:
+        
+        for record_id, descr, offset, sequence in FastaChunkIterator(seq_file, PACK_CHUNK_SIZE):
+            
+            if offset == 0:
+                
+                if packer is not None:
+                    records.append(packer.finish())
+                    nmask.extend(packer.nmask)
+                
+                packer = RecordPacker(bases_file, record_id, bases_file.tell(), len(nmask))
+            
+            packer.addChunk(sequence.encode("latin-1"))
+        
+        if packer is not None:
+            records.append(packer.finish())
+            nmask.extend(packer.nmask)
+    
+    np.save(os.path.join(build_path, "nmask.npy"), np.array(nmask, dtype=np.int64).reshape(-1, 2))
+    
+    with open(os.path.join(build_path, "index.json"), "w") as index_file:
+        json.dump({"source_size": source_stat.st_size, "source_mtime": source_stat.st_mtime, "records": records}, index_file)
+    
+    if os.path.isdir(store_path):
+        shutil.rmtree(store_path)
+    
+    os.rename(build_path, store_path)
+    
+    return store_path
+
+@lru_cache(maxsize=None)
+def storeBases(store_path):
+    
+    #read-only map of a store's bases, opened once per process
+    
+    return np.memmap(os.path.join(store_path, "bases"), dtype=np.uint8, mode="r")
+
+class PackedSequence(object):
+    
+    #Encoded sequence of a window of a packed record, decoded from the map on demand. Slices return
+    #base codes like talscore.encodeSequence; window() gives a smaller view that pickles without
+    #any sequence data, so worker processes read the bases from their own map.
+    
+    __slots__ = ["store_path", "byte_offset", "start", "length", "nmask"]
+    
+    def __init__(self, store_path, byte_offset, start, length, nmask):
+        
+        self.store_path = store_path
+        self.byte_offset = byte_offset
+        self.start = start
+        self.length = length
+        self.nmask = nmask
+    
+    def __len__(self):
+        return self.length
+    
+    def __getitem__(self, index):
+        
+        if not isinstance(index, slice):
+            
+            if index < 0:
+                index += self.length
+            
+            if not 0 <= index < self.length:
+                raise IndexError("packed sequence index out of range")
+            
+            return int(self[index : index + 1][0])
+        
+        start, stop, step = index.indices(self.length)
+        
+        if step != 1:
+            return self[:][index]
+        
+        if stop <= start:
+            return np.zeros(0, dtype=np.uint8)
+        
+        #record coordinates
+        start += self.start
+        stop += self.start
+        
+        first_byte = start // 4
+        
+        packed = storeBases(self.store_path)[self.byte_offset + first_byte : self.byte_offset + (stop + 3) // 4]
+        
+        codes = np.empty((len(packed), 4), dtype=np.uint8)
+        
+        for i in range(4):
+            codes[:, i] = (packed >> (6 - 2 * i)) & 3
+        
+        codes = codes.reshape(-1)[start - 4 * first_byte : stop - 4 * first_byte]
+        
+        for nmask_start, nmask_end in self.nmask[np.searchsorted(self.nmask[:, 1], start, "right") : np.searchsorted(self.nmask[:, 0], stop, "left")]:
+            codes[max(nmask_start - start, 0) : max(nmask_end - start, 0)] = INVALID_BASE
+        
+        return codes
+    
+    def __array__(self, dtype=None, copy=None):
+        
+        codes = self[:]
+        
+        return codes if dtype is None else codes.astype(dtype)
+    
+    def window(self, start, stop):
+        
+        start, stop, step = slice(start, stop).indices(self.length)
+        stop = max(start, stop)
+        
+        record_start = self.start + start
+        record_stop = self.start + stop
+        
+        nmask = self.nmask[np.searchsorted(self.nmask[:, 1], record_start, "right") : np.searchsorted(self.nmask[:, 0], record_stop, "left")]
+        
+        return PackedSequence(self.store_path, self.byte_offset, record_start, stop - start, np.array(nmask))
+
+def openPackedFasta(seq_filename, store_path=None):
+    
+    #[(record id, PackedSequence)] of the packed copy of a FASTA file, or None if there is no copy
+    #or the FASTA file has changed since it was packed
+    
+    if store_path is None:
+        store_path = seq_filename + PACKED_FASTA_SUFFIX
+    
+    index_filepath = os.path.join(store_path, "index.json")
+    
+    if not os.path.isfile(index_filepath):
+        return None
+    
+    with open(index_filepath, "r") as index_file:
+        index = json.load(index_file)
+    
+    if os.path.isfile(seq_filename):
+        
+        source_stat = os.stat(seq_filename)
+        
+        if index["source_size"] != source_stat.st_size or index["source_mtime"] != source_stat.st_mtime:
+            return None
+    
+    nmask = np.load(os.path.join(store_path, "nmask.npy"), mmap_mode="r")
+    
+    return [(record["id"], PackedSequence(store_path, record["byte_offset"], 0, record["length"], nmask[record["nmask_start"] : record["nmask_end"]]))
+            for record in index["records"]]
+
+if __name__ == '__main__':
+    
+    usage = 'usage: %prog [options] FASTA [FASTA ...]'
+    parser = OptParser(usage=usage)
+    (options, args) = parser.parse_args()
+    
+    if not args:
+        raise TaskError("No FASTA files given")
+    
+    for seq_filename in args:
+        print("Packed %s to %s" % (seq_filename, packFasta(seq_filename)))
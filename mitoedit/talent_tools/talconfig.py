@@ -6,6 +6,9 @@ GENOME_DIR = BASE_DIR + "/genome_data"
 GENOME_FILE = GENOME_DIR + "/%s.fasta"
 PROMOTEROME_DIR = BASE_DIR + "/promoterome_data"
 PROMOTEROME_FILE = PROMOTEROME_DIR + "/%s.fasta"
+RE_SITES_FILE = BASE_DIR + "/re_sites.json"
+#Bump when the layout of RE_SITES_FILE changes; written by utils/re_dict_builder.py and checked by findTAL.loadRESites
+RE_SITES_FORMAT_VERSION = 1
 RVD_SEQ_REGEX = r'^(?:(?:[ACDEFGHIKLMNPQRSTVWY][ACDEFGHIKLMNPQRSTVWY\*])[ _]+){11,30}(?:[ACDEFGHIKLMNPQRSTVWY][ACDEFGHIKLMNPQRSTVWY\*])$'
 #DRUPAL_CALLBACK_URL = "http://talent.local/talent/jobcomplete/"
 DRUPAL_CALLBACK_URL = "https://tale-nt.cac.cornell.edu/talent/jobcomplete/"
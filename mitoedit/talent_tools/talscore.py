@@ -0,0 +1,531 @@
+#TAL effector binding site scoring and off-target counting with NumPy
+
+#Sites are scored TALESF style: each RVD contributes -ln(frequency with which it is found opposite
+#the base), the site score is the sum over the array and lower is better. A site is reported when
+#its score is at most cutoff times the best possible score of the RVD sequence and it is preceded
+#by an allowed upstream (0th position) base.
+
+#PairedTargetFinderCountTask and TargetFinderCountTask take the same arguments and return the same
+#shape of results as the tfcount extension, which is used instead when it is installed.
+#ScoreTalesfTask likewise stands in for the talesf extension.
+
+from .talutil import FastaIterator, create_logger, TaskError
+from .packed_genome import PackedSequence, openPackedFasta
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+
+import re
+import numpy as np
+
+#base codes, with every other character (N, IUPAC codes, ...) encoded as 4
+DNA = ['A', 'C', 'G', 'T']
+INVALID_BASE = 4
+
+#RVD -> approximate frequency with which the repeat is found opposite A, C, G and T in known
+#TAL effector / target pairs. Repeats that are not listed score as if they bound any base equally.
+RVD_BASE_FREQUENCIES = {
+    'HD': (0.04, 0.88, 0.04, 0.04),
+    'NG': (0.05, 0.10, 0.05, 0.80),
+    'HG': (0.05, 0.10, 0.05, 0.80),
+    'IG': (0.05, 0.10, 0.05, 0.80),
+    'NI': (0.85, 0.05, 0.05, 0.05),
+    'NN': (0.38, 0.04, 0.54, 0.04),
+    'NH': (0.10, 0.05, 0.80, 0.05),
+    'NK': (0.10, 0.05, 0.80, 0.05),
+    'NS': (0.35, 0.25, 0.25, 0.15),
+    'N*': (0.10, 0.45, 0.05, 0.40),
+    'ND': (0.10, 0.70, 0.10, 0.10),
+    'HN': (0.40, 0.05, 0.50, 0.05),
+    'NA': (0.30, 0.20, 0.30, 0.20),
+    'HA': (0.30, 0.40, 0.15, 0.15),
+    'HI': (0.25, 0.25, 0.25, 0.25),
+}
+
+UNKNOWN_RVD_FREQUENCIES = (0.25, 0.25, 0.25, 0.25)
+
+#reference positions scored per shard, which bounds the memory of the score tracks
+SCORE_SHARD_SIZE = 1000000
+
+#off-target pairs are counted in this many buckets of score / best score, evenly spaced between 1 and the cutoff
+OFFTARGET_BUCKETS = 5
+
+rvd_separator_re = re.compile(r'[ _]+')
+
+base_codes = np.full(256, INVALID_BASE, dtype=np.uint8)
+
+for code, nt in enumerate(DNA):
+    base_codes[ord(nt)] = code
+    base_codes[ord(nt.lower())] = code
+
+#complement of each base code, invalid bases stay invalid
+complement_codes = np.array([3, 2, 1, 0, INVALID_BASE], dtype=np.uint8)
+
+#base of each base code
+code_bases = np.frombuffer(b'ACGTN', dtype=np.uint8)
+
+def rvdList(rvd_string):
+    return rvd_separator_re.split(rvd_string.strip().upper())
+
+def encodeSequence(sequence):
+    
+    #one base code per byte of an ASCII sequence string
+    
+    return base_codes[np.frombuffer(sequence.encode('ascii', 'replace'), dtype=np.uint8)]
+
+def decodeSequence(codes):
+    return code_bases[codes].tobytes().decode('ascii')
+
+def scoreRows(rvds):
+    
+    #(array length, 5) scores of each RVD against each base code, invalid bases can never be bound
+    
+    rows = np.full((len(rvds), INVALID_BASE + 1), np.inf)
+    
+    for i, rvd in enumerate(rvds):
+        rows[i, :INVALID_BASE] = -np.log(RVD_BASE_FREQUENCIES.get(rvd, UNKNOWN_RVD_FREQUENCIES))
+    
+    return rows
+
+def bestScore(rvds):
+    return float(scoreRows(rvds)[:, :INVALID_BASE].min(axis=1).sum())
+
+def upstreamCodes(cupstream):
+    
+    #codes of the bases allowed at position 0 of a site, read on the strand the TAL binds
+    
+    codes = []
+    
+    if cupstream != 1:
+        codes.append(DNA.index('T'))
+    
+    if cupstream != 0:
+        codes.append(DNA.index('C'))
+    
+    return codes
+
+def scoreTrack(codes, rvds, cupstream):
+    
+    #Scores of the sites of an RVD sequence at every position of an encoded sequence, on both strands.
+    #Returns (plus, minus) arrays indexed by the first plus strand position the site covers; sites
+    #that contain invalid bases, lack an allowed upstream base or run off the sequence score inf.
+    
+    rows = scoreRows(rvds)
+    array_length = len(rvds)
+    site_count = len(codes) - array_length + 1
+    
+    if site_count <= 0:
+        return np.full(0, np.inf), np.full(0, np.inf)
+    
+    plus = np.zeros(site_count)
+    minus = np.zeros(site_count)
+    
+    #the minus strand site read from its 5' end covers the complement of the plus strand bases backwards
+    complement = complement_codes[codes]
+    
+    for i in range(array_length):
+        plus += rows[i][codes[i : i + site_count]]
+        minus += rows[i][complement[array_length - 1 - i : array_length - 1 - i + site_count]]
+    
+    allowed = upstreamCodes(cupstream)
+    
+    plus_upstream = np.zeros(site_count, dtype=bool)
+    plus_upstream[1:] = np.isin(codes[: site_count - 1], allowed)
+    plus[~plus_upstream] = np.inf
+    
+    minus_upstream = np.zeros(site_count, dtype=bool)
+    minus_upstream[: site_count - 1] = np.isin(complement[array_length : array_length + site_count - 1], allowed)
+    minus[~minus_upstream] = np.inf
+    
+    return plus, minus
+
+def scoreBuckets(scores, best_score, cutoff):
+    
+    #bucket of score / best score for sites within the cutoff, -1 for the others
+    
+    ratio = scores / best_score
+    
+    within = ratio <= cutoff
+    
+    buckets = np.full(len(scores), -1, dtype=np.int64)
+    buckets[within] = np.clip(np.floor((ratio[within] - 1) / ((cutoff - 1) / float(OFFTARGET_BUCKETS))), 0, OFFTARGET_BUCKETS - 1)
+    
+    return buckets
+
+@lru_cache(maxsize=4)
+def loadReference(seq_filename):
+    
+    #[(record id, encoded sequence)] of a FASTA file, kept for the off-target counts of the following tasks.
+    #The packed copy of the file is mapped instead of parsing it when there is an up to date one.
+    
+    packed = openPackedFasta(seq_filename)
+    
+    if packed is not None:
+        return packed
+    
+    with open(seq_filename, 'r') as seq_file:
+        return [(record.id, encodeSequence(str(record.seq))) for record in FastaIterator(seq_file)]
+
+def siteHits(reference, rvds, cupstream, cutoff):
+    
+    #per reference record, (plus starts, plus buckets, minus starts, minus buckets) of the sites within the cutoff
+    
+    best_score = bestScore(rvds)
+    
+    hits = []
+    
+    for plus_starts, plus_scores, minus_starts, minus_scores in recordHits(reference, rvds, cupstream, cutoff * best_score, False, 1):
+        hits.append((plus_starts, scoreBuckets(plus_scores, best_score, cutoff), minus_starts, scoreBuckets(minus_scores, best_score, cutoff)))
+    
+    return hits
+
+def countDimers(left_ends, left_buckets, right_starts, right_buckets, spacer_min, spacer_max):
+    
+    #Counts per bucket of the (left, right) site pairs with spacer_min <= right start - left end <= spacer_max.
+    #A pair falls in the worse of its two sites' buckets. right_starts must be sorted.
+    
+    bucket_range = np.arange(OFFTARGET_BUCKETS)
+    
+    #at_most[b][i] is the number of the first i right sites in bucket b or better
+    at_most = np.zeros((OFFTARGET_BUCKETS, len(right_starts) + 1), dtype=np.int64)
+    at_most[:, 1:] = np.cumsum(right_buckets[np.newaxis, :] <= bucket_range[:, np.newaxis], axis=1)
+    
+    window_start = np.searchsorted(right_starts, left_ends + spacer_min, 'left')
+    window_end = np.searchsorted(right_starts, left_ends + spacer_max, 'right')
+    
+    #pairs whose worse site is in bucket b or better
+    pairs_at_most = np.where(left_buckets[np.newaxis, :] <= bucket_range[:, np.newaxis], at_most[:, window_end] - at_most[:, window_start], 0).sum(axis=1)
+    
+    return np.diff(pairs_at_most, prepend=0)
+
+def mapRvdStrings(function, rvd_strings, workers):
+    
+    #function applied to each distinct RVD string, in a thread pool if workers > 1
+    
+    distinct = list(dict.fromkeys(rvd_strings))
+    
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return dict(zip(distinct, executor.map(function, distinct)))
+    
+    return dict((rvd_string, function(rvd_string)) for rvd_string in distinct)
+
+def PairedTargetFinderCountTask(seq_filename, log_filepath, cupstream, cutoff, spacer_min, spacer_max, rvd_pairs, workers=1):
+    
+    #For each [TAL1 RVDs, TAL2 RVDs] pair, the number of TALEN sites in the reference in each of the
+    #OFFTARGET_BUCKETS score buckets. Both heterodimer orientations and both homodimers are counted,
+    #so a site present in the reference counts itself.
+    
+    logger = create_logger(log_filepath)
+    
+    if cutoff <= 1:
+        raise TaskError("Off-target cutoff must be greater than 1")
+    
+    logger("Counting off-target sites for %d TALEN pairs" % (len(rvd_pairs)))
+    
+    reference = loadReference(seq_filename)
+    
+    hits = mapRvdStrings(lambda rvd_string: siteHits(reference, rvdList(rvd_string), cupstream, cutoff),
+                         [rvd_string for rvd_pair in rvd_pairs for rvd_string in rvd_pair], workers)
+    
+    array_lengths = dict((rvd_string, len(rvdList(rvd_string))) for rvd_string in hits)
+    
+    counts = []
+    
+    for rvd1, rvd2 in rvd_pairs:
+        
+        pair_counts = np.zeros(OFFTARGET_BUCKETS, dtype=np.int64)
+        
+        #(TAL on the plus strand, TAL on the minus strand), counted once when both TALs are the same
+        for plus_rvds, minus_rvds in set([(rvd1, rvd2), (rvd2, rvd1), (rvd1, rvd1), (rvd2, rvd2)]):
+            
+            for plus_hits, minus_hits in zip(hits[plus_rvds], hits[minus_rvds]):
+                
+                plus_starts, plus_buckets = plus_hits[0], plus_hits[1]
+                minus_starts, minus_buckets = minus_hits[2], minus_hits[3]
+                
+                pair_counts += countDimers(plus_starts + array_lengths[plus_rvds], plus_buckets, minus_starts, minus_buckets, spacer_min, spacer_max)
+        
+        counts.append(pair_counts.tolist())
+    
+    logger("Finished counting off-target sites")
+    
+    return counts
+
+def TargetFinderCountTask(seq_filename, log_filepath, cupstream, cutoff, rvd_strings, workers=1):
+    
+    #For each RVD string, the number of sites on either strand of the reference within the cutoff
+    
+    logger = create_logger(log_filepath)
+    
+    if cutoff <= 1:
+        raise TaskError("Off-target cutoff must be greater than 1")
+    
+    logger("Counting off-target sites for %d TALs" % (len(rvd_strings)))
+    
+    reference = loadReference(seq_filename)
+    
+    hits = mapRvdStrings(lambda rvd_string: siteHits(reference, rvdList(rvd_string), cupstream, cutoff), rvd_strings, workers)
+    
+    counts = [sum(len(record_hits[0]) + len(record_hits[2]) for record_hits in hits[rvd_string]) for rvd_string in rvd_strings]
+    
+    logger("Finished counting off-target sites")
+    
+    return counts
+
+def scoreShard(task):
+    
+    #(plus starts, plus scores, minus starts, minus scores) of the sites within the cutoff that start
+    #in [first, last) of a record, given the record's codes from offset on
+    
+    codes, offset, first, last, rvds, cupstream, max_score, forward_only = task
+    
+    plus, minus = scoreTrack(np.asarray(codes), rvds, cupstream)
+    
+    plus = plus[first - offset : last - offset]
+    minus = minus[first - offset : last - offset]
+    
+    plus_starts = np.flatnonzero(plus <= max_score)
+    
+    if forward_only:
+        minus_starts = np.zeros(0, dtype=np.int64)
+    else:
+        minus_starts = np.flatnonzero(minus <= max_score)
+    
+    return (plus_starts + first, plus[plus_starts], minus_starts + first, minus[minus_starts])
+
+def scoreShards(reference, rvds, cupstream, max_score, forward_only):
+    
+    #one scoreShard task per SCORE_SHARD_SIZE positions of each record, with the bases on either
+    #side of the shard needed to score its last sites and check upstream bases. Shards of packed
+    #records carry a window of the map rather than the bases.
+    
+    array_length = len(rvds)
+    
+    for record_index, (record_id, codes) in enumerate(reference):
+        
+        for first in range(0, max(len(codes) - array_length + 1, 0), SCORE_SHARD_SIZE):
+            
+            offset = max(first - 1, 0)
+            last = min(first + SCORE_SHARD_SIZE, len(codes) - array_length + 1)
+            
+            if isinstance(codes, PackedSequence):
+                shard_codes = codes.window(offset, last + array_length)
+            else:
+                shard_codes = codes[offset : last + array_length]
+            
+            yield record_index, (shard_codes, offset, first, last, rvds, cupstream, max_score, forward_only)
+
+def recordHits(reference, rvds, cupstream, max_score, forward_only, num_procs):
+    
+    #per reference record, (plus starts, plus scores, minus starts, minus scores) of the sites scoring
+    #at most max_score, with the starts in increasing order
+    
+    shards = list(scoreShards(reference, rvds, cupstream, max_score, forward_only))
+    
+    if num_procs > 1 and len(shards) > 1:
+        with ProcessPoolExecutor(max_workers=num_procs) as executor:
+            shard_hits = list(executor.map(scoreShard, [task for record_index, task in shards]))
+    else:
+        shard_hits = [scoreShard(task) for record_index, task in shards]
+    
+    record_shards = [[(np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0, dtype=np.int64), np.zeros(0))] for record in reference]
+    
+    for (record_index, task), hits in zip(shards, shard_hits):
+        record_shards[record_index].append(hits)
+    
+    return [tuple(np.concatenate(columns) for columns in zip(*hits)) for hits in record_shards]
+
+def siteText(codes, start, array_length, strand):
+    
+    #(target sequence read on the TAL's strand with its upstream base, plus strand sequence)
+    
+    site = codes[start : start + array_length]
+    
+    if strand == 0:
+        target = decodeSequence(codes[start - 1 : start]) + " " + decodeSequence(site)
+        return target, target
+    
+    upstream = codes[start + array_length : start + array_length + 1]
+    
+    return (decodeSequence(complement_codes[upstream]) + " " + decodeSequence(complement_codes[site[::-1]]),
+            decodeSequence(site) + " " + decodeSequence(upstream))
+
+def ScoreTalesfTask(seq_filename, rvd_string, output_filepath, log_filepath, forward_only, cupstream, cutoff, num_procs, organism_id):
+    
+    #Scores an RVD sequence against every position of a FASTA file and writes the sites within
+    #cutoff times the best possible score to output_filepath.txt, best first. Returns 0 on success
+    #and 1 on failure like the talesf extension.
+    
+    logger = create_logger(log_filepath)
+    
+    rvds = rvdList(rvd_string)
+    array_length = len(rvds)
+    best_score = bestScore(rvds)
+    
+    try:
+        reference = loadReference(seq_filename)
+    except (IOError, UnicodeDecodeError) as e:
+        logger("Could not read sequence file: %s" % str(e))
+        return 1
+    
+    logger("Scoring %d sequences" % len(reference))
+    
+    hits = recordHits(reference, rvds, cupstream, cutoff * best_score, forward_only, num_procs)
+    
+    record_indexes = []
+    strands = []
+    starts = []
+    scores = []
+    
+    for record_index, (plus_starts, plus_scores, minus_starts, minus_scores) in enumerate(hits):
+        
+        for strand, strand_starts, strand_scores in [(0, plus_starts, plus_scores), (1, minus_starts, minus_scores)]:
+            record_indexes.append(np.full(len(strand_starts), record_index, dtype=np.int64))
+            strands.append(np.full(len(strand_starts), strand, dtype=np.int8))
+            starts.append(strand_starts)
+            scores.append(strand_scores)
+    
+    record_indexes = np.concatenate(record_indexes or [np.zeros(0, dtype=np.int64)])
+    strands = np.concatenate(strands or [np.zeros(0, dtype=np.int8)])
+    starts = np.concatenate(starts or [np.zeros(0, dtype=np.int64)])
+    scores = np.concatenate(scores or [np.zeros(0)])
+    
+    #best score first, ties in sequence order
+    order = np.lexsort((strands, starts, record_indexes, scores))
+    
+    logger("Writing %d results" % len(order))
+    
+    with open(output_filepath + ".txt", "w") as out_file:
+        
+        if forward_only:
+            out_file.write("table_ignores:Plus strand sequence\n")
+        
+        out_file.write("options_used:rvd_sequence = %s, upstream_base = %s, cutoff = %s, search_reverse_complement = %s, organism = %s\n" %
+                       (" ".join(rvds), ["T", "C", "T or C"][cupstream], str(cutoff), str(not forward_only), organism_id if organism_id else "NA"))
+        out_file.write("Best Possible Score:%.2f\n" % best_score)
+        out_file.write("Sequence Name\tStrand\tScore\tStart Position\tTarget Sequence\tPlus strand sequence\n")
+        
+        for i in order:
+            
+            record_id, codes = reference[record_indexes[i]]
+            
+            target, plus_strand = siteText(codes, int(starts[i]), array_length, strands[i])
+            
+            out_file.write("%s\t%s\t%.2f\t%d\t%s\t%s\n" % (record_id, "Plus" if strands[i] == 0 else "Minus", scores[i], starts[i] + 1, target, plus_strand))
+    
+    logger("Finished")
+    
+    return 0
+
+def joinPairs(left_ends, right_starts, spacer_min, spacer_max):
+    
+    #(left indexes, right indexes) of the pairs with spacer_min <= right start - left end <= spacer_max.
+    #Both arrays must be sorted; each left site's window of right sites is found by binary search
+    #and the windows are expanded without visiting any other pair.
+    
+    window_start = np.searchsorted(right_starts, left_ends + spacer_min, 'left')
+    window_end = np.searchsorted(right_starts, left_ends + spacer_max, 'right')
+    
+    window_sizes = window_end - window_start
+    
+    left_indexes = np.repeat(np.arange(len(left_ends)), window_sizes)
+    
+    #position of each pair within its left site's window
+    window_offsets = np.arange(len(left_indexes)) - np.repeat(np.cumsum(window_sizes) - window_sizes, window_sizes)
+    
+    return left_indexes, window_start[left_indexes] + window_offsets
+
+def ScorePairedTalesfTask(seq_filename, rvd_string, rvd_string2, output_filepath, log_filepath, cupstream, dimer, cutoff, spacer_min, spacer_max, num_procs, organism_id):
+    
+    #Finds the TALEN sites of a pair of RVD sequences: a TAL bound to the plus strand followed, after
+    #a spacer of spacer_min to spacer_max bases, by a TAL bound to the minus strand, each within cutoff
+    #times its best possible score. dimer is 0 for all pairs, 1 for heterodimers only and 2 for
+    #homodimers only. Writes output_filepath.txt, best pairs first, and returns 0 like paired_talesf.
+    
+    logger = create_logger(log_filepath)
+    
+    rvd_strings = [" ".join(rvdList(rvd_string)), " ".join(rvdList(rvd_string2))]
+    
+    try:
+        reference = loadReference(seq_filename)
+    except (IOError, UnicodeDecodeError) as e:
+        logger("Could not read sequence file: %s" % str(e))
+        return 1
+    
+    #(plus strand TAL, minus strand TAL) as indexes into rvd_strings
+    combinations = []
+    
+    if dimer != 2:
+        combinations.extend([(0, 1), (1, 0)])
+    
+    if dimer != 1:
+        combinations.extend([(0, 0), (1, 1)])
+    
+    if rvd_strings[0] == rvd_strings[1]:
+        combinations = [(0, 0)]
+    
+    logger("Scoring %d sequences" % len(reference))
+    
+    best_scores = [bestScore(rvdList(rvds)) for rvds in rvd_strings]
+    
+    #one score track per distinct RVD string
+    hits = {}
+    
+    for tal in set(tal for combination in combinations for tal in combination):
+        hits[tal] = recordHits(reference, rvdList(rvd_strings[tal]), cupstream, cutoff * best_scores[tal], False, num_procs)
+    
+    columns = dict((name, []) for name in ["record", "tal1", "tal2", "start1", "start2", "score1", "score2"])
+    
+    for record_index in range(len(reference)):
+        
+        for tal1, tal2 in combinations:
+            
+            plus_starts, plus_scores = hits[tal1][record_index][0:2]
+            minus_starts, minus_scores = hits[tal2][record_index][2:4]
+            
+            left_indexes, right_indexes = joinPairs(plus_starts + len(rvdList(rvd_strings[tal1])), minus_starts, spacer_min, spacer_max)
+            
+            columns["record"].append(np.full(len(left_indexes), record_index, dtype=np.int64))
+            columns["tal1"].append(np.full(len(left_indexes), tal1, dtype=np.int8))
+            columns["tal2"].append(np.full(len(left_indexes), tal2, dtype=np.int8))
+            columns["start1"].append(plus_starts[left_indexes])
+            columns["start2"].append(minus_starts[right_indexes])
+            columns["score1"].append(plus_scores[left_indexes])
+            columns["score2"].append(minus_scores[right_indexes])
+    
+    pairs = dict((name, np.concatenate(arrays) if arrays else np.zeros(0)) for name, arrays in columns.items())
+    
+    #best combined score first, ties in sequence order
+    order = np.lexsort((pairs["tal2"], pairs["tal1"], pairs["start2"], pairs["start1"], pairs["record"], pairs["score1"] + pairs["score2"]))
+    
+    logger("Writing %d results" % len(order))
+    
+    with open(output_filepath + ".txt", "w") as out_file:
+        
+        out_file.write("options_used:rvd_sequence = %s, rvd_sequence2 = %s, upstream_base = %s, cutoff = %s, spacer_min = %d, spacer_max = %d, dimer = %s, organism = %s\n" %
+                       (rvd_strings[0], rvd_strings[1], ["T", "C", "T or C"][cupstream], str(cutoff), spacer_min, spacer_max,
+                        ["all", "heterodimers only", "homodimers only"][dimer], organism_id if organism_id else "NA"))
+        out_file.write("Best Possible Score RVD Sequence 1:%.2f\n" % best_scores[0])
+        out_file.write("Best Possible Score RVD Sequence 2:%.2f\n" % best_scores[1])
+        out_file.write("Sequence Name\tPlus Strand TAL\tMinus Strand TAL\tPlus TAL Score\tMinus TAL Score\tPlus TAL Start\tMinus TAL Start\tSpacer Length\tPlus TAL Target\tMinus TAL Target\n")
+        
+        for i in order:
+            
+            record_id, codes = reference[pairs["record"][i]]
+            
+            tal1 = int(pairs["tal1"][i])
+            tal2 = int(pairs["tal2"][i])
+            start1 = int(pairs["start1"][i])
+            start2 = int(pairs["start2"][i])
+            end1 = start1 + len(rvdList(rvd_strings[tal1]))
+            
+            target1 = siteText(codes, start1, end1 - start1, 0)[0]
+            target2 = siteText(codes, start2, len(rvdList(rvd_strings[tal2])), 1)[0]
+            
+            out_file.write("%s\tRVD Sequence %d\tRVD Sequence %d\t%.2f\t%.2f\t%d\t%d\t%d\t%s\t%s\n" %
+                           (record_id, tal1 + 1, tal2 + 1, pairs["score1"][i], pairs["score2"][i], start1 + 1, start2 + 1, start2 - end1, target1, target2))
+    
+    logger("Finished")
+    
+    return 0
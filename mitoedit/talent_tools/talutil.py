@@ -1,6 +1,6 @@
-from Bio.SeqRecord import SeqRecord
-from Bio.Seq import Seq
+from collections import namedtuple
 
+import mmap
 import string
 import urllib.request, urllib.parse, urllib.error
 import sys
@@ -15,6 +15,7 @@ except ImportError:
     celery_found = False
 
 from .talconfig import DRUPAL_CALLBACK_URL
+from ..seqops import reverse_complement_acgt
 
 class TaskError(ValueError):
     pass
@@ -78,34 +79,148 @@ def fasta_title_handler(line):
     
 fasta_title_handler.noname = 0
 
-#Edited version of Bio.SeqIO.FastaIO.FastaIterator
+#Lightweight FASTA record; seq is the record's sequence as a string, with all whitespace removed
+FastaRecord = namedtuple('FastaRecord', ['id', 'description', 'seq'])
+
+#bytes read from a file at a time
+FASTA_READ_SIZE = 1 << 22
+
+#removed from sequence data by a single bytes.translate per piece
+fasta_whitespace = b" \t\r\n\v\f"
+
+def fastaBlocks(source):
+    
+    #Blocks of bytes of a FASTA source: bytes, an mmap, or a text or binary file handle read from
+    #its current position
+    
+    if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+        
+        for offset in range(0, len(source), FASTA_READ_SIZE):
+            yield bytes(source[offset : offset + FASTA_READ_SIZE])
+        
+        return
+    
+    while True:
+        
+        block = source.read(FASTA_READ_SIZE)
+        
+        if not block:
+            return
+        
+        if isinstance(block, str):
+            block = block.encode("utf-8", "replace")
+        
+        yield block
+
+def fastaTitle(header, title2ids):
+    
+    #(id, description) of the bytes of a header line after its ">"
+    
+    line = header.decode("utf-8", "replace").rstrip()
+    
+    if title2ids:
+        id, name, descr = title2ids(line)
+    else:
+        descr = line
+        id = descr.split()[0]
+    
+    return (id, descr)
+
+def FastaChunkIterator(handle, chunk_size = FASTA_READ_SIZE, title2ids = fasta_title_handler):
+    
+    #Streams the records of a FASTA source as (id, description, offset, sequence) pieces of at least
+    #chunk_size bases, the last piece of each record excepted, so that chromosome-sized records are
+    #never held in memory whole. A record starts with the piece at offset 0 and every record gives at
+    #least one piece. With chunk_size None each record is given as a single piece. Headers and record
+    #boundaries are found with bytes.find rather than line by line; any text before the first record
+    #(e.g. blank lines, comments) is skipped.
+    
+    record = None
+    offset = 0
+    pieces = []
+    pieces_size = 0
+    
+    header = b""
+    in_header = False
+    line_start = True
+    
+    for data in fastaBlocks(handle):
+        
+        position = 0
+        
+        while position < len(data):
+            
+            if in_header:
+                
+                end = data.find(b"\n", position)
+                
+                if end == -1:
+                    header += data[position:]
+                    break
+                
+                #A new record starts, so the previous one is done
+                if record is not None:
+                    yield record + (offset, b"".join(pieces).decode("latin-1"))
+                
+                record = fastaTitle(header + data[position:end], title2ids)
+                offset = 0
+                pieces = []
+                pieces_size = 0
+                
+                header = b""
+                in_header = False
+                line_start = True
+                position = end + 1
+                
+                continue
+            
+            if line_start and data[position : position + 1] == b">":
+                in_header = True
+                position += 1
+                continue
+            
+            end = data.find(b"\n>", position)
+            
+            if end == -1:
+                end = len(data)
+                line_start = data.endswith(b"\n")
+            else:
+                end += 1
+                line_start = True
+            
+            if record is not None:
+                
+                piece = data[position:end].translate(None, fasta_whitespace)
+                
+                pieces.append(piece)
+                pieces_size += len(piece)
+                
+                if chunk_size is not None and pieces_size >= chunk_size:
+                    yield record + (offset, b"".join(pieces).decode("latin-1"))
+                    offset += pieces_size
+                    pieces = []
+                    pieces_size = 0
+            
+            position = end
+    
+    #A header on the last line without a newline still makes a record
+    if in_header:
+        
+        if record is not None:
+            yield record + (offset, b"".join(pieces).decode("latin-1"))
+        
+        record = fastaTitle(header, title2ids)
+        offset = 0
+        pieces = []
+    
+    if record is not None:
+        yield record + (offset, b"".join(pieces).decode("latin-1"))
+
+#Replaces an edited version of Bio.SeqIO.FastaIO.FastaIterator; yields FastaRecord tuples
 def FastaIterator(handle, alphabet = None, title2ids = fasta_title_handler):
-    #Skip any text before the first record (e.g. blank lines, comments)
-    line = handle.readline()
-    while line and line[0] != ">":
-        line = handle.readline()
-
-    while line: 
-        if line[0]!=">":
-            raise TaskError("Records in Fasta files should start with '>' character")
-        if title2ids:
-            id, name, descr = title2ids(line[1:].rstrip())
-        else:
-            descr = line[1:].rstrip()
-            id   = descr.split()[0]
-            name = id
-        
-        lines = []
-        line = handle.readline()
-        while line and line[0] != ">":
-        #Remove trailing whitespace, and any internal spaces
-        #(and any embedded \r which are possible in mangled files
-        #when not opened in universal read lines mode)
-            lines.append(line.rstrip().replace(" ","").replace("\r",""))
-            line = handle.readline()
-        
-        #Return the record and then continue...
-        yield SeqRecord(Seq(''.join(lines)), id = id, name = name, description = descr)
+    
+    for id, descr, offset, sequence in FastaChunkIterator(handle, None, title2ids):
+        yield FastaRecord(id, descr, sequence)
 
 def create_logger(logFilepath):
     
@@ -126,7 +241,7 @@ def check_fasta_pasta(seq_file):
     #the pointer position can be set back so the FASTA iterator finds it too
     seq_file_last = seq_file.tell()
     seq_line = seq_file.readline()
-    while seq_line and seq_line[0] != ">":
+    while seq_line and seq_line[:1] not in (">", b">"):
         seq_file_last = seq_file.tell()
         seq_line = seq_file.readline()
     
@@ -153,22 +268,9 @@ class OptParser(OptionParser):
 
 def reverseComplement(sequence):
     
-    new_sequence = ""
-    
-    for i in range(len(sequence)):
-        base = sequence[len(sequence) - i - 1]
-        if base == 'A':
-            new_sequence += 'T'
-        elif base == 'C':
-            new_sequence += 'G'
-        elif base == 'G':
-            new_sequence += 'C'
-        elif base == 'T':
-            new_sequence += 'A'
-        else:
-            new_sequence += 'N'
-
-    return new_sequence
+    #bases other than A, C, G and T become N
+    
+    return reverse_complement_acgt(sequence)
 
 #https://pypi.python.org/pypi/conditional
 class Conditional(object):
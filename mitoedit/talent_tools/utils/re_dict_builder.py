@@ -1,7 +1,13 @@
 #!/usr/bin/python
 
-import re
-import pickle
+import json
+import os
+import sys
+
+#the output path and format version are shared with findTAL.loadRESites through talconfig.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from talconfig import RE_SITES_FILE, RE_SITES_FORMAT_VERSION
 
 #List of NEB enzyme sequences and regex
 NEB_RE_sites = {
@@ -246,15 +252,11 @@ NEB_RE_sites = {
     "ZraI": "GACGTC"
 }
 
-re_dict = {}
-
-for site in NEB_RE_sites:
-    
-    re_dict[site] = {}
+def shortString(pattern):
     
-    re_dict[site]["compiled"] = re.compile(NEB_RE_sites[site])
+    #IUPAC form of an enzyme regex, e.g. GT[AC][GT]AC -> GTMKAC
     
-    short_string = NEB_RE_sites[site]
+    short_string = pattern
 
     short_string = short_string.replace('[CGT]', 'B')
     short_string = short_string.replace('[AGT]', 'D')
@@ -268,7 +270,20 @@ for site in NEB_RE_sites:
     short_string = short_string.replace('[AT]', 'W')
     short_string = short_string.replace('[CT]', 'Y')
     
-    re_dict[site]["short"] = short_string
+    return short_string
+
+def buildRESites(output_path=RE_SITES_FILE):
+    
+    #Write the enzyme table as [name, regex, IUPAC string] rows; the row order is the order enzymes are reported in
+    
+    re_sites = {
+        "format_version": RE_SITES_FORMAT_VERSION,
+        "enzymes": [[site, NEB_RE_sites[site], shortString(NEB_RE_sites[site])] for site in NEB_RE_sites]
+    }
+    
+    with open(output_path, "w") as re_sites_file:
+        json.dump(re_sites, re_sites_file, separators=(',', ':'))
+        re_sites_file.write("\n")
 
-with open("re_dict_dump", "wb") as re_dump_file:
-    pickle.dump(re_dict, re_dump_file)
\ No newline at end of file
+if __name__ == '__main__':
+    buildRESites()
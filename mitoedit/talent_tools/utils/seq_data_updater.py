@@ -12,6 +12,7 @@ from Bio import SeqIO
 
 sys.path.append('/opt/boglab')
 
+from talent.packed_genome import packFasta
 from talent.talconfig import BASE_DIR, GENOME_DIR, GENOME_FILE, PROMOTEROME_DIR, PROMOTEROME_FILE
 
 version_dump_filepath = BASE_DIR + "/talent/utils/sequence_versions_dump"
@@ -154,3 +155,15 @@ with open("/tmp/RAP-MSU.txt", "r") as input_file:
 keep_me = [seq for seq in SeqIO.parse(PROMOTEROME_FILE % "oryza_sativa", "fasta") if seq.id.split('-')[0].replace('t', 'g') in rapdb_exclusive_ids]
 
 SeqIO.write(keep_me, PROMOTEROME_FILE % "oryza_sativa_rapdb_only", "fasta")
+
+#Pack sequences for the NumPy scoring engines
+
+print("Packing sequences")
+
+for sequence_name in genome_urls:
+    if os.path.isfile(GENOME_FILE % sequence_name):
+        packFasta(GENOME_FILE % sequence_name)
+
+for sequence_name in list(promoterome_urls) + ["oryza_sativa_rapdb_only"]:
+    if os.path.isfile(PROMOTEROME_FILE % sequence_name):
+        packFasta(PROMOTEROME_FILE % sequence_name)
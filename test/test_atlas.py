@@ -0,0 +1,76 @@
+import random
+import re
+
+import pandas as pd
+import pytest
+
+from mitoedit import build_atlas, process_mitoedit
+from mitoedit.core import EDIT_PIPELINES
+
+MUTANT_BASES = {'A': 'G', 'G': 'A', 'C': 'T', 'T': 'C'}
+
+# Near the origin, in the middle and near the end of the sequence
+POSITIONS = list(range(1, 31)) + list(range(220, 250)) + list(range(471, 501))
+
+
+@pytest.fixture(scope="module")
+def sequence():
+    rng = random.Random(8)
+    return ''.join(rng.choice('ACGT') for _ in range(500))
+
+
+@pytest.fixture(scope="module")
+def atlas(sequence, tmp_path_factory):
+    return build_atlas(sequence, str(tmp_path_factory.mktemp("atlas")))
+
+
+def pipeline_windows(sequence, position):
+    # (pipeline name, (windows, adjacent bases)) of the routed pipeline, None for positions it cannot edit
+    reference_base = sequence[position - 1]
+    pipeline_name, pipeline_class = EDIT_PIPELINES[(reference_base, MUTANT_BASES[reference_base])]
+    try:
+        all_windows, adjacent_bases = pipeline_class().process_mtDNA(sequence, position)
+    except ValueError:
+        return pipeline_name, None
+    if not all_windows or not adjacent_bases:
+        return pipeline_name, None
+    return pipeline_name, ([tuple(window) for window in all_windows], adjacent_bases)
+
+
+def test_lookup_matches_pipelines(sequence, atlas):
+    stored = 0
+    for position in POSITIONS:
+        pipeline_name, expected = pipeline_windows(sequence, position)
+        assert atlas.lookup(pipeline_name, position) == expected, position
+        stored += expected is not None
+    assert stored >= 20
+    assert atlas.lookup("Mok2020_Unified", 0) is None
+    assert atlas.lookup("Mok2020_Unified", len(sequence) + 1) is None
+
+
+@pytest.mark.parametrize("pipeline_name", ["Cho_sTALEDs", "Mok2020_Unified"])
+def test_process_mitoedit_with_atlas(sequence, atlas, pipeline_name):
+    targets = [position for position in POSITIONS
+               if EDIT_PIPELINES[(sequence[position - 1], MUTANT_BASES[sequence[position - 1]])][0] == pipeline_name]
+    for position in targets[:3] + targets[len(targets) // 2:][:3] + targets[-3:]:
+        mutant_base = MUTANT_BASES[sequence[position - 1]]
+        try:
+            expected = process_mitoedit(sequence, position, mutant_base)
+        except ValueError as exc:
+            with pytest.raises(ValueError, match=re.escape(str(exc))):
+                process_mitoedit(sequence, position, mutant_base, atlas=atlas)
+            continue
+        result = process_mitoedit(sequence, position, mutant_base, atlas=atlas)
+        pd.testing.assert_frame_equal(result['windows_df'], expected['windows_df'])
+        pd.testing.assert_frame_equal(result['bystanders_df'], expected['bystanders_df'])
+        assert result['adjacent_bases'] == expected['adjacent_bases']
+        assert result['fasta_content'] == expected['fasta_content']
+
+
+def test_matches_only_the_built_sequence(sequence, atlas):
+    assert atlas.matches(sequence)
+    assert atlas.matches(sequence.lower()[:100] + "\n" + sequence[100:])
+    changed = sequence[:250] + MUTANT_BASES[sequence[250]] + sequence[251:]
+    assert not atlas.matches(changed)
+    assert not atlas.matches(sequence[1:] + sequence[0])
+    assert not atlas.matches(sequence[:-1])
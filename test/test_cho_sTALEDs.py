@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+from mitoedit.pipelines import ChosTALEDsPipeline, ContextIndex
+
+SEQUENCE_LENGTH = 1000
+ROTATION = 500
+
+
+@pytest.fixture(scope="module")
+def sequence():
+    rng = random.Random(1)
+    return ''.join(rng.choice('ACGT') for _ in range(SEQUENCE_LENGTH))
+
+
+def editable_positions(context_index, positions):
+    contexts = ChosTALEDsPipeline.T_CONTEXTS + ChosTALEDsPipeline.A_CONTEXTS
+    return [pos for pos in positions if context_index.contains_any(contexts, pos)]
+
+
+def near_origin(length):
+    return list(range(1, 32)) + list(range(length - 30, length + 1))
+
+
+def test_windows_near_origin(sequence):
+    pipeline = ChosTALEDsPipeline()
+    context_index = ContextIndex(sequence)
+    positions = editable_positions(context_index, near_origin(len(sequence)))
+    assert positions
+
+    for pos in positions:
+        all_windows, adjacent_bases = pipeline.process_mtDNA(sequence, pos, context_index=context_index)
+        assert len(all_windows) == 70
+        assert len(adjacent_bases) == 61
+        assert adjacent_bases[30] == sequence[pos - 1]
+        for window in all_windows:
+            assert all(1 <= bystander <= len(sequence) for bystander in window[9])
+
+
+def test_windows_match_rotated_sequence(sequence):
+    # The windows of a target near the origin are those of the same target moved to the middle
+    rotated = sequence[ROTATION:] + sequence[:ROTATION]
+    pipeline = ChosTALEDsPipeline()
+    context_index = ContextIndex(sequence)
+    rotated_index = ContextIndex(rotated)
+
+    def rotate(pos):
+        return (pos - ROTATION - 1) % len(sequence) + 1
+
+    positions = [pos for pos in editable_positions(context_index, near_origin(len(sequence)))
+                 if editable_positions(rotated_index, [rotate(pos)])]
+    assert positions
+
+    for pos in positions:
+        all_windows, adjacent_bases = pipeline.process_mtDNA(sequence, pos, context_index=context_index)
+        rotated_windows, rotated_adjacent = pipeline.process_mtDNA(rotated, rotate(pos), context_index=rotated_index)
+        assert adjacent_bases == rotated_adjacent
+        for window, rotated_window in zip(all_windows, rotated_windows):
+            assert window[:2] + window[3:9] + window[10:] == rotated_window[:2] + rotated_window[3:9] + rotated_window[10:]
+            assert sorted(rotate(bystander) for bystander in window[9]) == rotated_window[9]
@@ -0,0 +1,76 @@
+import random
+
+import pandas as pd
+import pytest
+
+from mitoedit import process_mitoedit, process_mitoedit_batch
+from mitoedit.core import EDIT_PIPELINES
+from mitoedit.pipelines import ContextIndex
+
+MUTANT_BASES = {'A': 'G', 'G': 'A', 'C': 'T', 'T': 'C'}
+
+
+@pytest.fixture(scope="module")
+def sequence():
+    rng = random.Random(4)
+    return ''.join(rng.choice('ACGT') for _ in range(800))
+
+
+def routed(sequence, positions, pipeline_name, editable_only):
+    # Positions whose reference base is routed to the named pipeline, optionally only those it returns windows for
+    found = []
+    for position in positions:
+        reference_base = sequence[position - 1]
+        name, pipeline_class = EDIT_PIPELINES[(reference_base, MUTANT_BASES[reference_base])]
+        if name != pipeline_name:
+            continue
+        if editable_only:
+            try:
+                all_windows, adjacent_bases = pipeline_class().process_mtDNA(sequence, position)
+            except ValueError:
+                continue
+            if not all_windows:
+                continue
+        found.append(position)
+    return found[:2]
+
+
+@pytest.fixture(scope="module")
+def targets(sequence):
+    # Cho and Mok targets near the origin, in the middle and near the end of the sequence
+    positions = []
+    for window in (range(1, 31), range(390, 420), range(771, 801)):
+        positions += routed(sequence, window, "Cho_sTALEDs", editable_only=False)
+        positions += routed(sequence, window, "Mok2020_Unified", editable_only=False)
+        positions += routed(sequence, window, "Mok2020_Unified", editable_only=True)
+    return [(position, MUTANT_BASES[sequence[position - 1]]) for position in sorted(set(positions))]
+
+
+def test_batch_matches_process_mitoedit(sequence, targets):
+    invalid = [(0, 'A'), (len(sequence) + 5, 'A'), (100, 'X')]
+    batch = process_mitoedit_batch(sequence, targets + invalid)
+
+    for position, mutant_base in targets:
+        try:
+            single = process_mitoedit(sequence, position, mutant_base)
+        except ValueError as exc:
+            assert batch['errors'][(position, mutant_base)] == str(exc)
+            continue
+        result = batch['results'][(position, mutant_base)]
+        pd.testing.assert_frame_equal(result['windows_df'], single['windows_df'])
+        pd.testing.assert_frame_equal(result['bystanders_df'], single['bystanders_df'])
+        assert result['adjacent_bases'] == single['adjacent_bases']
+        assert result['fasta_content'] == single['fasta_content']
+
+    assert len(batch['results']) >= 6
+    for key in invalid:
+        assert key in batch['errors']
+        assert key not in batch['results']
+
+
+def test_batch_rejects_index_of_another_sequence(sequence, targets):
+    other_index = ContextIndex(sequence[::-1])
+    with pytest.raises(ValueError):
+        process_mitoedit(sequence, *targets[4], context_index=other_index)
+    with pytest.raises(ValueError):
+        process_mitoedit_batch(sequence, targets, context_index=other_index)
@@ -0,0 +1,176 @@
+import math
+import random
+from functools import lru_cache
+
+import pytest
+
+from mitoedit.talent_tools import findTAL
+from mitoedit.talent_tools.findTAL import (BindingSite, RunFindTALTask, bindingSiteRecord, filterStreubel,
+                                           find_tal_sites_in_records, loadRESites)
+from mitoedit.talent_tools.talutil import OptionObject, reverseComplement
+
+STRONG_BINDING_RVDS = {'A': 'NI', 'C': 'HD', 'G': 'NN', 'T': 'NG'}
+
+
+def random_records():
+    rng = random.Random(21)
+    records = []
+    for index, length in enumerate([500, 200]):
+        sequence = [rng.choice("ACGT") for _ in range(length)]
+        # bases without a strong binding RVD are never part of a TAL
+        for _ in range(length // 60):
+            sequence[rng.randrange(length)] = rng.choice("NRY")
+        sequence = "".join(sequence)
+        records.append(("record%d" % index, sequence.lower() if index else sequence))
+    return records
+
+
+@lru_cache(maxsize=None)
+def naive_re_sites(sequence, spacer_start, spacer_end):
+    # Enzymes found once in the spacer and once within 250 bases of it, as the enzyme regexes count them
+    check_start = max(spacer_start - 250, 0)
+    check_end = spacer_end + 250 + 1 if len(sequence) - spacer_end >= 250 else len(sequence)
+    enzymes = ["%s:%s" % (enzyme, site["short"]) for enzyme, site in loadRESites().items()
+               if len(site["compiled"].findall(sequence[spacer_start:spacer_end])) == 1
+               and len(site["compiled"].findall(sequence[check_start:check_end])) == 1]
+    return " ".join(enzymes) or "none"
+
+
+def larger_tals(x, y):
+    # y replaces x if its TALs are longer on average, or as long with a shorter spacer
+    x_tal_length = len(x.seq1_seq) + len(x.seq2_seq)
+    y_tal_length = len(y.seq1_seq) + len(y.seq2_seq)
+    if x_tal_length == y_tal_length:
+        return y if len(y.spacer_seq) < len(x.spacer_seq) else x
+    return y if y_tal_length > x_tal_length else x
+
+
+def best_site(sites):
+    best = sites[0]
+    for site in sites[1:]:
+        best = larger_tals(best, site)
+    return best
+
+
+def naive_binding_sites(records, options):
+    # One BindingSite per reported site, one cut site, spacer size and upstream base at a time
+    u_bases = [base for base, used in (("T", options.cupstream != 1), ("C", options.cupstream != 0)) if used]
+    binding_sites = []
+    for seq_id, sequence in records:
+        sequence = sequence.upper()
+        if options.filter == 1:
+            if options.filterbase > len(sequence):
+                continue
+            cut_sites = [options.filterbase]
+        else:
+            cut_sites = range(len(sequence))
+        registered_pairs = set()
+        for i in cut_sites:
+            cut_site_sites = []
+            for spacer_size in range(options.min, options.max + 1):
+                spacer_sites = []
+                left, right = spacer_size // 2, int(math.ceil(spacer_size / 2.0))
+                if i < options.arraymin + left + 1 or i > len(sequence) - (options.arraymin + right) - 1:
+                    continue
+                tal1_end, tal2_start = i - left, i + right
+                for u_base in u_bases:
+                    d_base = "A" if u_base == "T" else "G"
+                    u_positions = [u_pos for u_pos in range(max(tal1_end - options.arraymax - 1, 0),
+                                                            tal1_end - options.arraymin)
+                                   if sequence[u_pos] == u_base]
+                    d_positions = [d_pos for d_pos in range(tal2_start + options.arraymin,
+                                                            min(tal2_start + options.arraymax + 1, len(sequence)))
+                                   if sequence[d_pos] == d_base]
+                    found = False
+                    for u_pos in u_positions:
+                        for d_pos in reversed(d_positions):
+                            tal1_seq = sequence[u_pos + 1:tal1_end]
+                            tal2_seq = sequence[tal2_start:d_pos]
+                            if {(tal1_seq, tal2_seq), (tal1_seq, tal1_seq), (tal2_seq, tal1_seq),
+                                    (tal2_seq, tal2_seq)} & registered_pairs:
+                                continue
+                            if set(tal1_seq + tal2_seq) - set("ACGT"):
+                                continue
+                            registered_pairs.add((tal1_seq, tal2_seq))
+                            cg_count = sum(base in "CG" for base in tal1_seq + tal2_seq)
+                            spacer_sites.append(BindingSite(
+                                seq_id=seq_id, cutsite=i, seq1_start=u_pos + 1, seq1_end=tal1_end, seq1_seq=tal1_seq,
+                                seq1_rvd=" ".join(STRONG_BINDING_RVDS[base] for base in tal1_seq),
+                                spacer_start=tal1_end, spacer_end=tal2_start, spacer_seq=sequence[tal1_end:tal2_start],
+                                seq2_start=tal2_start, seq2_end=d_pos, seq2_seq=tal2_seq,
+                                seq2_rvd=" ".join(STRONG_BINDING_RVDS[base] for base in reverseComplement(tal2_seq)),
+                                upstream=u_base,
+                                cg_percent=int(round(float(cg_count) / (len(tal1_seq) + len(tal2_seq)), 2) * 100),
+                                re_sites=naive_re_sites(sequence, tal1_end, tal2_start)))
+                            if options.filter == 0:
+                                found = True
+                                break
+                        if found:
+                            break
+                if spacer_sites:
+                    if options.filter == 0:
+                        cut_site_sites.append(best_site(spacer_sites))
+                    else:
+                        cut_site_sites.extend(spacer_sites)
+            if cut_site_sites:
+                if options.filter == 0:
+                    binding_sites.append(best_site(cut_site_sites))
+                else:
+                    binding_sites.extend(cut_site_sites)
+    if options.streubel:
+        binding_sites = [site for site in binding_sites if not filterStreubel(site)]
+    return binding_sites
+
+
+def find_tal_options(tmp_path, records, **kwargs):
+    fasta = tmp_path / "input.fa"
+    fasta.write_text("".join(">%s description\n%s\n" % record for record in records))
+    options = dict(fasta=str(fasta), min=14, max=18, arraymin=14, arraymax=18, cupstream=0, filter=2, filterbase=250,
+                   gspec=False, streubel=False, processes=1, check_offtargets=False, offtargets_fasta="NA",
+                   offtargets_ncbi="NA", unique_fasta="NA", mismatch_fasta="NA", mismatches=2, genome=False,
+                   promoterome=False, organism="NA", outpath=str(tmp_path / "output.txt"),
+                   logFilepath=str(tmp_path / "findTAL.log"), nodeID=-1, ip_address="")
+    options.update(kwargs)
+    return OptionObject(**options)
+
+
+def output_rows(options):
+    RunFindTALTask(options)
+    with open(options.outpath) as output_file:
+        lines = output_file.read().splitlines()
+    assert lines[2].split("\t") == findTAL.OUTPUT_COLUMNS
+    return [line.split("\t") for line in lines[3:]]
+
+
+@pytest.mark.parametrize("streubel", [False, True])
+@pytest.mark.parametrize("cupstream", [0, 1, 2])
+@pytest.mark.parametrize("filter", [0, 1, 2])
+def test_output_matches_per_site_scan(monkeypatch, tmp_path, filter, cupstream, streubel):
+    # small chunks so that the process pool splits every sequence
+    monkeypatch.setattr(findTAL, "SCAN_CHUNK_MIN_CUT_SITES", 50)
+    records = random_records()
+    options = find_tal_options(tmp_path, records, filter=filter, cupstream=cupstream, streubel=streubel)
+    expected = [[str(item) for item in bindingSiteRecord(site)] for site in naive_binding_sites(records, options)]
+    assert expected
+
+    assert output_rows(options) == expected
+    options.processes = 3
+    assert output_rows(options) == expected
+
+
+@pytest.mark.parametrize("filter", [0, 2])
+def test_table_matches_binding_sites(monkeypatch, tmp_path, filter):
+    monkeypatch.setattr(findTAL, "SCAN_CHUNK_MIN_CUT_SITES", 50)
+    records = random_records()
+    options = find_tal_options(tmp_path, records, filter=filter, cupstream=2)
+    expected = naive_binding_sites(records, options)
+
+    for processes in (1, 2):
+        table = find_tal_sites_in_records(records, options, processes=processes)
+        assert len(table) == len(expected)
+        for site, expected_site in zip(table, expected):
+            for name in BindingSite.__slots__:
+                assert getattr(site, name) == getattr(expected_site, name), name
+        assert list(table.records()) == [bindingSiteRecord(site) for site in expected]
+        assert table.rvdPairs() == [[site.seq1_rvd, site.seq2_rvd] for site in expected]
+        assert table.talSites() == [[site.seq1_seq, site.seq2_seq] for site in expected]
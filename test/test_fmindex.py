@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from mitoedit.talent_tools.fmindex import FMIndex, buildIndex
+from mitoedit.talent_tools.talutil import reverseComplement
+
+RECORDS = [
+    ("chr1", "ACGTTGCAGAATTCGGATCCNNNNNACGTACGTTTGACCAGTGGAATTCAAAGGG"),
+    ("chr2", "CCCTTTGAATTCNNGGATCCACGTAAACGTGACTTACGGCA"),
+    ("chr3", "NNNNGAATTCACGTACGTGGGTTTCCCAAACGTNNNN"),
+    ("chr4", "TTGACCAGTG"),
+]
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("fmindex")
+    seq_filename = str(directory / "reference.fa")
+    with open(seq_filename, "w") as seq_file:
+        for record_id, sequence in RECORDS:
+            seq_file.write(">%s\n%s\n" % (record_id, sequence))
+    return FMIndex(buildIndex(seq_filename))
+
+
+def naive_locate(site):
+    # Scan both strands of every record; a palindrome is only reported on the plus strand
+    site = site.upper()
+    if not site or set(site) - set("ACGT"):
+        return []
+    strands = [("+", site)]
+    if reverseComplement(site) != site:
+        strands.append(("-", reverseComplement(site)))
+    hits = []
+    for strand, strand_site in strands:
+        for record_id, sequence in RECORDS:
+            hits.extend((record_id, start, strand) for start in range(len(sequence) - len(site) + 1)
+                        if sequence[start:start + len(site)] == strand_site)
+    return hits
+
+
+def sites():
+    rng = random.Random(7)
+    chosen = [
+        "GAATTC",  # palindrome, found in several records
+        "ACGT",  # palindrome
+        "GGATCC",  # palindrome next to an N run
+        "GGG",  # last bases of chr1
+        "GGGCCC",  # chr1 end + chr2 start, spans a record boundary
+        "CAAAGGGCCCTTTG",  # spans a record boundary
+        "CGTNN",  # runs into an N run
+        "TTGACCAGTG",  # a whole record, also inside chr1
+        "ACCAGTG",
+        "A", "C", "G", "T",
+        "ttgacc",  # lower case
+        "TTTTTTTTTT",  # absent
+    ]
+    for _ in range(200):
+        record_id, sequence = rng.choice(RECORDS)
+        start = rng.randrange(len(sequence))
+        site = sequence[start:start + rng.randint(1, 12)]
+        chosen.append(site if rng.random() < 0.5 else reverseComplement(site))
+    return chosen
+
+
+def test_locate_matches_naive_scan(index):
+    for site in sites():
+        assert index.locate(site) == naive_locate(site), site
+
+
+def test_count_matches_naive_scan(index):
+    for site in sites():
+        assert index.count(site) == len(naive_locate(site)), site
+
+
+def test_record_boundary_and_separator_sites(index):
+    assert index.count("GGGCCC") == 0
+    assert index.count("CGTNN") == 0
+    assert index.locate("TTGACCAGTG") == [("chr1", 33, "+"), ("chr4", 0, "+")]
+    assert all(strand == "+" for _, _, strand in index.locate("GAATTC"))
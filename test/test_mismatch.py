@@ -0,0 +1,94 @@
+import random
+
+import numpy as np
+import pytest
+
+from mitoedit.talent_tools import mismatch
+from mitoedit.talent_tools.mismatch import mismatchHits, mismatchProfiles, sequenceReference
+from mitoedit.talent_tools.talutil import reverseComplement
+
+
+def random_records():
+    rng = random.Random(11)
+    records = []
+    for index, length in enumerate([700, 333, 64, 5]):
+        sequence = list(rng.choice("ACGT") for _ in range(length))
+        # IUPAC codes and N runs never match
+        for _ in range(length // 40):
+            sequence[rng.randrange(length)] = rng.choice("NRYKMSW")
+        if length > 100:
+            sequence[50:58] = "NNNNNNNN"
+        records.append(("record%d" % index, "".join(sequence)))
+    return records
+
+
+def random_sites(records):
+    rng = random.Random(12)
+    sites = ["GAATTC", "ACGCGT", "ACGTNACGT", "ACGTRACGT"]  # palindromes, an N and an IUPAC site
+    for _ in range(12):
+        record_id, sequence = rng.choice(records[:3])
+        start = rng.randrange(len(sequence) - 20)
+        site = list(sequence[start:start + rng.randint(6, 20)].replace("N", "A"))
+        site[rng.randrange(len(site))] = rng.choice("ACGT")
+        site = "".join(site)
+        sites.append(site if rng.random() < 0.5 else reverseComplement(site.replace("R", "A")))
+    return sites
+
+
+def naive_hits(records, site, max_mismatches):
+    # (record index, start, strand, mismatches) of every placement of the site on either strand
+    def mismatches(window, strand_site):
+        return sum(a != b or a not in "ACGT" or b not in "ACGT" for a, b in zip(window, strand_site))
+
+    site = site.upper()
+    strands = [(0, site)]
+    reverse = "".join({"A": "T", "C": "G", "G": "C", "T": "A"}.get(base, "N") for base in reversed(site))
+    if reverse != "".join(base if base in "ACGT" else "N" for base in site):
+        strands.append((1, reverse))
+    hits = []
+    for record_index, (record_id, sequence) in enumerate(records):
+        for strand, strand_site in strands:
+            for start in range(len(sequence) - len(site) + 1):
+                count = mismatches(sequence[start:start + len(site)], strand_site)
+                if count <= max_mismatches:
+                    hits.append((record_index, start, strand, count))
+    return sorted(hits)
+
+
+@pytest.mark.parametrize("chunk_size", [64, 128, mismatch.MISMATCH_CHUNK_SIZE])
+@pytest.mark.parametrize("max_mismatches", [0, 1, 2, 3])
+def test_hits_match_naive_scan(monkeypatch, chunk_size, max_mismatches):
+    monkeypatch.setattr(mismatch, "MISMATCH_CHUNK_SIZE", chunk_size)
+    records = random_records()
+    sites = random_sites(records)
+    for site, hits in zip(sites, mismatchHits(sequenceReference(records), sites, max_mismatches)):
+        found = sorted(zip(*(column.tolist() for column in hits)))
+        assert found == naive_hits(records, site, max_mismatches), site
+
+
+@pytest.mark.parametrize("chunk_size", [64, 128])
+def test_sites_searched_alone_cover_chunk_ends(monkeypatch, chunk_size):
+    # A site that is the longest of its search must still be found at the last start of every chunk
+    monkeypatch.setattr(mismatch, "MISMATCH_CHUNK_SIZE", chunk_size)
+    records = random_records()
+    for site in ["ACG", "GATTACA"] + random_sites(records)[4:8]:
+        hits = mismatchHits(sequenceReference(records), [site], 3)[0]
+        found = sorted(zip(*(column.tolist() for column in hits)))
+        assert found == naive_hits(records, site, 3), site
+
+
+def test_palindrome_is_reported_once():
+    records = [("record", "TTGAATTCTTGAATTCAA")]
+    record_indexes, starts, strands, mismatches = mismatchHits(sequenceReference(records), ["GAATTC"], 0)[0]
+    assert starts.tolist() == [2, 10]
+    assert strands.tolist() == [0, 0]
+
+
+def test_profiles_count_hits_per_mismatch():
+    records = random_records()
+    sites = random_sites(records)
+    sites = sites + sites[:2]  # repeated sites get the same profile
+    profiles = mismatchProfiles(sequenceReference(records), sites, 3)
+    for site, profile in zip(sites, profiles):
+        counts = np.bincount([hit[3] for hit in naive_hits(records, site, 3)], minlength=4).tolist()
+        assert profile == counts, site
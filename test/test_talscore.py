@@ -0,0 +1,127 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from mitoedit.talent_tools import talscore
+from mitoedit.talent_tools.talscore import (OFFTARGET_BUCKETS, PairedTargetFinderCountTask, RVD_BASE_FREQUENCIES,
+                                            UNKNOWN_RVD_FREQUENCIES, bestScore, countDimers, encodeSequence,
+                                            scoreTrack)
+
+COMPLEMENT = {"A": "T", "C": "G", "G": "C", "T": "A"}
+
+
+def random_sequence(rng, length):
+    sequence = [rng.choice("ACGT") for _ in range(length)]
+    for _ in range(length // 30):
+        sequence[rng.randrange(length)] = rng.choice("NRY")
+    return "".join(sequence)
+
+
+def random_rvds(rng, length):
+    return [rng.choice(["HD", "NG", "NI", "NN", "NS", "XX"]) for _ in range(length)]
+
+
+def naive_score(site, rvds):
+    # TALESF score of the bases a TAL binds, read 5' to 3' on its strand; invalid bases cannot be bound
+    score = 0.0
+    for base, rvd in zip(site, rvds):
+        if base not in "ACGT":
+            return math.inf
+        score -= math.log(RVD_BASE_FREQUENCIES.get(rvd, UNKNOWN_RVD_FREQUENCIES)["ACGT".index(base)])
+    return score
+
+
+def naive_track(sequence, rvds, cupstream):
+    # (plus, minus) scores of the site covering sequence[start:start + len(rvds)], one start at a time
+    allowed = {0: "T", 1: "C", 2: "TC"}[cupstream]
+    length = len(rvds)
+    plus, minus = [], []
+    for start in range(len(sequence) - length + 1):
+        site = sequence[start:start + length]
+        upstream = sequence[start - 1] if start > 0 else None
+        plus.append(naive_score(site, rvds) if upstream is not None and upstream in allowed else math.inf)
+        minus_site = "".join(COMPLEMENT.get(base, "N") for base in reversed(site))
+        downstream = sequence[start + length] if start + length < len(sequence) else None
+        minus_upstream = COMPLEMENT.get(downstream) if downstream is not None else None
+        minus.append(naive_score(minus_site, rvds) if minus_upstream is not None and minus_upstream in allowed
+                     else math.inf)
+    return plus, minus
+
+
+@pytest.mark.parametrize("cupstream", [0, 1, 2])
+def test_score_track_matches_per_position_scores(cupstream):
+    rng = random.Random(cupstream)
+    for _ in range(20):
+        sequence = random_sequence(rng, rng.randint(1, 120))
+        rvds = random_rvds(rng, rng.randint(1, 15))
+        plus, minus = scoreTrack(encodeSequence(sequence), rvds, cupstream)
+        expected_plus, expected_minus = naive_track(sequence, rvds, cupstream)
+        np.testing.assert_allclose(plus, expected_plus)
+        np.testing.assert_allclose(minus, expected_minus)
+
+
+def naive_dimers(left_ends, left_buckets, right_starts, right_buckets, spacer_min, spacer_max):
+    counts = [0] * OFFTARGET_BUCKETS
+    for left_end, left_bucket in zip(left_ends, left_buckets):
+        for right_start, right_bucket in zip(right_starts, right_buckets):
+            if spacer_min <= right_start - left_end <= spacer_max:
+                counts[max(left_bucket, right_bucket)] += 1
+    return counts
+
+
+def test_count_dimers_matches_pair_enumeration():
+    rng = random.Random(3)
+    for _ in range(200):
+        left_ends = np.array(sorted(rng.randrange(300) for _ in range(rng.randint(0, 30))), dtype=np.int64)
+        right_starts = np.array(sorted(rng.randrange(300) for _ in range(rng.randint(0, 30))), dtype=np.int64)
+        left_buckets = np.array([rng.randrange(OFFTARGET_BUCKETS) for _ in left_ends], dtype=np.int64)
+        right_buckets = np.array([rng.randrange(OFFTARGET_BUCKETS) for _ in right_starts], dtype=np.int64)
+        spacer_min = rng.randint(-5, 20)
+        spacer_max = spacer_min + rng.randint(0, 20)
+        counts = countDimers(left_ends, left_buckets, right_starts, right_buckets, spacer_min, spacer_max)
+        assert counts.tolist() == naive_dimers(left_ends.tolist(), left_buckets.tolist(), right_starts.tolist(),
+                                               right_buckets.tolist(), spacer_min, spacer_max)
+
+
+def naive_sites(sequence, rvds, cupstream, cutoff):
+    # (plus [(start, bucket)], minus [(start, bucket)]) of the sites within the cutoff
+    best = bestScore(rvds)
+    width = (cutoff - 1) / float(OFFTARGET_BUCKETS)
+
+    def within(scores):
+        return [(start, min(max(int(math.floor((score / best - 1) / width)), 0), OFFTARGET_BUCKETS - 1))
+                for start, score in enumerate(scores) if score / best <= cutoff]
+
+    plus, minus = naive_track(sequence, rvds, cupstream)
+    return within(plus), within(minus)
+
+
+def test_paired_counts_match_pair_enumeration(tmp_path):
+    rng = random.Random(5)
+    records = [random_sequence(rng, length) for length in (400, 250)]
+    seq_filename = str(tmp_path / "reference.fa")
+    with open(seq_filename, "w") as seq_file:
+        for index, sequence in enumerate(records):
+            seq_file.write(">record%d\n%s\n" % (index, sequence))
+
+    rvd_pairs = [["HD NI NG NN", "NI NI HD NG"], ["NG NG NG", "NG NG NG"], ["HD HD NI NG NS", "NN NI"]]
+    cupstream, cutoff, spacer_min, spacer_max = 2, 3.0, 3, 30
+    counts = PairedTargetFinderCountTask(seq_filename, str(tmp_path / "count.log"), cupstream, cutoff,
+                                         spacer_min, spacer_max, rvd_pairs)
+
+    for (rvd1, rvd2), pair_counts in zip(rvd_pairs, counts):
+        expected = [0] * OFFTARGET_BUCKETS
+        for plus_rvds, minus_rvds in set([(rvd1, rvd2), (rvd2, rvd1), (rvd1, rvd1), (rvd2, rvd2)]):
+            for sequence in records:
+                plus_sites = naive_sites(sequence, talscore.rvdList(plus_rvds), cupstream, cutoff)[0]
+                minus_sites = naive_sites(sequence, talscore.rvdList(minus_rvds), cupstream, cutoff)[1]
+                length = len(talscore.rvdList(plus_rvds))
+                for bucket, count in enumerate(naive_dimers([start + length for start, _ in plus_sites],
+                                                            [bucket for _, bucket in plus_sites],
+                                                            [start for start, _ in minus_sites],
+                                                            [bucket for _, bucket in minus_sites],
+                                                            spacer_min, spacer_max)):
+                    expected[bucket] += count
+        assert pair_counts == expected
@@ -0,0 +1,36 @@
+import random
+
+from mitoedit.pipelines import WindowMarkup, render_windows
+from mitoedit.pipelines.window_markup import render_window
+
+
+def random_markup(rng):
+    sequence = ''.join(rng.choice('ACGTN') for _ in range(rng.randint(0, 30)))
+    start = rng.randint(0, len(sequence))
+    size = rng.randint(0, len(sequence) - start)
+    target = rng.randint(-3, size + 3)
+    bystanders = [rng.randint(-3, size + 3) for _ in range(rng.randint(0, 6))]
+    return WindowMarkup(sequence, start, size, target, bystanders)
+
+
+def test_render_windows_matches_render_window():
+    rng = random.Random(2)
+    for _ in range(300):
+        markups = [random_markup(rng) for _ in range(rng.randint(0, 12))]
+        expected = [render_window(markup.window, markup.target, markup.bystanders) for markup in markups]
+        assert render_windows(markups) == expected
+        assert [str(markup) for markup in markups] == expected
+
+
+def test_render_windows_with_empty_windows():
+    assert render_windows([WindowMarkup("ACG", 0, 3, 0, []), WindowMarkup("", 0, 0, 0, [])]) == ["[A]CG", ""]
+    assert render_windows([WindowMarkup("", 0, 0, 0, [0]), WindowMarkup("ACG", 0, 3, 1, [0, 1])]) == ["", "{A}[C]G"]
+    assert render_windows([WindowMarkup("", 0, 0, 0, [])]) == [""]
+    assert render_windows([]) == []
+
+
+def test_bystander_count_matches_rendering():
+    rng = random.Random(3)
+    for _ in range(300):
+        markup = random_markup(rng)
+        assert markup.bystander_count() == str(markup).count('{')